@@ -0,0 +1,4 @@
+"""
+Benchmark and load-test suite for the Python kernel API
+Run with `python -m benchmarks` from the backend directory; see README.md.
+"""
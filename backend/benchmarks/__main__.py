@@ -0,0 +1,139 @@
+"""
+Benchmark runner
+Starts a local API server (unless --url is given), runs the selected scenarios and writes
+p50/p95/p99 latency, throughput and peak RSS per scenario to JSON. With --baseline, exits
+non-zero when a p95 latency or peak RSS regressed by more than --threshold.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from benchmarks.harness import ApiClient, RssMonitor, environment, summarize
+from benchmarks.scenarios import SCENARIOS
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(storage_dir: str) -> tuple:
+    """Run main:app under uvicorn with its file storage in a scratch directory"""
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--app-dir', BACKEND_DIR,
+         '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+        cwd=storage_dir,
+    )
+    return process, f"http://127.0.0.1:{port}"
+
+def _int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(',') if part.strip()]
+
+def find_regressions(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """p95 latencies and peak RSS that grew by more than threshold (a fraction) over the baseline"""
+    regressions = []
+    for name, scenario in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        if previous.get('peakRss') and scenario['peakRss'] > previous['peakRss'] * (1 + threshold):
+            regressions.append(f"{name}: peak RSS {previous['peakRss']} -> {scenario['peakRss']} bytes")
+        for operation, stats in scenario['operations'].items():
+            before = previous.get('operations', {}).get(operation)
+            # Ignore sub-10ms operations, where noise dominates
+            if not before or before['p95'] < 0.01:
+                continue
+            if stats['p95'] > before['p95'] * (1 + threshold):
+                regressions.append(
+                    f"{name}/{operation}: p95 {before['p95']:.3f}s -> {stats['p95']:.3f}s"
+                )
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.strip())
+    parser.add_argument('--url', help='Benchmark an already running server instead of starting one')
+    parser.add_argument('--server-pid', type=int, help='PID to sample RSS from when using --url')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument('--sessions', type=_int_list, default=[1, 5, 25, 50, 100, 200],
+                        help='Session counts for the concurrency sweep')
+    parser.add_argument('--rounds', type=int, default=5, help='Repetitions per measured operation')
+    parser.add_argument('--upload-mb', type=_int_list, default=[1, 10, 50], help='Upload sizes in MB')
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--baseline', help='Earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed relative growth of p95 latency and peak RSS over the baseline')
+    args = parser.parse_args(argv)
+
+    selected = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in selected if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    config = {'sessions': args.sessions, 'rounds': args.rounds, 'upload_mb': args.upload_mb}
+
+    server = None
+    storage = None
+    url, pid = args.url, args.server_pid
+    if url is None:
+        storage = tempfile.TemporaryDirectory(prefix='cocode-bench-')
+        server, url = start_server(storage.name)
+        pid = server.pid
+
+    client = ApiClient(url)
+    monitor = RssMonitor(pid)
+    results = {
+        'startedAt': datetime.now().isoformat(),
+        'url': url,
+        'environment': environment(),
+        'config': config,
+        'scenarios': {},
+    }
+    try:
+        client.wait_until_healthy()
+        monitor.start()
+        for name in selected:
+            monitor.reset()
+            for result_name, samples, wall_time in SCENARIOS[name](client, config):
+                results['scenarios'][result_name] = {
+                    'wallTime': wall_time,
+                    'peakRss': monitor.peak,
+                    'operations': summarize(samples, wall_time),
+                }
+                print(f"{result_name}: {len(samples)} requests in {wall_time:.1f}s, "
+                      f"peak RSS {monitor.peak / 1e6:.0f} MB", file=sys.stderr)
+                monitor.reset()
+    finally:
+        monitor.stop()
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        if storage is not None:
+            storage.cleanup()
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.threshold)
+        results['regressions'] = regressions
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""
+Benchmark harness
+A small stdlib HTTP client for the kernel API, latency statistics and a process-tree RSS
+sampler. Kept dependency-free (apart from psutil) so it runs anywhere the backend runs.
+"""
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+import psutil
+
+class Sample:
+    """Outcome of one timed request"""
+
+    def __init__(self, operation: str, latency: float, ok: bool, error: Optional[str] = None):
+        self.operation = operation
+        self.latency = latency
+        self.ok = ok
+        self.error = error
+
+class ApiClient:
+    def __init__(self, base_url: str, timeout: float = 600):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def _request(self, method: str, path: str, body: Optional[bytes] = None,
+                 headers: Optional[Dict[str, str]] = None) -> bytes:
+        request = urllib.request.Request(
+            self.base_url + path, data=body, method=method, headers=headers or {}
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return response.read()
+
+    def _json(self, method: str, path: str, payload: Optional[Dict] = None) -> Any:
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        return json.loads(self._request(method, path, body, headers) or b'null')
+
+    def timed(self, operation: str, fn, *args, **kwargs) -> Sample:
+        """Run one API call and time it; HTTP and connection errors become failed samples"""
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            return Sample(operation, time.perf_counter() - start, False, str(e))
+        latency = time.perf_counter() - start
+        # /api/execute answers 200 with success=false for cell errors
+        if isinstance(result, dict) and result.get('success') is False:
+            return Sample(operation, latency, False, (result.get('error') or '')[:200])
+        return Sample(operation, latency, True)
+
+    def health(self) -> Dict:
+        return self._json('GET', '/health')
+
+    def execute(self, session_id: str, code: str) -> Dict:
+        return self._json('POST', '/api/execute', {
+            'code': code, 'cellId': f"bench-{uuid4().hex[:8]}", 'sessionId': session_id
+        })
+
+    def restart(self, session_id: str) -> Dict:
+        return self._json('POST', f'/api/sessions/{session_id}/restart')
+
+    def shutdown(self, session_id: str) -> Dict:
+        return self._json('DELETE', f'/api/sessions/{session_id}')
+
+    def upload(self, filename: str, content: bytes) -> Dict:
+        boundary = uuid4().hex
+        body = b''.join([
+            f'--{boundary}\r\n'.encode(),
+            f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'.encode(),
+            b'Content-Type: application/octet-stream\r\n\r\n',
+            content,
+            f'\r\n--{boundary}--\r\n'.encode(),
+        ])
+        headers = {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+        return json.loads(self._request('POST', '/api/files/upload', body, headers))
+
+    def list_files(self) -> Dict:
+        return self._json('GET', '/api/files')
+
+    def download(self, filename: str) -> bytes:
+        return self._request('GET', f'/api/files/{filename}')
+
+    def delete_file(self, filename: str) -> Dict:
+        return self._json('DELETE', f'/api/files/{filename}')
+
+    def wait_until_healthy(self, timeout: float = 60):
+        deadline = time.time() + timeout
+        while True:
+            try:
+                self.health()
+                return
+            except (urllib.error.URLError, OSError):
+                if time.time() > deadline:
+                    raise RuntimeError(f"Server at {self.base_url} did not become healthy in {timeout}s")
+                time.sleep(0.2)
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+def summarize(samples: List[Sample], wall_time: float) -> Dict[str, Dict]:
+    """Latency percentiles, error count and throughput per operation"""
+    by_operation: Dict[str, List[Sample]] = {}
+    for sample in samples:
+        by_operation.setdefault(sample.operation, []).append(sample)
+
+    summary = {}
+    for operation, group in by_operation.items():
+        latencies = [s.latency for s in group if s.ok]
+        errors = [s.error for s in group if not s.ok]
+        summary[operation] = {
+            'count': len(group),
+            'errors': len(errors),
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'mean': sum(latencies) / len(latencies) if latencies else 0.0,
+            'max': max(latencies) if latencies else 0.0,
+            'throughput': len(latencies) / wall_time if wall_time > 0 else 0.0,
+        }
+        if errors:
+            summary[operation]['firstError'] = errors[0]
+    return summary
+
+class RssMonitor:
+    """Samples the resident memory of a process and all its children (the kernels) in the background"""
+
+    def __init__(self, pid: Optional[int], interval: float = 0.25):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def current(self) -> int:
+        if self.pid is None:
+            return 0
+        try:
+            root = psutil.Process(self.pid)
+            processes = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return 0
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            self._stop.wait(self.interval)
+
+    def reset(self):
+        self.peak = self.current()
+
+    def start(self):
+        if self.pid is not None and self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+def environment() -> Dict[str, Any]:
+    """Host details recorded next to the results so runs are comparable"""
+    return {
+        'cpuCount': os.cpu_count(),
+        'memoryBytes': psutil.virtual_memory().total,
+        'kernelProvider': os.getenv('KERNEL_PROVIDER', 'jupyter'),
+    }
@@ -0,0 +1,126 @@
+"""
+Benchmark scenarios
+Each scenario is a generator that drives the API and yields (name, samples, wall_time) for
+every result it wants recorded; the runner attributes peak RSS to each yielded result.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Tuple
+from uuid import uuid4
+
+from benchmarks.harness import ApiClient, Sample
+
+Result = Tuple[str, List[Sample], float]
+
+def _session(prefix: str) -> str:
+    return f"bench-{prefix}-{uuid4().hex[:8]}"
+
+def _parallel(client: ApiClient, operation: str, calls: List[tuple], workers: int) -> List[Sample]:
+    """Run (fn, *args) calls on a thread pool and time each one"""
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        futures = [pool.submit(client.timed, operation, fn, *args) for fn, *args in calls]
+        return [future.result() for future in futures]
+
+def session_lifecycle(client: ApiClient, config: Dict) -> Iterator[Result]:
+    """Create (first execute), execute, restart and delete sessions one at a time"""
+    samples: List[Sample] = []
+    start = time.perf_counter()
+    for _ in range(config['rounds']):
+        session_id = _session('life')
+        samples.append(client.timed('create', client.execute, session_id, 'x = 1'))
+        samples.append(client.timed('execute', client.execute, session_id, 'y = x + 1'))
+        samples.append(client.timed('restart', client.restart, session_id))
+        samples.append(client.timed('execute_after_restart', client.execute, session_id, 'z = 1'))
+        samples.append(client.timed('delete', client.shutdown, session_id))
+    yield 'session_lifecycle', samples, time.perf_counter() - start
+
+def concurrency_sweep(client: ApiClient, config: Dict) -> Iterator[Result]:
+    """N sessions created, exercised and deleted concurrently, for each N in the sweep"""
+    code = "total = sum(i * i for i in range(100000))\nprint(total)"
+    for count in config['sessions']:
+        sessions = [_session(f'c{count}') for _ in range(count)]
+        samples: List[Sample] = []
+        start = time.perf_counter()
+        samples += _parallel(client, 'create', [(client.execute, s, 'x = 1') for s in sessions], count)
+        for _ in range(config['rounds']):
+            samples += _parallel(client, 'execute', [(client.execute, s, code) for s in sessions], count)
+        samples += _parallel(client, 'delete', [(client.shutdown, s) for s in sessions], count)
+        yield f'concurrency_{count}', samples, time.perf_counter() - start
+
+def large_output(client: ApiClient, config: Dict) -> Iterator[Result]:
+    """Cells printing increasingly large stdout (exercises truncation and spilling)"""
+    session_id = _session('output')
+    samples: List[Sample] = []
+    start = time.perf_counter()
+    client.execute(session_id, 'x = 1')
+    for chars in (10_000, 1_000_000, 10_000_000):
+        code = f"import sys\nfor _ in range({chars // 100}):\n    sys.stdout.write('x' * 99 + '\\n')"
+        for _ in range(config['rounds']):
+            samples.append(client.timed(f'print_{chars}', client.execute, session_id, code))
+    client.shutdown(session_id)
+    yield 'large_output', samples, time.perf_counter() - start
+
+def plots(client: ApiClient, config: Dict) -> Iterator[Result]:
+    """Cells rendering several matplotlib figures each"""
+    session_id = _session('plots')
+    samples: List[Sample] = []
+    start = time.perf_counter()
+    client.execute(session_id, 'import matplotlib.pyplot as plt\nimport numpy as np')
+    for figures in (1, 10, 25):
+        code = (
+            f"for i in range({figures}):\n"
+            "    plt.figure(figsize=(6, 4))\n"
+            "    plt.plot(np.random.randn(1000).cumsum())\n"
+            "    plt.show()"
+        )
+        for _ in range(config['rounds']):
+            samples.append(client.timed(f'plots_{figures}', client.execute, session_id, code))
+    client.shutdown(session_id)
+    yield 'plots', samples, time.perf_counter() - start
+
+def uploads(client: ApiClient, config: Dict) -> Iterator[Result]:
+    """Upload, list, download and delete files of increasing size"""
+    row = b'1,2.5,hello world,2024-01-01\n'
+    for megabytes in config['upload_mb']:
+        content = b'a,b,c,d\n' + row * (megabytes * 1024 * 1024 // len(row))
+        samples: List[Sample] = []
+        start = time.perf_counter()
+        for i in range(config['rounds']):
+            filename = f"bench_{megabytes}mb_{i}.csv"
+            samples.append(client.timed('upload', client.upload, filename, content))
+            samples.append(client.timed('list', client.list_files))
+            samples.append(client.timed('download', client.download, filename))
+            samples.append(client.timed('delete', client.delete_file, filename))
+        yield f'uploads_{megabytes}mb', samples, time.perf_counter() - start
+
+def variables(client: ApiClient, config: Dict) -> Iterator[Result]:
+    """Trivial cells before and after filling the namespace (measures the variable inspection pass)"""
+    session_id = _session('vars')
+    samples: List[Sample] = []
+    start = time.perf_counter()
+    client.execute(session_id, 'import pandas as pd\nimport numpy as np')
+    for _ in range(config['rounds']):
+        samples.append(client.timed('execute_small_namespace', client.execute, session_id, 'pass'))
+    client.execute(session_id, (
+        "for _i in range(200):\n"
+        "    globals()[f'scalar_{_i}'] = _i\n"
+        "for _i in range(50):\n"
+        "    globals()[f'items_{_i}'] = list(range(10000))\n"
+        "for _i in range(20):\n"
+        "    globals()[f'frame_{_i}'] = pd.DataFrame(np.random.randn(10000, 10))\n"
+        "for _i in range(10):\n"
+        "    globals()[f'array_{_i}'] = np.random.randn(1000, 1000)"
+    ))
+    for _ in range(config['rounds']):
+        samples.append(client.timed('execute_large_namespace', client.execute, session_id, 'pass'))
+    client.shutdown(session_id)
+    yield 'variables', samples, time.perf_counter() - start
+
+SCENARIOS = {
+    'session_lifecycle': session_lifecycle,
+    'concurrency': concurrency_sweep,
+    'large_output': large_output,
+    'plots': plots,
+    'uploads': uploads,
+    'variables': variables,
+}
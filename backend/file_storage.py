@@ -2,13 +2,21 @@
 File Storage System for Cocode IDE
 Stores files that can be accessed by notebook code execution
 """
+import hashlib
+import logging
 import os
 import shutil
+import threading
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
 from datetime import datetime
 import json
 
+logger = logging.getLogger(__name__)
+
+# Rows read from an upload to recommend dtypes
+ANALYZE_SAMPLE_ROWS = int(os.getenv("UPLOAD_ANALYZE_SAMPLE_ROWS", "100000"))
+
 class FileStorage:
     def __init__(self, storage_dir: str = "file_storage"):
         """Initialize file storage with a directory"""
@@ -16,6 +24,43 @@ class FileStorage:
         self.storage_dir.mkdir(exist_ok=True)
         self.metadata_file = self.storage_dir / "metadata.json"
         self.metadata = self._load_metadata()
+        self._listeners: List[Callable[[Dict], None]] = []
+        self._event_lock = threading.Lock()
+        self._event_seq = 0
+    
+    def add_listener(self, listener: Callable[[Dict], None]):
+        """Call listener(event) for every change to a stored file (from the changing thread)"""
+        with self._event_lock:
+            self._listeners.append(listener)
+    
+    def remove_listener(self, listener: Callable[[Dict], None]):
+        with self._event_lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+    
+    def _publish(self, event_type: str, filename: str, meta: Optional[Dict], changed: bool = True):
+        """
+        Notify listeners that a file was created, updated or deleted. `changed` is False when
+        only its metadata changed (e.g. a memory analysis) or identical content was re-uploaded.
+        """
+        with self._event_lock:
+            self._event_seq += 1
+            event = {
+                "seq": self._event_seq,
+                "type": event_type,
+                "filename": filename,
+                "version": meta.get("version") if meta else None,
+                "hash": meta.get("hash") if meta else None,
+                "changed": changed,
+                "file": dict(meta) if meta else None,
+                "at": datetime.now().isoformat(),
+            }
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(event)
+            except Exception:
+                logger.warning("File storage listener failed", exc_info=True)
     
     def _load_metadata(self) -> Dict:
         """Load file metadata"""
@@ -42,19 +87,64 @@ class FileStorage:
         with open(file_path, 'wb') as f:
             f.write(content)
         
+        # The version only moves when the content does, so readers can tell a real change
+        # from a re-upload of the same bytes
+        previous = self.metadata.get(safe_filename)
+        content_hash = hashlib.sha256(content).hexdigest()
+        changed = previous is None or previous.get("hash") != content_hash
+        version = (previous.get("version", 1) if previous else 0) + (1 if changed else 0)
+        
         # Update metadata
         self.metadata[safe_filename] = {
             "original_name": filename,
             "filename": safe_filename,
             "file_type": file_type,
             "size": len(content),
+            # Content hash: identifies this version of the file (e.g. for query caching)
+            "hash": content_hash,
+            "version": version,
             "uploaded_at": datetime.now().isoformat(),
             "path": str(file_path)
         }
+        if not changed and "memory" in previous:
+            # Same bytes: the dtype analysis still applies (read_csv_optimized, load_dataset)
+            self.metadata[safe_filename]["memory"] = previous["memory"]
         self._save_metadata()
+        self._publish("created" if previous is None else "updated", safe_filename,
+                      self.metadata[safe_filename], changed)
         
         return self.metadata[safe_filename]
     
+    def analyze_file(self, filename: str, sample_rows: int = ANALYZE_SAMPLE_ROWS) -> Optional[Dict]:
+        """
+        Recommend memory-saving dtypes for a tabular file (CSV/TSV/Parquet) from a sample of
+        its rows and store the analysis in its metadata under "memory"
+        """
+        safe_filename = self._sanitize_filename(filename)
+        file_path = self.storage_dir / safe_filename
+        suffix = file_path.suffix.lower()
+        if safe_filename not in self.metadata or suffix not in (".csv", ".tsv", ".parquet"):
+            return None
+        
+        import pandas as pd
+        from kernel_runtime.memory import analyze
+        if suffix == ".parquet":
+            import pyarrow.parquet as pq
+            parquet_file = pq.ParquetFile(file_path)
+            if sample_rows:
+                batch = next(parquet_file.iter_batches(batch_size=sample_rows), None)
+                df = batch.to_pandas() if batch is not None else parquet_file.schema_arrow.empty_table().to_pandas()
+            else:
+                df = parquet_file.read().to_pandas()
+        else:
+            df = pd.read_csv(file_path, sep="\t" if suffix == ".tsv" else ",", nrows=sample_rows or None)
+        analysis = analyze(df)
+        analysis["sampledRows"] = len(df)
+        self.metadata[safe_filename]["memory"] = analysis
+        self._save_metadata()
+        self._publish("updated", safe_filename, self.metadata[safe_filename], changed=False)
+        return analysis
+    
     def get_file(self, filename: str) -> Optional[bytes]:
         """Get file content"""
         safe_filename = self._sanitize_filename(filename)
@@ -75,13 +165,15 @@ class FileStorage:
             if safe_filename in self.metadata:
                 del self.metadata[safe_filename]
             self._save_metadata()
+            self._publish("deleted", safe_filename, None)
             return True
         return False
     
     def list_files(self) -> List[Dict]:
         """List all files in storage"""
         files = []
-        for filename, meta in self.metadata.items():
+        removed = []
+        for filename, meta in list(self.metadata.items()):
             file_path = self.storage_dir / filename
             if file_path.exists():
                 files.append({
@@ -91,7 +183,10 @@ class FileStorage:
             else:
                 # Clean up metadata for non-existent files
                 del self.metadata[filename]
+                removed.append(filename)
         self._save_metadata()
+        for filename in removed:
+            self._publish("deleted", filename, None)
         return files
     
     def get_file_path(self, filename: str) -> Optional[str]:
@@ -114,7 +209,43 @@ class FileStorage:
     def get_storage_directory(self) -> str:
         """Get the storage directory path (for kernel access)"""
         return str(self.storage_dir.absolute())
+    
+    def get_output_directory(self) -> str:
+        """Get the directory for spilled cell outputs (hidden from file listings)"""
+        output_dir = self.storage_dir / ".outputs"
+        output_dir.mkdir(exist_ok=True)
+        return str(output_dir.absolute())
+    
+    def get_output_path(self, output_id: str) -> Optional[str]:
+        """Get the path of a spilled cell output by its id"""
+        if not output_id.isalnum():
+            return None
+        file_path = Path(self.get_output_directory()) / f"{output_id}.txt"
+        if file_path.exists() and file_path.is_file():
+            return str(file_path)
+        return None
+    
+    def get_output_log_directory(self) -> str:
+        """Get the directory for the per-session execution output logs"""
+        log_dir = Path(self.get_output_directory()) / "log"
+        log_dir.mkdir(exist_ok=True)
+        return str(log_dir.absolute())
+    
+    def get_checkpoint_directory(self) -> str:
+        """Get the directory used for kernel state checkpoints (hidden from file listings)"""
+        checkpoint_dir = self.storage_dir / ".checkpoints"
+        checkpoint_dir.mkdir(exist_ok=True)
+        return str(checkpoint_dir.absolute())
+
+_file_storage: Optional[FileStorage] = None
 
-# Global file storage instance
-file_storage = FileStorage()
+def get_file_storage() -> FileStorage:
+    """
+    The process-wide file storage. Created on first use rather than at import, so importing
+    this module touches no files (the API creates it in its startup hook).
+    """
+    global _file_storage
+    if _file_storage is None:
+        _file_storage = FileStorage()
+    return _file_storage
 
@@ -0,0 +1,87 @@
+"""
+Idempotent execute requests
+Executions sent with a requestId run at most once: a retry that arrives while the first
+attempt is still running waits for it, and one that arrives later gets the stored result.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+import metrics
+
+# How long a finished execution can be replayed, how many are kept and how much memory
+# they may hold in total (results carry plots, outputs and variable snapshots)
+DEDUPE_TTL = float(os.getenv("EXECUTE_DEDUPE_TTL", "300"))
+DEDUPE_MAX_ENTRIES = int(os.getenv("EXECUTE_DEDUPE_MAX_ENTRIES", "1000"))
+DEDUPE_MAX_BYTES = int(os.getenv("EXECUTE_DEDUPE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+class IdempotencyConflict(ValueError):
+    """The request id was already used for a different request"""
+
+class IdempotencyCache:
+    def __init__(self, ttl: float = DEDUPE_TTL, max_entries: int = DEDUPE_MAX_ENTRIES,
+                 max_bytes: int = DEDUPE_MAX_BYTES, size: Optional[Callable[[Any], int]] = None):
+        """size(result) estimates a result's memory; without it only entries are counted"""
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = size or (lambda result: 0)
+        self._inflight: Dict[Hashable, Tuple[str, asyncio.Future]] = {}
+        self._completed: "OrderedDict[Hashable, Tuple[float, str, Any, int]]" = OrderedDict()
+        self._bytes = 0
+
+    def _expire(self):
+        # Oldest first; the newest entry is kept even if it alone exceeds max_bytes, so the
+        # cache holds at most max_bytes plus one result
+        now = time.monotonic()
+        while self._completed:
+            key, (expires, _, _, size) = next(iter(self._completed.items()))
+            if expires > now and len(self._completed) <= self.max_entries and (
+                    self._bytes <= self.max_bytes or len(self._completed) == 1):
+                break
+            del self._completed[key]
+            self._bytes -= size
+
+    async def run(self, key: Hashable, fingerprint: str,
+                  factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Return (result, replayed). factory() is awaited only if no attempt with this key is
+        running or recently finished; fingerprint must match the earlier attempt's.
+        Failures are not stored, so retrying a failed attempt runs it again.
+        """
+        self._expire()
+        if key in self._completed:
+            _, stored_fingerprint, result, _ = self._completed[key]
+            self._check(stored_fingerprint, fingerprint)
+            metrics.EXECUTE_REPLAYS.labels(attempt='finished').inc()
+            return result, True
+        if key in self._inflight:
+            stored_fingerprint, future = self._inflight[key]
+            self._check(stored_fingerprint, fingerprint)
+            metrics.EXECUTE_REPLAYS.labels(attempt='running').inc()
+            # shield: a disconnecting retry must not cancel the original attempt
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = (fingerprint, future)
+        try:
+            result = await factory()
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Retrieved here, so no warning when nobody else was waiting
+            raise
+        finally:
+            del self._inflight[key]
+        future.set_result(result)
+        size = self.size(result)
+        self._completed[key] = (time.monotonic() + self.ttl, fingerprint, result, size)
+        self._bytes += size
+        self._expire()
+        return result, False
+
+    @staticmethod
+    def _check(stored: str, fingerprint: str):
+        if stored != fingerprint:
+            raise IdempotencyConflict("requestId was already used for a different execution")
@@ -0,0 +1,68 @@
+"""
+Kernel fork server for Cocode IDE
+Imports the data science stack once, then forks a Jupyter kernel per session.
+
+Protocol: one JSON request per line on stdin, one JSON reply per line on stdout.
+    {"connection_file": "/path/kernel-abc.json", "rlimits": {...}}  ->  {"pid": 12345}
+The server exits when stdin is closed (i.e. when the API process goes away).
+"""
+import json
+import os
+import signal
+import sys
+from typing import Dict, Optional
+
+def preload():
+    """Import the modules every kernel needs so forked children share them copy-on-write"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot  # noqa: F401
+    import numpy  # noqa: F401
+    import pandas  # noqa: F401
+    from ipykernel import kernelapp  # noqa: F401
+
+def run_kernel(connection_file: str, rlimits: Optional[Dict] = None):
+    """Child side of a fork: detach from the server and run an IPython kernel"""
+    os.setsid()
+    if rlimits:
+        from resource_limits import apply_rlimits
+        apply_rlimits(**rlimits)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)  # stdout is the server's reply pipe
+    os.close(devnull)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+
+    from ipykernel.kernelapp import IPKernelApp
+    app = IPKernelApp.instance()
+    app.initialize(['-f', connection_file])
+    app.start()
+
+def serve():
+    """Read spawn requests until stdin closes"""
+    # Children are reaped automatically; the API process tracks them by pid
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    run_kernel(request['connection_file'], request.get('rlimits'))
+                finally:
+                    os._exit(0)
+            reply = {"pid": pid}
+        except Exception as e:
+            reply = {"error": str(e)}
+        sys.stdout.write(json.dumps(reply) + "\n")
+        sys.stdout.flush()
+
+if __name__ == "__main__":
+    preload()
+    sys.stdout.write(json.dumps({"ready": True}) + "\n")
+    sys.stdout.flush()
+    serve()
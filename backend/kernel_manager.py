@@ -3,14 +3,36 @@ Python Kernel Manager for executing code in isolated sessions
 Fixed implementation
 """
 import asyncio
-from jupyter_client import BlockingKernelClient
-from jupyter_client.manager import KernelManager as SyncKernelManager
-from typing import Dict, Optional, List
+from typing import TYPE_CHECKING, Any, Dict, Optional, List
 import json
 import base64
 import io
+import os
+import time
 from datetime import datetime
+from uuid import uuid4
+import logging
 import queue
+import signal
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import psutil
+
+import metrics
+import tracing
+from file_storage import FileStorage, get_file_storage
+from kernel_providers import KernelProvider, get_kernel_provider
+from output_buffer import OutputBuffer
+from resource_limits import ResourceLimits
+from kernel_runtime.mime_types import DATAFRAME_MIME_TYPE, PROFILE_MIME_TYPE
+
+if TYPE_CHECKING:
+    from jupyter_client import BlockingKernelClient
+
+logger = logging.getLogger(__name__)
 
 # Import VariableSnapshot for type checking
 try:
@@ -19,372 +41,1219 @@ try:
 except:
     pass
 
+# Directory containing the kernel_runtime package, added to sys.path inside kernels
+RUNTIME_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Seconds between background samples of kernel CPU and memory usage
+USAGE_SAMPLE_INTERVAL = float(os.getenv("KERNEL_USAGE_INTERVAL", "5"))
+
+# Seconds between watchdog checks of every kernel's process and heartbeat (0 disables it)
+WATCHDOG_INTERVAL = float(os.getenv("KERNEL_WATCHDOG_INTERVAL", "1"))
+# Seconds without heartbeat replies after which a running kernel counts as hung
+HEARTBEAT_TIMEOUT = float(os.getenv("KERNEL_HEARTBEAT_TIMEOUT", "10"))
+# Kernels kept started and bootstrapped, ready to replace a restarted kernel or serve a new
+# session. Opt-in: every standby is an idle kernel process using memory all the time
+STANDBY_KERNELS = int(os.getenv("KERNEL_STANDBY", "0"))
+# Threads that wait on running cells; executions beyond this many (across sessions) queue
+EXECUTE_THREADS = int(os.getenv("KERNEL_EXECUTE_THREADS", "64"))
+# Start a replacement kernel (restoring the session's last checkpoint) as soon as one dies
+AUTO_RESPAWN = os.getenv("KERNEL_AUTO_RESPAWN", "false").strip().lower() in ("1", "true", "yes")
+# With AUTO_RESPAWN, minimum seconds between the checkpoints taken after successful
+# executions (0 checkpoints after every one); a respawn restores the latest
+CHECKPOINT_INTERVAL = float(os.getenv("KERNEL_CHECKPOINT_INTERVAL", "60"))
+
+class KernelDiedError(RuntimeError):
+    """The kernel process exited (or was killed) while it was being used"""
+
+    def __init__(self, message: str, status: str = "died"):
+        super().__init__(message)
+        self.status = status  # 'oom_killed', 'cpu_limit', 'killed', 'died' or 'unresponsive'
+
 class ExecutionResult:
-    def __init__(self):
+    def __init__(self, spill_dir: Optional[str] = None):
         self.success: bool = True
         self.stdout: str = ""
         self.stderr: str = ""
+        # Bounded capture of the streams; joined into stdout/stderr by finish_output()
+        self.stdout_buffer = OutputBuffer(spill_dir)
+        self.stderr_buffer = OutputBuffer(spill_dir)
         self.error: Optional[str] = None
+        self.kernel_status: Optional[str] = None  # Set when the kernel died during the execution
         self.execution_time: float = 0.0
         self.variables: List[Dict] = []
         self.plots: List[str] = []  # Base64 encoded images
-        self.dataframes: List[str] = []  # HTML representations
+        self.dataframes: List[Dict[str, str]] = []  # {'data': ..., 'mimeType': ...}
+        self.profile: Optional[Dict] = None  # Hotspots and memory figures when profiling
+        self.timings: Dict[str, float] = {}  # Seconds per phase: 'execute', 'drain', 'variables'
+    
+    def set_error(self, error: str):
+        """Record an error; the traceback replaces anything captured on stderr"""
+        self.error = error
+        self.stderr_buffer.clear()
+        self.stderr_buffer.write(error)
+    
+    def finish_output(self):
+        """Join the captured streams and close any spill files"""
+        self.stdout_buffer.close()
+        self.stderr_buffer.close()
+        self.stdout = self.stdout_buffer.getvalue()
+        self.stderr = self.stderr_buffer.getvalue()
+    
+    def approximate_size(self) -> int:
+        """Rough memory held by the result in bytes (for caches that keep results around)"""
+        # The output buffers hold the streams a second time
+        size = 2 * (len(self.stdout) + len(self.stderr))
+        size += sum(len(plot) for plot in self.plots)
+        size += sum(len(df.get('data') or '') for df in self.dataframes)
+        size += len(json.dumps(self.variables, default=str))
+        if self.profile is not None:
+            size += len(json.dumps(self.profile, default=str))
+        return size
+
+# Kernel-side code that pickles the user namespace to a checkpoint file.
+# Modules are recorded by name and functions/classes defined in the notebook by
+# source, so they can be re-created before the pickled data that references them.
+CHECKPOINT_CODE = '''
+def _cocode_source(obj):
+    import inspect, linecache, re
+    try:
+        return inspect.getsource(obj)
+    except Exception:
+        if not isinstance(obj, type):
+            raise
+    # inspect cannot locate classes defined in cells; find them through a method's cell
+    for member in vars(obj).values():
+        code = getattr(member, '__code__', None)
+        if code is None:
+            continue
+        lines = linecache.getlines(code.co_filename)
+        pattern = re.compile(r'^class\\s+' + re.escape(obj.__name__) + r'\\b')
+        for index, line in enumerate(lines):
+            if pattern.match(line):
+                return ''.join(inspect.getblock(lines[index:]))
+    raise OSError('source not available')
+
+def _cocode_checkpoint(path):
+    import json, os, pickle, sys, types
+    ip = get_ipython()
+    ns = ip.user_ns
+    hidden = set(ip.user_ns_hidden)
+    modules, definitions, data, skipped = {}, [], [], []
+    for name, obj in list(ns.items()):
+        if name.startswith('_') or name in hidden or name in ('In', 'Out', 'get_ipython', 'exit', 'quit'):
+            continue
+        if isinstance(obj, types.ModuleType):
+            # Lazy proxies that were never used are recreated by the target's bootstrap
+            if obj.__name__ in sys.modules:
+                modules[name] = obj.__name__
+        elif isinstance(obj, (types.FunctionType, type)) and getattr(obj, '__module__', None) == '__main__':
+            try:
+                definitions.append((name, _cocode_source(obj)))
+            except Exception:
+                skipped.append(name)
+        else:
+            data.append(name)
+    saved = []
+    # Written next to the target and renamed, so a kernel dying mid-write leaves the last
+    # complete checkpoint in place
+    partial = path + '.part'
+    with open(partial, 'wb') as f:
+        pickle.dump({'modules': modules, 'definitions': definitions}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        for name in data:
+            try:
+                blob = pickle.dumps(ns[name], protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                skipped.append(name)
+                continue
+            pickle.dump((name, blob), f, protocol=pickle.HIGHEST_PROTOCOL)
+            saved.append(name)
+    os.replace(partial, path)
+    print(json.dumps({
+        'variables': saved,
+        'modules': sorted(modules),
+        'definitions': [name for name, _ in definitions],
+        'skipped': sorted(skipped),
+    }))
+_cocode_checkpoint(%(path)r)
+del _cocode_checkpoint, _cocode_source
+'''
+
+# Kernel-side code that loads a checkpoint written by CHECKPOINT_CODE
+RESTORE_CODE = '''
+def _cocode_restore(path):
+    import importlib, json, pickle
+    ns = get_ipython().user_ns
+    restored, failed = [], []
+    with open(path, 'rb') as f:
+        header = pickle.load(f)
+        for alias, module_name in header['modules'].items():
+            try:
+                ns[alias] = importlib.import_module(module_name)
+            except Exception:
+                failed.append(alias)
+        for name, source in header['definitions']:
+            try:
+                exec(source, ns)
+                restored.append(name)
+            except Exception:
+                failed.append(name)
+        while True:
+            try:
+                name, blob = pickle.load(f)
+            except EOFError:
+                break
+            try:
+                ns[name] = pickle.loads(blob)
+                restored.append(name)
+            except Exception:
+                failed.append(name)
+    print(json.dumps({'restored': restored, 'failed': failed}))
+_cocode_restore(%(path)r)
+del _cocode_restore
+'''
 
 class KernelManager:
-    def __init__(self):
-        self.kernels: Dict[str, SyncKernelManager] = {}
-        self.clients: Dict[str, BlockingKernelClient] = {}
+    def __init__(self, provider: Optional[KernelProvider] = None, limits: Optional[ResourceLimits] = None,
+                 storage: Optional[FileStorage] = None):
+        # File storage the kernels work in (uploads, spilled outputs, checkpoints)
+        self.storage = storage or get_file_storage()
+        # Memory/CPU/wall-time limits for every kernel (KERNEL_MEMORY_LIMIT_MB, ...)
+        self.limits = limits or (provider.limits if provider else ResourceLimits.from_env())
+        # Provider that launches kernel processes (KERNEL_PROVIDER=jupyter|forkserver)
+        self.provider = provider or get_kernel_provider(limits=self.limits)
+        self.kernels: Dict[str, Any] = {}
+        self.clients: Dict[str, "BlockingKernelClient"] = {}
+        self.checkpoints: Dict[str, str] = {}  # session_id -> latest checkpoint file
+        self._checkpointing: set = set()  # Sessions with a background checkpoint pending
+        self.startup_times: Dict[str, Dict] = {}  # session_id -> host-side startup timings
+        self.spilled_outputs: Dict[str, List[str]] = {}  # session_id -> full-output spill files
+        self.usage: Dict[str, Dict] = {}  # session_id -> latest resource usage sample and status
+        self.failures: Dict[str, tuple] = {}  # session_id -> (status, message) of a dead kernel
+        self._sampler: Optional[threading.Thread] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._background_stop = threading.Event()
+        self._heartbeat_lost: Dict[str, float] = {}  # session_id -> time heartbeats stopped
+        # Held while a session's kernel is used or replaced, so the watchdog never respawns
+        # a kernel under a running execution (reentrant: recovery shuts the old one down)
+        self._locks: Dict[str, threading.RLock] = {}
+        # Sessions whose kernel is being restarted or shut down; a running cell there stops
+        # waiting for its kernel so the lock is handed over (session_id -> pending takeovers)
+        self._takeovers: Dict[str, int] = {}
+        self._takeovers_lock = threading.Lock()
+        # Executions block on kernel messages, so they run here rather than on the event loop
+        self._executor = ThreadPoolExecutor(max_workers=EXECUTE_THREADS, thread_name_prefix="kernel-execute")
+        # Bootstrapped kernels waiting to be handed to a session: (kernel, client, timings)
+        self._standby: List[tuple] = []
+        self._standby_lock = threading.Lock()
+        self._filling = False
     
-    def get_kernel(self, session_id: str) -> SyncKernelManager:
-        """Get or create a kernel for a session"""
+    def get_kernel(self, session_id: str, trace: Optional[tracing.Trace] = None):
+        """Get or create a kernel for a session (a standby kernel when one is ready)"""
         if session_id not in self.kernels:
-            # Create new kernel
-            kernel_manager = SyncKernelManager()
-            kernel_manager.start_kernel()
-            kernel_client = kernel_manager.client()
-            
-            self.kernels[session_id] = kernel_manager
-            self.clients[session_id] = kernel_client
-            
-            # Initialize with data science imports and file storage access
-            from file_storage import file_storage
-            storage_path = file_storage.get_storage_directory()
-            
-            init_code = f"""
-import pandas as pd
-import numpy as np
-import matplotlib
-matplotlib.use('Agg')  # Non-interactive backend
-import matplotlib.pyplot as plt
-import seaborn as sns
-import plotly.express as px
-import plotly.graph_objects as go
+            with self._session_lock(session_id):
+                if session_id not in self.kernels:
+                    standby = self._take_standby()
+                    if standby is not None:
+                        kernel, client, timings = standby
+                        timings = {**timings, "standby": True}
+                    else:
+                        kernel, client, timings = self._launch_kernel(session_id, trace)
+                    self._install(session_id, kernel, client, timings)
+                    self._fill_standby()
+        
+        return self.kernels[session_id]
+    
+    def _init_code(self) -> str:
+        """Kernel bootstrap: lazy data science imports, plot capture and file storage access"""
+        storage_path = self.storage.get_storage_directory()
+        
+        return f"""
+import time as _cocode_time
+_cocode_start = _cocode_time.perf_counter()
+import sys
+import os
+if {RUNTIME_DIR!r} not in sys.path:
+    sys.path.append({RUNTIME_DIR!r})
+os.environ['MPLBACKEND'] = 'Agg'  # Non-interactive backend
+
+# pd, np, plt, sns, px and go import on first use so unused libraries cost nothing
+from kernel_runtime import lazy as _cocode_lazy
+from kernel_runtime import plotting as _cocode_plotting
+pd = _cocode_lazy.lazy_import('pandas', 'pd')
+np = _cocode_lazy.lazy_import('numpy', 'np')
+plt = _cocode_lazy.lazy_import('matplotlib.pyplot', 'plt')
+sns = _cocode_lazy.lazy_import('seaborn', 'sns')
+px = _cocode_lazy.lazy_import('plotly.express', 'px')
+go = _cocode_lazy.lazy_import('plotly.graph_objects', 'go')
+
+# Override plt.show() to send plots as base64 images, whenever matplotlib gets imported
+_cocode_lazy.register_post_import_hook('matplotlib', _cocode_plotting.use_agg_backend)
+_cocode_lazy.register_post_import_hook('matplotlib.pyplot', _cocode_plotting.patch_pyplot)
+_cocode_lazy.register_post_import_hook('seaborn', _cocode_plotting.patch_seaborn)
+
+# DataFrames are displayed as compact, pageable handles instead of HTML tables
+from kernel_runtime import dataframes as _cocode_dataframes
+_cocode_dataframes.register_formatter(get_ipython())
+
+# Memory helpers: optimize_memory(df), memory_report(df), read_csv_optimized(path)
+from kernel_runtime.memory import optimize_memory, memory_report, read_csv_optimized
+
 from IPython.display import display, HTML, Image
 import json
 import io
 import base64
-import os
 
 # File storage directory - files uploaded to the IDE are available here
 FILE_STORAGE_DIR = r"{storage_path}"
 os.chdir(FILE_STORAGE_DIR)  # Change working directory to file storage
 
+# Chunked processing of stored files larger than memory: dataset('logs.csv').filter(...)...
+from kernel_runtime import chunked as _cocode_chunked
+from kernel_runtime.chunked import dataset
+_cocode_chunked.configure(FILE_STORAGE_DIR)
+
+# Cached loading that re-reads a file only after it changed: df = load_dataset('sales.csv')
+from kernel_runtime import datasets as _cocode_datasets
+from kernel_runtime.datasets import load_dataset, clear_dataset_cache
+_cocode_datasets.configure(FILE_STORAGE_DIR)
+
+# SQL over stored files, one view per CSV/Parquet file: sql("SELECT ... FROM sales_2024")
+from kernel_runtime import sql as _cocode_sql
+from kernel_runtime.sql import sql
+_cocode_sql.configure(FILE_STORAGE_DIR)
+
+# Session worker pool (started on first use, sized by the kernel's CPU limit)
+from kernel_runtime import parallel as _cocode_parallel
+from kernel_runtime.parallel import parallel_map, parallel_apply
+_cocode_parallel.configure({self.limits.cpus!r})
+
 # Suppress the FigureCanvasAgg warning globally
 import warnings
 warnings.filterwarnings('ignore', message='.*FigureCanvasAgg.*', category=UserWarning)
 warnings.filterwarnings('ignore', message='.*non-interactive.*', category=UserWarning)
 
-# Override plt.show() to automatically save plots as base64
-_original_show = plt.show
-def _show_override(*args, **kwargs):
-    \"\"\"Override plt.show() to save plot as base64 image\"\"\"
-    try:
-        fig = plt.gcf()
-        if fig.get_axes():  # Only save if there are axes
-            buf = io.BytesIO()
-            fig.savefig(buf, format='png', bbox_inches='tight', dpi=100)
-            buf.seek(0)
-            img_data = buf.getvalue()
-            img_base64 = base64.b64encode(img_data).decode('utf-8')
-            # Use IPython's display with dict format - this sends display_data message
-            # The format is: {{'image/png': base64_string}}
-            display({{'image/png': img_base64}}, raw=True)
-            plt.close(fig)
-    except Exception as e:
-        # If display fails, try original show (will just warn)
-        import traceback
-        traceback.print_exc()
-        pass
-
-plt.show = _show_override
-
-# Also override seaborn's show if it exists
-try:
-    import seaborn as sns
-    if hasattr(sns, 'show'):
-        sns._original_show = sns.show
-        sns.show = lambda: plt.show()
-except:
-    pass
+_cocode_lazy.BOOTSTRAP_TIME = _cocode_time.perf_counter() - _cocode_start
 """
-            # Execute init synchronously
-            try:
-                kernel_client.execute(init_code)
-            except Exception as e:
-                print(f"Init error: {e}")
+    
+    def _launch_kernel(self, name: str, trace: Optional[tracing.Trace] = None, strict: bool = False) -> tuple:
+        """
+        Start a kernel process and run the bootstrap in it; returns (kernel, client, timings).
+        With strict, a bootstrap failure shuts the kernel down and raises instead of being logged.
+        """
+        kernel_start = time.time()
+        with tracing.span(trace, 'kernel_start', provider=self.provider.name):
+            kernel = self.provider.start_kernel(name)
+            client = kernel.client()
+        timings = {"kernelStartTime": time.time() - kernel_start}
         
-        return self.kernels[session_id]
+        def check_alive():
+            if not kernel.is_alive():
+                raise KernelDiedError("The kernel exited during startup")
+        
+        # Execute init synchronously, so its cost is not hidden in the first cell's run time
+        init_start = time.time()
+        try:
+            with tracing.span(trace, 'init'):
+                # IOPub must be connected first, or the kernel's idle status can be missed
+                client.wait_for_ready(timeout=60)
+                self._run_code(client, self._init_code(), check_alive=check_alive)
+        except Exception as e:
+            if strict:
+                self._teardown(kernel, client)
+                raise
+            logger.warning("Init error for session %s: %s", name, e)
+        timings["initTime"] = time.time() - init_start
+        return kernel, client, timings
+    
+    def _install(self, session_id: str, kernel, client, timings: Dict):
+        """Make a started kernel the session's kernel"""
+        self.kernels[session_id] = kernel
+        self.clients[session_id] = client
+        self.startup_times[session_id] = timings
+        self.failures.pop(session_id, None)
+        self.limits.attach(session_id, self.kernel_pid(session_id))
+        self.usage[session_id] = {"status": "running", "startedAt": datetime.now().isoformat()}
+        self._start_sampler()
+        self._start_watchdog()
+        self._start_heartbeat(session_id)
     
-    async def execute_code(self, session_id: str, code: str) -> ExecutionResult:
-        """Execute code in a kernel session"""
-        import time
+    def _take_standby(self) -> Optional[tuple]:
+        """A ready standby kernel, if there is one"""
+        while True:
+            with self._standby_lock:
+                if not self._standby:
+                    return None
+                kernel, client, timings = self._standby.pop(0)
+            if kernel.is_alive():
+                return kernel, client, timings
+            self._teardown_async(kernel, client)
+    
+    def _fill_standby(self):
+        """Start standby kernels in the background until KERNEL_STANDBY are ready"""
+        with self._standby_lock:
+            if self._filling or STANDBY_KERNELS <= 0 or self._background_stop.is_set():
+                return
+            self._filling = True
+        threading.Thread(target=self._fill_loop, name="kernel-standby", daemon=True).start()
+    
+    def _fill_loop(self):
+        try:
+            while not self._background_stop.is_set():
+                with self._standby_lock:
+                    if len(self._standby) >= STANDBY_KERNELS:
+                        return
+                # strict: a standby is only handed out fully bootstrapped
+                standby = self._launch_kernel("standby", strict=True)
+                with self._standby_lock:
+                    if not self._background_stop.is_set():
+                        self._standby.append(standby)
+                        continue
+                # The API shut down while the kernel was starting
+                self._teardown(*standby[:2])
+        except Exception as e:
+            logger.warning("Could not start a standby kernel: %s", e)
+        finally:
+            with self._standby_lock:
+                self._filling = False
+    
+    async def execute_code(self, session_id: str, code: str,
+                           trace: Optional[tracing.Trace] = None,
+                           profile: bool = False) -> ExecutionResult:
+        """Execute code in a kernel session, recording its phases as spans of the trace"""
         start_time = time.time()
+        trace = trace or tracing.Trace('execute_code', session=session_id)
+        
+        result = ExecutionResult(spill_dir=self.storage.get_output_directory())
         
-        result = ExecutionResult()
+        def run():
+            with self._session_lock(session_id):
+                return self._execute(session_id, code, trace, profile, result, start_time)
         
+        # Waiting on the kernel blocks, so it happens in a worker thread: a long-running cell
+        # holds up only its own session (whose lock keeps executions in order)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, run)
+    
+    def _execute(self, session_id: str, code: str, trace: tracing.Trace, profile: bool,
+                 result: ExecutionResult, start_time: float) -> ExecutionResult:
         # Ensure kernel exists
-        self.get_kernel(session_id)
+        self.get_kernel(session_id, trace)
         client = self.clients[session_id]
         
         try:
-            # Use execute_interactive which handles message collection automatically
-            # This is the proper way to execute code and get output with BlockingKernelClient
+            # A kernel the watchdog found dead fails right away instead of waiting out timeouts
+            self._check_alive(session_id)
             try:
-                # Execute code
-                msg_id = client.execute(code)
-                print(f"DEBUG: Executed code with msg_id: {msg_id}")
+                with trace.span('execute') as execute_span:
+                    if profile:
+                        # Profile the next cell (ours) with cProfile and tracemalloc
+                        self._run_internal(
+                            session_id,
+                            "from kernel_runtime import profiling as _p; _p.arm(); del _p"
+                        )
+                    
+                    # Execute code
+                    msg_id = client.execute(code)
+                    logger.debug("Executed code with msg_id: %s", msg_id)
                 
-                # Collect IOPub messages WHILE waiting for shell reply
-                # IOPub messages (stdout/stderr) arrive DURING execution
-                shell_reply = None
-                import time
-                start_wait = time.time()
-                max_wait = 10
-                msg_count = 0
-                execution_done = False
+                    # Collect IOPub messages WHILE waiting for shell reply
+                    # IOPub messages (stdout/stderr) arrive DURING execution
+                    shell_reply = None
+                    start_wait = time.time()
+                    max_wait = self.limits.execution_timeout
+                    msg_count = 0
+                    execution_done = False
                 
-                # Process messages until we get the shell reply
-                while not execution_done and (time.time() - start_wait) < max_wait:
-                    # Check for IOPub messages first (they arrive during execution)
-                    try:
-                        msg = client.get_iopub_msg(timeout=0.1)
-                        msg_type = msg['msg_type']
-                        content = msg['content']
-                        
-                        # Filter messages for our execution
-                        parent_msg_id = msg.get('parent_header', {}).get('msg_id')
-                        if parent_msg_id and parent_msg_id != msg_id:
-                            continue
-                        
-                        msg_count += 1
-                        print(f"DEBUG: IOPub msg {msg_count}: type={msg_type}")
-                        
-                        if msg_type == 'stream':
-                            stream_name = content['name']
-                            text = content['text']
-                            print(f"DEBUG: Stream - {stream_name}: {repr(text[:100])}")
-                            if stream_name == 'stdout':
-                                result.stdout += text
-                            elif stream_name == 'stderr':
-                                result.stderr += text
-                                result.success = False
-                        
-                        elif msg_type == 'execute_result':
-                            data = content['data']
-                            print(f"DEBUG: Execute result - keys: {list(data.keys())}")
-                            if 'image/png' in data:
-                                result.plots.append(data['image/png'])
-                            elif 'text/html' in data:
-                                result.dataframes.append(data['text/html'])
-                            elif 'text/plain' in data:
-                                result.stdout += data['text/plain']
-                        
-                        elif msg_type == 'display_data':
-                            data = content['data']
-                            print(f"DEBUG: Display data - keys: {list(data.keys())}")
-                            if 'image/png' in data:
-                                result.plots.append(data['image/png'])
-                                print(f"DEBUG: Found plot in display_data (main loop)!")
-                            elif 'text/html' in data:
-                                result.dataframes.append(data['text/html'])
+                    # Process messages until we get the shell reply (no wall-time limit unless
+                    # KERNEL_EXECUTION_TIMEOUT is set)
+                    while not execution_done and (max_wait is None or time.time() - start_wait < max_wait):
+                        if session_id in self._takeovers:
+                            # restart_kernel/shutdown_kernel is waiting for this session's lock
+                            raise KernelDiedError(
+                                "The cell was stopped because its kernel was restarted or shut down.",
+                                "stopped"
+                            )
+                        # Check for IOPub messages first (they arrive during execution)
+                        try:
+                            msg = client.get_iopub_msg(timeout=0.1)
                         
-                        elif msg_type == 'error':
-                            result.success = False
-                            result.error = '\n'.join(content['traceback'])
-                            result.stderr = result.error
-                            execution_done = True
+                            # Filter messages for our execution
+                            parent_msg_id = msg.get('parent_header', {}).get('msg_id')
+                            if parent_msg_id and parent_msg_id != msg_id:
+                                continue
                         
-                        elif msg_type == 'status':
-                            if content['execution_state'] == 'idle':
-                                # Execution complete, but continue to check shell channel
-                                pass
+                            msg_count += 1
+                            execution_done = self._handle_iopub_message(result, msg)
+                    
+                        except queue.Empty:
+                            # No IOPub messages, check shell channel
+                            try:
+                                shell_reply = client.get_shell_msg(timeout=0.1)
+                                if shell_reply.get('parent_header', {}).get('msg_id') == msg_id:
+                                    execution_done = True
+                                    logger.debug("Got shell reply: %s", shell_reply.get('content', {}).get('status'))
+                                    self._handle_shell_reply(result, shell_reply)
+                                    break
+                            except queue.Empty:
+                                # Nothing from the kernel; make sure it is still there
+                                self._check_alive(session_id)
+                                continue
+                
+                    timed_out = not execution_done
+                    if timed_out:
+                        # Wall-time limit: interrupt the cell so the kernel can take the next one
+                        self._check_alive(session_id)
+                        logger.warning("Interrupting cell in session %s after %ss", session_id, max_wait)
+                        self.kernels[session_id].interrupt_kernel()
                     
-                    except queue.Empty:
-                        # No IOPub messages, check shell channel
+                    # Get shell reply if we don't have it yet
+                    if not shell_reply:
                         try:
-                            shell_reply = client.get_shell_msg(timeout=0.1)
+                            shell_reply = client.get_shell_msg(timeout=2)
                             if shell_reply.get('parent_header', {}).get('msg_id') == msg_id:
-                                execution_done = True
-                                print(f"DEBUG: Got shell reply: {shell_reply.get('content', {}).get('status')}")
-                                if shell_reply['content']['status'] == 'error':
-                                    result.success = False
-                                    if not result.error:
-                                        result.error = '\n'.join(shell_reply['content']['traceback'])
-                                        result.stderr = result.error
-                                break
+                                self._handle_shell_reply(result, shell_reply)
                         except queue.Empty:
-                            # Continue waiting
-                            continue
-                
-                # Get shell reply if we don't have it yet
-                if not shell_reply:
-                    try:
-                        shell_reply = client.get_shell_msg(timeout=2)
-                        if shell_reply.get('parent_header', {}).get('msg_id') == msg_id:
-                            if shell_reply['content']['status'] == 'error':
-                                result.success = False
-                                if not result.error:
-                                    result.error = '\n'.join(shell_reply['content']['traceback'])
-                                    result.stderr = result.error
-                    except queue.Empty:
-                        pass
+                            pass
                 
-                # Collect any remaining IOPub messages (including display_data from plt.show())
-                # We need to wait a bit longer for display_data messages which can arrive after execution
-                for _ in range(50):  # Increased from 10 to 50 to catch late-arriving messages
-                    try:
-                        msg = client.get_iopub_msg(timeout=0.1)  # Increased timeout
-                        parent_msg_id = msg.get('parent_header', {}).get('msg_id')
-                        if parent_msg_id and parent_msg_id != msg_id:
-                            continue
-                        
-                        msg_type = msg['msg_type']
-                        content = msg['content']
-                        
-                        print(f"DEBUG: Late IOPub msg: type={msg_type}")
-                        
-                        if msg_type == 'stream':
-                            stream_name = content['name']
-                            text = content['text']
-                            if stream_name == 'stdout':
-                                result.stdout += text
-                            elif stream_name == 'stderr':
-                                result.stderr += text
-                                result.success = False
-                        
-                        elif msg_type == 'execute_result':
-                            data = content['data']
-                            print(f"DEBUG: Execute result - keys: {list(data.keys())}")
-                            if 'image/png' in data:
-                                result.plots.append(data['image/png'])
-                                print(f"DEBUG: Found plot in execute_result!")
-                            elif 'text/html' in data:
-                                result.dataframes.append(data['text/html'])
-                            elif 'text/plain' in data:
-                                result.stdout += data['text/plain']
+                with trace.span('drain') as drain_span:
+                    # Collect any remaining IOPub messages (including display_data from plt.show())
+                    # We need to wait a bit longer for display_data messages which can arrive after execution
+                    for _ in range(50):  # Increased from 10 to 50 to catch late-arriving messages
+                        try:
+                            msg = client.get_iopub_msg(timeout=0.1)  # Increased timeout
+                            parent_msg_id = msg.get('parent_header', {}).get('msg_id')
+                            if parent_msg_id and parent_msg_id != msg_id:
+                                continue
                         
-                        elif msg_type == 'display_data':
-                            data = content['data']
-                            print(f"DEBUG: Display data - keys: {list(data.keys())}")
-                            if 'image/png' in data:
-                                result.plots.append(data['image/png'])
-                                print(f"DEBUG: Found plot in display_data!")
-                            elif 'text/html' in data:
-                                result.dataframes.append(data['text/html'])
-                    except queue.Empty:
-                        break
+                            msg_count += 1
+                            self._handle_iopub_message(result, msg)
+                        except queue.Empty:
+                            break
                 
-                print(f"DEBUG: Collected {msg_count} IOPub messages, stdout length: {len(result.stdout)}")
+                result.timings['execute'] = execute_span.duration
+                result.timings['drain'] = drain_span.duration
                 
-            except Exception as e:
-                print(f"DEBUG: Exception in execution: {e}")
-                import traceback
-                traceback.print_exc()
+                if timed_out:
+                    result.success = False
+                    result.set_error(
+                        f"Execution exceeded the {max_wait:g}s time limit and was interrupted. "
+                        "Variables assigned before the interruption are kept."
+                    )
+                
+                logger.debug("Collected %d IOPub messages, stdout length: %d", msg_count, len(result.stdout_buffer))
+                
+            except KernelDiedError:
+                raise
+            except Exception:
+                logger.exception("Exception in execution")
                 raise
             
             # Get variables snapshot
-            try:
-                vars_code = """
+            with trace.span('variables') as vars_span:
+                try:
+                    vars_code = """
 import json
-import pandas as pd
-import numpy as np
+import sys
+
+# Only inspect pandas/numpy objects if the libraries were imported; never import them here
+_pd = sys.modules.get('pandas')
+_np = sys.modules.get('numpy')
 
 _vars = []
-for name in dir():
-    if not name.startswith('_') and name not in ['In', 'Out', 'get_ipython', 'exit', 'quit', 'pd', 'np', 'json', 'pd', 'np', 'matplotlib', 'plt', 'sns', 'px', 'go', 'display', 'HTML', 'io', 'base64']:
+for _name in dir():
+    if not _name.startswith('_') and _name not in ['In', 'Out', 'get_ipython', 'exit', 'quit', 'pd', 'np', 'json', 'sys', 'matplotlib', 'plt', 'sns', 'px', 'go', 'display', 'HTML', 'io', 'base64', 'optimize_memory', 'memory_report', 'read_csv_optimized', 'dataset', 'load_dataset', 'clear_dataset_cache', 'sql', 'parallel_map', 'parallel_apply']:
         try:
-            obj = eval(name)
-            obj_type = type(obj).__name__
+            _obj = eval(_name)
+            _obj_type = type(_obj).__name__
             
-            var_info = {'name': name, 'type': obj_type}
+            _var_info = {'name': _name, 'type': _obj_type}
             
-            if isinstance(obj, pd.DataFrame):
-                var_info['type'] = 'DataFrame'
-                var_info['shape'] = str(obj.shape)
-                var_info['preview'] = obj.head().to_string()
-                var_info['summary'] = obj.describe().to_string() if len(obj.select_dtypes(include=[np.number]).columns) > 0 else 'No numeric columns'
-                var_info['value'] = f"DataFrame with {obj.shape[0]} rows and {obj.shape[1]} columns"
-            elif isinstance(obj, np.ndarray):
-                var_info['type'] = 'ndarray'
-                var_info['shape'] = str(obj.shape)
-                var_info['preview'] = str(obj[:10] if obj.size > 10 else obj)
-                var_info['value'] = f"ndarray of shape {obj.shape}"
-            elif isinstance(obj, (list, tuple)):
-                var_info['type'] = type(obj).__name__
-                var_info['shape'] = f"({len(obj)},)"
-                var_info['preview'] = str(obj[:10] if len(obj) > 10 else obj)
-                var_info['value'] = f"{type(obj).__name__} with {len(obj)} elements"
-            elif isinstance(obj, dict):
-                var_info['type'] = 'dict'
-                var_info['shape'] = f"({len(obj)} keys)"
-                var_info['preview'] = str(list(obj.keys())[:10])
-                var_info['value'] = f"dict with {len(obj)} keys"
+            if _pd is not None and isinstance(_obj, _pd.DataFrame):
+                _var_info['type'] = 'DataFrame'
+                _var_info['shape'] = str(_obj.shape)
+                _var_info['preview'] = _obj.head().to_string()
+                _var_info['summary'] = _obj.describe().to_string() if len(_obj.select_dtypes(include=[_np.number]).columns) > 0 else 'No numeric columns'
+                _var_info['value'] = f"DataFrame with {_obj.shape[0]} rows and {_obj.shape[1]} columns"
+                _var_info['memory'] = int(_obj.memory_usage(deep=True).sum())
+            elif _np is not None and isinstance(_obj, _np.ndarray):
+                _var_info['type'] = 'ndarray'
+                _var_info['shape'] = str(_obj.shape)
+                _var_info['preview'] = str(_obj[:10] if _obj.size > 10 else _obj)
+                _var_info['value'] = f"ndarray of shape {_obj.shape}"
+                _var_info['memory'] = int(_obj.nbytes)
+            elif isinstance(_obj, (list, tuple)):
+                _var_info['type'] = type(_obj).__name__
+                _var_info['shape'] = f"({len(_obj)},)"
+                _var_info['preview'] = str(_obj[:10] if len(_obj) > 10 else _obj)
+                _var_info['value'] = f"{type(_obj).__name__} with {len(_obj)} elements"
+            elif isinstance(_obj, dict):
+                _var_info['type'] = 'dict'
+                _var_info['shape'] = f"({len(_obj)} keys)"
+                _var_info['preview'] = str(list(_obj.keys())[:10])
+                _var_info['value'] = f"dict with {len(_obj)} keys"
             else:
-                var_info['value'] = str(obj)[:200]
+                _var_info['value'] = str(_obj)[:200]
+            if 'memory' not in _var_info:
+                _var_info['memory'] = sys.getsizeof(_obj)  # Shallow for containers
             
-            _vars.append(var_info)
-        except Exception as e:
+            _vars.append(_var_info)
+        except Exception:
             pass
 
 print(json.dumps(_vars))
 """
-                # Execute variable extraction
-                vars_msg_id = client.execute(vars_code)
-                vars_shell_reply = client.get_shell_msg(timeout=5)
-                
-                # Get the output
-                vars_output = ""
-                for _ in range(10):
-                    try:
-                        msg = client.get_iopub_msg(timeout=0.2)
-                        if msg.get('parent_header', {}).get('msg_id') == vars_msg_id:
-                            if msg['msg_type'] == 'stream' and msg['content']['name'] == 'stdout':
-                                vars_output += msg['content']['text']
-                    except queue.Empty:
-                        break
-                
-                if vars_output:
-                    import json
-                    try:
-                        variables_list = json.loads(vars_output.strip())
-                        # Convert to dict format (VariableSnapshot is a TypeScript type, not Python)
-                        result.variables = [dict(v) for v in variables_list]
-                        print(f"DEBUG: Extracted {len(result.variables)} variables: {[v.get('name') for v in result.variables]}")
-                    except Exception as e:
-                        print(f"DEBUG: Failed to parse variables: {e}")
-                        import traceback
-                        traceback.print_exc()
-            except Exception as e:
-                print(f"DEBUG: Variable extraction error: {e}")
-                import traceback
-                traceback.print_exc()
+                    # Execute variable extraction
+                    vars_msg_id = client.execute(vars_code)
+                    vars_shell_reply = client.get_shell_msg(timeout=5)
+                    
+                    # Get the output
+                    vars_output = ""
+                    for _ in range(10):
+                        try:
+                            msg = client.get_iopub_msg(timeout=0.2)
+                            if msg.get('parent_header', {}).get('msg_id') == vars_msg_id:
+                                if msg['msg_type'] == 'stream' and msg['content']['name'] == 'stdout':
+                                    vars_output += msg['content']['text']
+                        except queue.Empty:
+                            break
+                    
+                    if vars_output:
+                        try:
+                            variables_list = json.loads(vars_output.strip())
+                            # Convert to dict format (VariableSnapshot is a TypeScript type, not Python)
+                            result.variables = [dict(v) for v in variables_list]
+                            logger.debug("Extracted %d variables", len(result.variables))
+                        except Exception:
+                            logger.debug("Failed to parse variables", exc_info=True)
+                except Exception:
+                    logger.debug("Variable extraction error", exc_info=True)
+            result.timings['variables'] = vars_span.duration
             
             result.execution_time = time.time() - start_time
-            print(f"DEBUG: Final result - stdout: {repr(result.stdout)}")
-            print(f"DEBUG: stdout length: {len(result.stdout)}, stderr length: {len(result.stderr)}")
             
         except Exception as e:
             result.success = False
-            result.error = str(e)
-            result.stderr = str(e)
+            result.set_error(str(e))
             result.execution_time = time.time() - start_time
-            print(f"DEBUG: Exception during execution: {e}")
+            logger.warning("Exception during execution in session %s: %s", session_id, e)
+            if isinstance(e, KernelDiedError):
+                result.kernel_status = e.status
+                # A stopped cell's kernel is replaced or shut down by whoever stopped it
+                note = self._recover(session_id) if e.status != "stopped" else None
+                if note:
+                    result.set_error(f"{e} {note}")
         
+        result.finish_output()
+        if session_id in self.kernels:
+            self.sample_usage(session_id)
+            if result.success and self._checkpoint_due(session_id):
+                self._checkpointing.add(session_id)
+                self._executor.submit(self._auto_checkpoint, session_id)
+        metrics.OUTPUT_CHARS.labels(stream='stdout').inc(len(result.stdout_buffer))
+        metrics.OUTPUT_CHARS.labels(stream='stderr').inc(len(result.stderr_buffer))
+        for buffer in (result.stdout_buffer, result.stderr_buffer):
+            if buffer.spill_path:
+                self.spilled_outputs.setdefault(session_id, []).append(buffer.spill_path)
+        logger.debug(
+            "Final result - stdout length: %d, stderr length: %d",
+            len(result.stdout_buffer), len(result.stderr_buffer)
+        )
         return result
     
-    def restart_kernel(self, session_id: str):
-        """Restart a kernel"""
+    def _handle_iopub_message(self, result: ExecutionResult, msg: Dict) -> bool:
+        """Record one IOPub message in the result; returns True if it reports an error"""
+        msg_type = msg['msg_type']
+        content = msg['content']
+        logger.debug("IOPub msg: type=%s", msg_type)
+        metrics.IOPUB_MESSAGES.labels(msg_type=msg_type).inc()
+        
+        if msg_type == 'stream':
+            if content['name'] == 'stdout':
+                result.stdout_buffer.write(content['text'])
+            elif content['name'] == 'stderr':
+                result.stderr_buffer.write(content['text'])
+                result.success = False
+        
+        elif msg_type == 'execute_result':
+            data = content['data']
+            if 'image/png' in data:
+                result.plots.append(data['image/png'])
+            elif DATAFRAME_MIME_TYPE in data:
+                result.dataframes.append({'data': json.dumps(data[DATAFRAME_MIME_TYPE]), 'mimeType': DATAFRAME_MIME_TYPE})
+            elif 'text/html' in data:
+                result.dataframes.append({'data': data['text/html'], 'mimeType': 'text/html'})
+            elif 'text/plain' in data:
+                result.stdout_buffer.write(data['text/plain'])
+        
+        elif msg_type == 'display_data':
+            data = content['data']
+            if PROFILE_MIME_TYPE in data:
+                result.profile = data[PROFILE_MIME_TYPE]
+            elif 'image/png' in data:
+                result.plots.append(data['image/png'])
+            elif DATAFRAME_MIME_TYPE in data:
+                result.dataframes.append({'data': json.dumps(data[DATAFRAME_MIME_TYPE]), 'mimeType': DATAFRAME_MIME_TYPE})
+            elif 'text/html' in data:
+                result.dataframes.append({'data': data['text/html'], 'mimeType': 'text/html'})
+        
+        elif msg_type == 'error':
+            result.success = False
+            result.set_error('\n'.join(content['traceback']))
+            return True
+        
+        return False
+    
+    def _handle_shell_reply(self, result: ExecutionResult, shell_reply: Dict):
+        """Record an error status from the execute_reply if IOPub did not report it"""
+        if shell_reply['content']['status'] == 'error':
+            result.success = False
+            if not result.error:
+                result.set_error('\n'.join(shell_reply['content']['traceback']))
+    
+    def _run_internal(self, session_id: str, code: str, timeout: float = 60) -> str:
+        """Run helper code in a kernel, wait for it to finish and return its stdout"""
+        return self._run_code(self.clients[session_id], code, timeout, lambda: self._check_alive(session_id))
+    
+    def _run_code(self, client: "BlockingKernelClient", code: str, timeout: float = 60,
+                  check_alive=None) -> str:
+        msg_id = client.execute(code, silent=False, store_history=False)
+        deadline = time.time() + timeout
+        stdout = ""
+        error = None
+        
+        while True:
+            if time.time() > deadline:
+                raise TimeoutError(f"Kernel did not finish helper code within {timeout}s")
+            try:
+                msg = client.get_iopub_msg(timeout=0.1)
+            except queue.Empty:
+                if check_alive is not None:
+                    check_alive()
+                continue
+            if msg.get('parent_header', {}).get('msg_id') != msg_id:
+                continue
+            
+            msg_type = msg['msg_type']
+            content = msg['content']
+            if msg_type == 'stream' and content['name'] == 'stdout':
+                stdout += content['text']
+            elif msg_type == 'error':
+                error = f"{content['ename']}: {content['evalue']}"
+                logger.debug("Helper code failed:\n%s", '\n'.join(content['traceback']))
+            elif msg_type == 'status' and content['execution_state'] == 'idle':
+                break
+        
+        # Consume the matching shell reply so it is not picked up by a later execution
+        try:
+            while client.get_shell_msg(timeout=1).get('parent_header', {}).get('msg_id') != msg_id:
+                pass
+        except queue.Empty:
+            pass
+        
+        if error:
+            raise RuntimeError(error)
+        return stdout
+    
+    def checkpoint_kernel(self, session_id: str, path: Optional[str] = None) -> Dict:
+        """
+        Save the user namespace of a kernel to a checkpoint file. Without a path this is the
+        session's own checkpoint, which a respawn restores.
+        """
+        if session_id not in self.kernels:
+            raise KeyError(f"No kernel for session '{session_id}'")
+        
+        own = path is None
+        if own:
+            checkpoint_dir = self.storage.get_checkpoint_directory()
+            path = os.path.join(checkpoint_dir, f"{self.storage._sanitize_filename(session_id)}.ckpt")
+        
+        with self._session_lock(session_id):
+            output = self._run_internal(session_id, CHECKPOINT_CODE % {'path': path})
+        summary = json.loads(output.strip().splitlines()[-1])
+        if own:
+            self.checkpoints[session_id] = path
+        return {"path": path, **summary}
+    
+    def _checkpoint_due(self, session_id: str) -> bool:
+        """Whether a respawn-only checkpoint should be taken after a successful execution"""
+        if not AUTO_RESPAWN or session_id in self._checkpointing or self._background_stop.is_set():
+            return False
+        path = self.checkpoints.get(session_id)
+        try:
+            return path is None or time.time() - os.path.getmtime(path) >= CHECKPOINT_INTERVAL
+        except OSError:
+            return True
+    
+    def _auto_checkpoint(self, session_id: str):
+        """Checkpoint a session for _respawn (the next execution waits for it)"""
+        try:
+            with self._session_lock(session_id):
+                if session_id in self.kernels and session_id not in self.failures:
+                    self.checkpoint_kernel(session_id)
+        except Exception as e:
+            logger.warning("Could not checkpoint session %s: %s", session_id, e)
+        finally:
+            self._checkpointing.discard(session_id)
+    
+    def _drop_checkpoint(self, session_id: str):
+        path = self.checkpoints.pop(session_id, None)
+        if path and os.path.exists(path):
+            os.remove(path)
+    
+    def restore_checkpoint(self, session_id: str, path: str) -> Dict:
+        """Load a checkpoint file into a kernel's user namespace"""
+        with self._session_lock(session_id):
+            self.get_kernel(session_id)
+            output = self._run_internal(session_id, RESTORE_CODE % {'path': path})
+        return json.loads(output.strip().splitlines()[-1])
+    
+    def kernel_pid(self, session_id: str) -> Optional[int]:
+        """Process id of a session's kernel, if known"""
+        return self._pid_of(self.kernels.get(session_id))
+    
+    @staticmethod
+    def _pid_of(kernel) -> Optional[int]:
+        if kernel is None:
+            return None
+        # ForkedKernel exposes pid directly; jupyter_client keeps it on the provisioner
+        pid = getattr(kernel, 'pid', None)
+        if pid is None:
+            pid = getattr(getattr(kernel, 'provisioner', None), 'pid', None)
+        return pid
+    
+    def kernel_usage(self, session_id: str) -> Optional[Dict]:
+        """Resident memory and CPU seconds of a kernel process and its children"""
+        pid = self.kernel_pid(session_id)
+        if pid is None:
+            return None
+        try:
+            process = psutil.Process(pid)
+            processes = [process] + process.children(recursive=True)
+        except psutil.Error:
+            return None
+        
+        rss = 0
+        cpu_seconds = 0.0
+        for proc in processes:
+            try:
+                rss += proc.memory_info().rss
+                cpu_times = proc.cpu_times()
+                cpu_seconds += cpu_times.user + cpu_times.system
+            except psutil.Error:
+                pass
+        return {"pid": pid, "rss": rss, "cpu_seconds": cpu_seconds}
+    
+    def sample_usage(self, session_id: str) -> Dict:
+        """Record a kernel's current memory and CPU usage (and peak RSS) in its session record"""
+        record = self.usage.setdefault(session_id, {"status": "running"})
+        kernel = self.kernels.get(session_id)
+        if kernel is not None and record.get("status") == "running" and not kernel.is_alive():
+            record["status"], record["exitReason"] = self._death_reason(session_id)
+        usage = self.kernel_usage(session_id)
+        if usage is None:
+            return record
+        
+        now = time.time()
+        if "sampledAt" in record and now > record["sampledAt"]:
+            record["cpuPercent"] = 100 * (usage["cpu_seconds"] - record["cpuSeconds"]) / (now - record["sampledAt"])
+        record.update({
+            "pid": usage["pid"],
+            "rss": usage["rss"],
+            "peakRss": max(usage["rss"], record.get("peakRss", 0)),
+            "cpuSeconds": usage["cpu_seconds"],
+            "sampledAt": now,
+        })
+        return record
+    
+    def _start_sampler(self):
+        if self._sampler is None and USAGE_SAMPLE_INTERVAL > 0:
+            self._sampler = threading.Thread(target=self._sample_loop, name="kernel-usage-sampler", daemon=True)
+            self._sampler.start()
+    
+    def _sample_loop(self):
+        while not self._background_stop.wait(USAGE_SAMPLE_INTERVAL):
+            for session_id in list(self.kernels):
+                try:
+                    self.sample_usage(session_id)
+                except Exception as e:
+                    logger.debug("Usage sampling failed for session %s: %s", session_id, e)
+    
+    def resource_report(self, session_id: str) -> Dict:
+        """Limits, status and latest usage sample of a session's kernel"""
         if session_id in self.kernels:
-            self.kernels[session_id].restart_kernel()
-            self.clients[session_id] = self.kernels[session_id].client()
+            record = dict(self.sample_usage(session_id))
+        elif session_id in self.usage:
+            # Kernel already gone (e.g. OOM-killed); report how it ended
+            record = dict(self.usage[session_id])
+        else:
+            raise KeyError(f"No kernel for session '{session_id}'")
+        status = record.pop("status", "running")
+        exit_reason = record.pop("exitReason", None)
+        return {
+            "sessionId": session_id,
+            "status": status,
+            "exitReason": exit_reason,
+            "limits": self.limits.to_dict(),
+            "usage": record,
+        }
+    
+    def _death_reason(self, session_id: str) -> tuple:
+        """(status, message) explaining why a kernel process is gone"""
+        memory_mb = (self.limits.memory_bytes or 0) // (1024 * 1024)
+        if self.limits.oom_killed(session_id):
+            return "oom_killed", f"The kernel was killed for exceeding its {memory_mb} MB memory limit"
+        # jupyter_client keeps the Popen; forked kernels are reaped by the fork server
+        process = getattr(getattr(self.kernels.get(session_id), 'provisioner', None), 'process', None)
+        returncode = process.poll() if process is not None else None
+        if returncode == -signal.SIGXCPU:
+            return "cpu_limit", f"The kernel used up its {self.limits.cpu_seconds}s CPU time limit"
+        if returncode == -signal.SIGKILL:
+            return "killed", "The kernel was killed (SIGKILL), most likely by the out-of-memory killer"
+        return "died", "The kernel process exited unexpectedly"
+    
+    def _session_lock(self, session_id: str) -> threading.RLock:
+        return self._locks.setdefault(session_id, threading.RLock())
+    
+    @contextmanager
+    def _take_over(self, session_id: str):
+        """Hold a session's lock to replace or stop its kernel, stopping a cell that is running there"""
+        with self._takeovers_lock:
+            self._takeovers[session_id] = self._takeovers.get(session_id, 0) + 1
+        try:
+            with self._session_lock(session_id):
+                yield
+        finally:
+            with self._takeovers_lock:
+                self._takeovers[session_id] -= 1
+                if not self._takeovers[session_id]:
+                    del self._takeovers[session_id]
+    
+    def _start_heartbeat(self, session_id: str):
+        """Start pinging the kernel's heartbeat socket (read by the watchdog)"""
+        self._heartbeat_lost.pop(session_id, None)
+        client = self.clients.get(session_id)
+        if client is not None and WATCHDOG_INTERVAL > 0:
+            try:
+                client.hb_channel.start()
+            except Exception as e:
+                logger.debug("No heartbeat for session %s: %s", session_id, e)
+    
+    def _start_watchdog(self):
+        if self._watchdog is None and WATCHDOG_INTERVAL > 0:
+            self._watchdog = threading.Thread(target=self._watch_loop, name="kernel-watchdog", daemon=True)
+            self._watchdog.start()
+    
+    def _watch_loop(self):
+        while not self._background_stop.wait(WATCHDOG_INTERVAL):
+            for session_id in list(self.kernels):
+                try:
+                    self._watch(session_id)
+                except Exception as e:
+                    logger.debug("Watchdog check failed for session %s: %s", session_id, e)
+    
+    def _watch(self, session_id: str):
+        if session_id not in self.failures:
+            failure = self._probe(session_id)
+            if failure is None:
+                return
+            self._mark_failed(session_id, *failure)
+        if AUTO_RESPAWN:
+            lock = self._session_lock(session_id)
+            # If an execution holds the lock, it fails on the next check and recovers itself
+            if lock.acquire(blocking=False):
+                try:
+                    if session_id in self.failures:
+                        self._respawn(session_id)
+                finally:
+                    lock.release()
+    
+    def _probe(self, session_id: str) -> Optional[tuple]:
+        """(status, message) if a kernel's process is gone or its heartbeat stopped, else None"""
+        kernel = self.kernels.get(session_id)
+        client = self.clients.get(session_id)
+        if kernel is None or client is None:
+            return None
+        if not kernel.is_alive():
+            return self._death_reason(session_id)
+        hb_channel = client.hb_channel
+        if not hb_channel.is_alive():
+            return None
+        if hb_channel.is_beating():
+            self._heartbeat_lost.pop(session_id, None)
+            return None
+        lost_since = self._heartbeat_lost.setdefault(session_id, time.time())
+        if time.time() - lost_since < HEARTBEAT_TIMEOUT:
+            return None
+        return "unresponsive", f"The kernel stopped answering heartbeats for {HEARTBEAT_TIMEOUT:g}s"
+    
+    def _mark_failed(self, session_id: str, status: str, message: str):
+        """Record a dead kernel; executions on it fail immediately from now on"""
+        if session_id in self.failures:
+            return
+        self.failures[session_id] = (status, message)
+        record = self.usage.setdefault(session_id, {})
+        record.update({"status": status, "exitReason": message})
+        metrics.KERNEL_FAILURES.labels(status=status).inc()
+        logger.warning("Kernel for session %s failed: %s", session_id, message)
+    
+    def _check_alive(self, session_id: str):
+        """Raise KernelDiedError instead of waiting on a kernel that no longer exists"""
+        if session_id not in self.failures:
+            kernel = self.kernels.get(session_id)
+            if kernel is None or kernel.is_alive():
+                return
+            self._mark_failed(session_id, *self._death_reason(session_id))
+        status, message = self.failures[session_id]
+        if AUTO_RESPAWN:
+            raise KernelDiedError(f"Kernel died: {message}.", status)
+        raise KernelDiedError(
+            f"Kernel died: {message}. Its variables are lost; the next execution starts a new kernel.",
+            status
+        )
+    
+    def _recover(self, session_id: str) -> Optional[str]:
+        """
+        Clean up after a dead kernel. With KERNEL_AUTO_RESPAWN a replacement is started right
+        away; returns a note on what was restored for the error message.
+        """
+        with self._session_lock(session_id):
+            if AUTO_RESPAWN:
+                return self._respawn(session_id)
+            self._reap(session_id)
+            return None
+    
+    def _respawn(self, session_id: str) -> str:
+        """Replace a dead kernel with a new one and restore the session's last checkpoint"""
+        # Taken out first so shutting down the dead kernel doesn't delete it
+        checkpoint = self.checkpoints.pop(session_id, None)
+        status = self.failures.get(session_id, ("died", ""))[0]
+        self._reap(session_id)
+        self.failures.pop(session_id, None)
+        self.get_kernel(session_id)
+        restored: List[str] = []
+        age = None
+        if checkpoint and os.path.exists(checkpoint):
+            self.checkpoints[session_id] = checkpoint
+            try:
+                age = time.time() - os.path.getmtime(checkpoint)
+                restored = self.restore_checkpoint(session_id, checkpoint)["restored"]
+            except Exception as e:
+                logger.warning("Could not restore checkpoint for session %s: %s", session_id, e)
+        self.usage[session_id].update({"recoveredFrom": status, "restored": restored})
+        logger.info("Respawned kernel for session %s (%d variables restored)", session_id, len(restored))
+        if restored:
+            return (f"A new kernel was started and {len(restored)} variables were restored from "
+                    f"the checkpoint taken {age:.0f}s earlier; changes made since then are lost.")
+        return "A new kernel was started without a checkpoint to restore; its variables are lost."
+    
+    def _reap(self, session_id: str):
+        """Clean up after a dead kernel, keeping its usage record so the API can report how it ended"""
+        record = self.usage.get(session_id)
+        pid = self.kernel_pid(session_id)
+        if self.failures.get(session_id, ("",))[0] == "unresponsive" and pid is not None:
+            # A hung kernel won't answer the shutdown request; don't wait for it
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+        try:
+            self.shutdown_kernel(session_id)
+        except Exception as e:
+            logger.debug("Error cleaning up dead kernel for session %s: %s", session_id, e)
+            self.kernels.pop(session_id, None)
+            self.clients.pop(session_id, None)
+        if record is not None:
+            self.usage[session_id] = record
+    
+    def dataframe_page(self, session_id: str, handle: str, offset: int = 0, limit: int = 50,
+                       sort_by: Optional[str] = None, ascending: bool = True,
+                       query: Optional[str] = None, fmt: str = 'json') -> Dict:
+        """Fetch a page of a displayed DataFrame from the live object in the kernel"""
+        if session_id not in self.kernels:
+            raise KeyError(f"No kernel for session '{session_id}'")
+        code = (
+            "from kernel_runtime import dataframes as _d\n"
+            "try:\n"
+            f"    print(_d.page({handle!r}, {int(offset)}, {int(limit)}, {sort_by!r}, {bool(ascending)!r}, {query!r}, {fmt!r}))\n"
+            "finally:\n"
+            "    del _d\n"
+        )
+        with self._session_lock(session_id):
+            output = self._run_internal(session_id, code)
+        return json.loads(output.strip().splitlines()[-1])
+    
+    def startup_report(self, session_id: str) -> Dict:
+        """Kernel start time plus the kernel's own bootstrap and lazy-import timings"""
+        if session_id not in self.kernels:
+            raise KeyError(f"No kernel for session '{session_id}'")
+        with self._session_lock(session_id):
+            output = self._run_internal(
+                session_id,
+                "import json as _j; from kernel_runtime import lazy as _l; "
+                "print(_j.dumps(_l.startup_report())); del _j, _l"
+            )
+        return {
+            **self.startup_times.get(session_id, {}),
+            **json.loads(output.strip().splitlines()[-1]),
+            "provider": self.provider.name
+        }
+    
+    def fork_kernel(self, source_id: str, target_id: Optional[str] = None) -> Dict:
+        """Create a new session whose kernel starts from a copy of another session's state"""
+        if source_id not in self.kernels:
+            raise KeyError(f"No kernel for session '{source_id}'")
+        
+        target_id = target_id or f"{source_id}-fork-{uuid4().hex[:8]}"
+        if target_id in self.kernels:
+            raise ValueError(f"Session '{target_id}' already exists")
+        
+        start_time = time.time()
+        # A file per fork, so concurrent forks of one session don't overwrite each other's
+        fd, path = tempfile.mkstemp(
+            prefix=f"{self.storage._sanitize_filename(source_id)}-fork-", suffix=".ckpt",
+            dir=self.storage.get_checkpoint_directory()
+        )
+        os.close(fd)
+        try:
+            # Both locks for the whole fork: no cell runs in the source between the checkpoint
+            # and the restore, or in the target before it is restored
+            with self._session_lock(source_id), self._session_lock(target_id):
+                if source_id not in self.kernels:
+                    raise KeyError(f"No kernel for session '{source_id}'")
+                if target_id in self.kernels:
+                    raise ValueError(f"Session '{target_id}' already exists")
+                checkpoint = self.checkpoint_kernel(source_id, path)
+                try:
+                    restore = self.restore_checkpoint(target_id, path)
+                except Exception:
+                    # Don't leave a half-restored session behind
+                    self.shutdown_kernel(target_id)
+                    raise
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+        
+        return {
+            "sessionId": target_id,
+            "forkedFrom": source_id,
+            "restored": restore['restored'],
+            "failed": restore['failed'],
+            "skipped": checkpoint['skipped'],
+            "forkTime": time.time() - start_time
+        }
+    
+    def _close_client(self, session_id: str):
+        """Close a client's sockets; a client dropped with live channels can hang zmq context teardown"""
+        client = self.clients.pop(session_id, None)
+        if client is not None:
+            try:
+                client.stop_channels()
+            except Exception as e:
+                logger.debug("Error closing client for session %s: %s", session_id, e)
+    
+    def restart_kernel(self, session_id: str):
+        """Restart a kernel, stopping the cell it is running (if any)"""
+        with self._take_over(session_id):
+            if session_id in self.kernels:
+                # Swap in a bootstrapped kernel first, so the session is never without a
+                # working one; the old process is shut down in the background
+                standby = self._take_standby()
+                if standby is not None:
+                    kernel, client, timings = standby
+                    timings = {**timings, "standby": True}
+                else:
+                    kernel, client, timings = self._launch_kernel(session_id)
+                old_kernel = self.kernels[session_id]
+                old_client = self.clients.pop(session_id, None)
+                self._install(session_id, kernel, client, timings)
+                # A restarted session starts empty; a later respawn must not bring the old state back
+                self._drop_checkpoint(session_id)
+                self._teardown_async(old_kernel, old_client, session_id)
+                self._fill_standby()
     
     def shutdown_kernel(self, session_id: str):
-        """Shutdown a kernel"""
-        if session_id in self.kernels:
-            self.kernels[session_id].shutdown_kernel()
-            del self.kernels[session_id]
-            if session_id in self.clients:
-                del self.clients[session_id]
+        """Shutdown a kernel, stopping the cell it is running (if any)"""
+        with self._take_over(session_id):
+            if session_id in self.kernels:
+                self._close_client(session_id)
+                pid = self.kernel_pid(session_id)
+                self._stop_children(pid)
+                self.kernels[session_id].shutdown_kernel()
+                del self.kernels[session_id]
+                self.failures.pop(session_id, None)
+                self._heartbeat_lost.pop(session_id, None)
+                self._drop_checkpoint(session_id)
+                self.startup_times.pop(session_id, None)
+                self.usage.pop(session_id, None)
+                self.limits.release(session_id, pid)
+                for path in self.spilled_outputs.pop(session_id, []):
+                    if os.path.exists(path):
+                        os.remove(path)
+    
+    def _teardown(self, kernel, client, session_id: Optional[str] = None):
+        """
+        Shut down a kernel that no session uses any more. session_id is the session it
+        belonged to, whose cgroup for this kernel is removed once the process is gone.
+        """
+        pid = self._pid_of(kernel)
+        try:
+            if client is not None:
+                client.stop_channels()
+            self._stop_children(pid)
+            kernel.shutdown_kernel()
+        except Exception as e:
+            logger.debug("Error shutting down a replaced kernel: %s", e)
+        if session_id is not None:
+            self.limits.release(session_id, pid)
+    
+    def _teardown_async(self, kernel, client, session_id: Optional[str] = None):
+        threading.Thread(target=self._teardown, args=(kernel, client, session_id),
+                         name="kernel-teardown", daemon=True).start()
+    
+    def _stop_children(self, pid: Optional[int], timeout: float = 3):
+        """
+        Stop processes started by a kernel (its parallel worker pool, user subprocesses) so they
+        do not outlive it: once the kernel is gone they are reparented and can't be found.
+        """
+        if pid is None:
+            return
+        children = []
+        try:
+            for child in psutil.Process(pid).children(recursive=True):
+                try:
+                    # multiprocessing's resource tracker ignores SIGTERM and exits on its own
+                    # (unlinking leftover shared memory) once the kernel and workers are gone
+                    if 'resource_tracker' not in ' '.join(child.cmdline()):
+                        children.append(child)
+                except psutil.Error:
+                    pass
+        except psutil.Error:
+            return
+        for child in children:
+            try:
+                child.terminate()
+            except psutil.Error:
+                pass
+        _, alive = psutil.wait_procs(children, timeout=timeout)
+        for child in alive:
+            try:
+                child.kill()
+            except psutil.Error:
+                pass
+    
+    def shutdown_all(self):
+        """Shutdown every kernel and the kernel provider"""
+        self._background_stop.set()
+        with self._standby_lock:
+            standby, self._standby = self._standby, []
+        for kernel, client, _ in standby:
+            self._teardown(kernel, client)
+        for session_id in list(self.kernels):
+            try:
+                self.shutdown_kernel(session_id)
+            except Exception as e:
+                logger.warning("Shutdown error for session %s: %s", session_id, e)
+        self._executor.shutdown(wait=False)
+        self.provider.shutdown()
     
     async def get_variables(self, session_id: str) -> List[Dict]:
         """Get current variables in kernel"""
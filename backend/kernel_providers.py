@@ -0,0 +1,189 @@
+"""
+Kernel providers for the Python Kernel Manager
+A provider starts the kernel process behind a session and returns a handle with the
+small part of jupyter_client's KernelManager API that KernelManager uses:
+client(), is_alive(), interrupt_kernel(), restart_kernel() and shutdown_kernel().
+"""
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING, Optional
+from uuid import uuid4
+
+from resource_limits import ResourceLimits
+
+# jupyter_client (and its ZMQ stack) is imported when the first kernel starts, not with the API
+if TYPE_CHECKING:
+    from jupyter_client import BlockingKernelClient
+    from jupyter_client.manager import KernelManager as SyncKernelManager
+
+class KernelProvider:
+    """Base class for kernel providers"""
+    name = "base"
+
+    def __init__(self, limits: Optional[ResourceLimits] = None):
+        # rlimits are applied by the provider as the kernel process starts
+        self.limits = limits or ResourceLimits()
+
+    def start_kernel(self, session_id: str):
+        """Start a kernel for a session and return its handle"""
+        raise NotImplementedError
+
+    def shutdown(self):
+        """Release provider-wide resources (called when the API shuts down)"""
+        pass
+
+class JupyterKernelProvider(KernelProvider):
+    """Default provider: one ipykernel process per session launched by jupyter_client"""
+    name = "jupyter"
+
+    def start_kernel(self, session_id: str) -> "SyncKernelManager":
+        from jupyter_client.manager import KernelManager as SyncKernelManager
+        kernel_manager = SyncKernelManager()
+        # Launch arguments are reused by restart_kernel(), so restarted kernels keep the rlimits
+        kernel_manager.start_kernel(preexec_fn=self.limits.preexec_fn())
+        return kernel_manager
+
+class ForkedKernel:
+    """Handle for a kernel forked from the fork server"""
+
+    def __init__(self, provider: "ForkServerKernelProvider", session_id: str):
+        self.provider = provider
+        self.session_id = session_id
+        self.connection_file: Optional[str] = None
+        self.pid: Optional[int] = None
+        self._start()
+
+    def _start(self):
+        from jupyter_client.connect import write_connection_file
+        from jupyter_core.paths import jupyter_runtime_dir
+        runtime_dir = jupyter_runtime_dir()
+        os.makedirs(runtime_dir, exist_ok=True)
+        self.connection_file = os.path.join(runtime_dir, f"kernel-cocode-{uuid4().hex}.json")
+        write_connection_file(
+            self.connection_file,
+            ip="127.0.0.1",
+            key=uuid4().hex.encode(),
+            kernel_name="python3",
+        )
+        self.pid = self.provider.spawn(self.connection_file)
+
+    def client(self) -> "BlockingKernelClient":
+        from jupyter_client import BlockingKernelClient
+        client = BlockingKernelClient()
+        client.load_connection_file(self.connection_file)
+        return client
+
+    def is_alive(self) -> bool:
+        try:
+            os.kill(self.pid, 0)
+            return True
+        except (ProcessLookupError, TypeError):
+            return False
+        except PermissionError:
+            return True
+
+    def interrupt_kernel(self):
+        if self.is_alive():
+            os.kill(self.pid, signal.SIGINT)
+
+    def _kill(self, timeout: float = 5):
+        if not self.is_alive():
+            return
+        try:
+            os.killpg(self.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        deadline = time.time() + timeout
+        while self.is_alive() and time.time() < deadline:
+            time.sleep(0.05)
+        if self.is_alive():
+            try:
+                os.killpg(self.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def restart_kernel(self):
+        self._kill()
+        self._remove_connection_file()
+        self._start()
+
+    def shutdown_kernel(self):
+        self._kill()
+        self._remove_connection_file()
+
+    def _remove_connection_file(self):
+        if self.connection_file and os.path.exists(self.connection_file):
+            os.remove(self.connection_file)
+
+class ForkServerKernelProvider(KernelProvider):
+    """
+    Provider that keeps one fork server process with pandas/numpy/matplotlib already
+    imported and forks a kernel from it per session. Kernels start without re-importing
+    the stack and share its pages copy-on-write, which lowers per-session RSS.
+    """
+    name = "forkserver"
+
+    def __init__(self, limits: Optional[ResourceLimits] = None):
+        super().__init__(limits)
+        self._process: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+
+    def _ensure_server(self):
+        if self._process is not None and self._process.poll() is None:
+            return
+        server_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kernel_forkserver.py")
+        self._process = subprocess.Popen(
+            [sys.executable, server_path],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+        )
+        ready = self._process.stdout.readline()
+        if not ready:
+            raise RuntimeError("Kernel fork server failed to start")
+
+    def spawn(self, connection_file: str) -> int:
+        """Ask the fork server for a new kernel process bound to a connection file"""
+        with self._lock:
+            self._ensure_server()
+            request = {"connection_file": connection_file, "rlimits": self.limits.rlimits}
+            self._process.stdin.write(json.dumps(request) + "\n")
+            self._process.stdin.flush()
+            line = self._process.stdout.readline()
+        if not line:
+            raise RuntimeError("Kernel fork server exited unexpectedly")
+        reply = json.loads(line)
+        if "error" in reply:
+            raise RuntimeError(f"Kernel fork server error: {reply['error']}")
+        return reply["pid"]
+
+    def start_kernel(self, session_id: str) -> ForkedKernel:
+        return ForkedKernel(self, session_id)
+
+    def shutdown(self):
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                self._process.stdin.close()
+                try:
+                    self._process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    self._process.kill()
+            self._process = None
+
+PROVIDERS = {
+    JupyterKernelProvider.name: JupyterKernelProvider,
+    ForkServerKernelProvider.name: ForkServerKernelProvider,
+}
+
+def get_kernel_provider(name: Optional[str] = None, limits: Optional[ResourceLimits] = None) -> KernelProvider:
+    """Create the provider named by the argument or the KERNEL_PROVIDER environment variable"""
+    name = (name or os.getenv("KERNEL_PROVIDER", JupyterKernelProvider.name)).strip().lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown kernel provider '{name}'. Available: {', '.join(PROVIDERS)}")
+    return PROVIDERS[name](limits)
@@ -0,0 +1,5 @@
+"""
+Kernel runtime for Cocode IDE
+Helpers imported by the bootstrap code inside each Jupyter kernel (not by the API process,
+except memory, which FileStorage also uses to analyze uploads, and mime_types)
+"""
@@ -0,0 +1,411 @@
+"""
+Out-of-core dataset processing
+dataset(name) opens a CSV/TSV/Parquet file from the file storage without loading it: filters,
+projections and groupby aggregations are streamed over fixed-size chunks, so memory use is
+bounded by the chunk size and the size of the result rather than by the file. Chunks can be
+processed by the session's worker pool (workers=N).
+"""
+import contextlib
+import csv
+import io
+import json
+import os
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from kernel_runtime import parallel
+
+CHUNK_ROWS = int(os.getenv('COCODE_CHUNK_ROWS', '250000'))
+STORAGE_DIR: Optional[str] = None  # Set by the kernel bootstrap
+
+# Aggregations that can be computed per chunk and combined: the partial columns each needs
+_PARTS = {
+    'sum': ('sum',),
+    'count': ('count',),
+    'size': ('size',),
+    'min': ('min',),
+    'max': ('max',),
+    'mean': ('sum', 'count'),
+    'var': ('sum', 'count', 'sumsq'),
+    'std': ('sum', 'count', 'sumsq'),
+}
+# How partial columns from different chunks are combined
+_COMBINE = {'sum': 'sum', 'count': 'sum', 'size': 'sum', 'sumsq': 'sum', 'min': 'min', 'max': 'max'}
+
+def configure(storage_dir: str):
+    global STORAGE_DIR
+    STORAGE_DIR = storage_dir
+
+def _resolve(name: str) -> Tuple[str, str]:
+    """Path and format ('csv', 'tsv' or 'parquet') of a stored file, by stored or original name"""
+    directory = STORAGE_DIR or os.getcwd()
+    path = name if os.path.isabs(name) else os.path.join(directory, name)
+    file_type = None
+    try:
+        with open(os.path.join(directory, 'metadata.json')) as f:
+            metadata = json.load(f)
+        entry = metadata.get(os.path.basename(path)) or next(
+            (meta for meta in metadata.values() if meta.get('original_name') == name), None)
+        if entry:
+            path = os.path.join(directory, entry['filename'])
+            file_type = entry.get('file_type')
+    except (OSError, ValueError):
+        pass
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No such file in file storage: {name}")
+    fmt = (file_type or os.path.splitext(path)[1].lstrip('.')).lower()
+    if fmt in ('pq', 'parq'):
+        fmt = 'parquet'
+    if fmt not in ('csv', 'tsv', 'txt', 'parquet'):
+        raise ValueError(f"Unsupported format '{fmt}': expected CSV, TSV or Parquet")
+    return path, 'csv' if fmt == 'txt' else fmt
+
+class _RangeFile(io.RawIOBase):
+    """Read-only view of bytes [start, end) of a file, for reading one CSV split"""
+
+    def __init__(self, path: str, start: int, end: int):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        read = self._file.readinto(memoryview(buffer)[:size])
+        self._remaining -= read
+        return read
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+def _csv_splits(path: str, count: int, quotechar: Optional[str] = '"') -> List[Tuple[int, int]]:
+    """
+    Split a CSV body into about `count` byte ranges that start and end on record boundaries.
+    Quote characters are counted from the start of the file, so a newline inside a quoted
+    field is never taken as a boundary ("" escapes leave the count's parity unchanged).
+    """
+    size = os.path.getsize(path)
+    quote = quotechar.encode() if quotechar else None
+    inside = False  # Whether the current read position is inside a quoted field
+
+    def parity(data: bytes) -> bool:
+        return quote is not None and data.count(quote) % 2 == 1
+
+    def next_record(f):
+        # Read up to the end of the current record: a newline outside quotes
+        nonlocal inside
+        while True:
+            line = f.readline()
+            if not line:
+                return
+            inside ^= parity(line)
+            if not inside:
+                return
+
+    with open(path, 'rb') as f:
+        next_record(f)  # Header
+        start = f.tell()
+        bounds = [start]
+        for i in range(1, count):
+            target = start + (size - start) * i // count
+            if target <= f.tell():
+                continue
+            if quote is None:
+                f.seek(target - 1)
+            while f.tell() < target - 1:
+                inside ^= parity(f.read(min(1 << 20, target - 1 - f.tell())))
+            next_record(f)
+            if f.tell() > bounds[-1]:
+                bounds.append(f.tell())
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+def _normalize_agg(spec, named) -> List[Tuple[str, str, str]]:
+    """(output name, column, function) triples from a dict spec and/or named aggregations"""
+    outputs = []
+    for column, funcs in (spec or {}).items():
+        if isinstance(funcs, str):
+            outputs.append((column, column, funcs))
+        else:
+            outputs.extend((f"{column}_{func}", column, func) for func in funcs)
+    for name, (column, func) in named.items():
+        outputs.append((name, column, func))
+    if not outputs:
+        raise ValueError("No aggregations given")
+    for _, _, func in outputs:
+        if func not in _PARTS:
+            raise ValueError(f"Aggregation '{func}' cannot be computed in chunks; use one of {', '.join(_PARTS)}")
+    return outputs
+
+def _partial(df, by: Optional[List[str]], outputs):
+    """Partial aggregates of one chunk: one column per (column, part), indexed by the group keys"""
+    import pandas as pd
+    keys = by if by else pd.Series(0, index=df.index, name='__all__')
+    grouped = df.groupby(keys, observed=True, dropna=False, sort=False)
+    parts = {}
+    for _, column, func in outputs:
+        for part in _PARTS[func]:
+            if (column, part) in parts:
+                continue
+            if part == 'size':
+                parts[(column, part)] = grouped.size()
+            elif part == 'sumsq':
+                squares = df[column].astype('float64') ** 2
+                parts[(column, part)] = squares.groupby(
+                    [df[k] for k in by] if by else keys, observed=True, dropna=False, sort=False).sum()
+            else:
+                parts[(column, part)] = grouped[column].agg(part)
+    return pd.DataFrame(parts)
+
+def _combine(frames):
+    import pandas as pd
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        return None
+    merged = pd.concat(frames)
+    levels = list(range(merged.index.nlevels))
+    return merged.groupby(level=levels, dropna=False, sort=False).agg(
+        {column: _COMBINE[column[1]] for column in merged.columns})
+
+def _finalize(partial, by, outputs):
+    import numpy as np
+    import pandas as pd
+    if partial is None:
+        partial = pd.DataFrame(columns=pd.MultiIndex.from_tuples(
+            [(column, part) for _, column, func in outputs for part in _PARTS[func]]))
+    result = pd.DataFrame(index=partial.index)
+    for name, column, func in outputs:
+        if func == 'mean':
+            result[name] = partial[(column, 'sum')] / partial[(column, 'count')]
+        elif func in ('var', 'std'):
+            count = partial[(column, 'count')]
+            total = partial[(column, 'sum')]
+            var = (partial[(column, 'sumsq')] - total ** 2 / count) / (count - 1)
+            result[name] = np.sqrt(var.clip(lower=0)) if func == 'std' else var
+        else:
+            result[name] = partial[(column, func)]
+    if not by:
+        if result.empty:
+            # No rows: counts and sums are 0, everything else is undefined
+            return pd.Series({name: 0 if func in ('sum', 'count', 'size') else np.nan
+                              for name, _, func in outputs})
+        return result.iloc[0]
+    return result.sort_index()
+
+def _run_split(task: Tuple):
+    """Worker entry point: process one split of a dataset"""
+    dataset, split, mode, args = task
+    return dataset._process(dataset._read(split), mode, args)
+
+class Dataset:
+    """
+    A lazily evaluated pipeline over a stored file. filter/select/map return new datasets;
+    count/head/collect/agg/groupby(...).agg/to_parquet/to_csv stream the file to run it.
+    """
+
+    def __init__(self, path: str, fmt: str, chunksize: int = CHUNK_ROWS,
+                 columns: Optional[Sequence[str]] = None, steps: Tuple = (), **read_options):
+        self.path = path
+        self.format = fmt
+        self.chunksize = chunksize
+        self.columns = list(columns) if columns is not None else None
+        self.steps = steps
+        self.read_options = read_options
+
+    def _with(self, **changes) -> "Dataset":
+        options = dict(path=self.path, fmt=self.format, chunksize=self.chunksize,
+                       columns=self.columns, steps=self.steps)
+        options.update(changes)
+        return Dataset(**options, **self.read_options)
+
+    def __repr__(self):
+        return (f"<Dataset {os.path.basename(self.path)} ({self.format}, "
+                f"{len(self.steps)} steps, {self.chunksize} rows per chunk)>")
+
+    # Pipeline steps
+
+    def filter(self, predicate: Union[str, Callable]) -> "Dataset":
+        """Keep matching rows: a DataFrame.query expression or fn(chunk) -> boolean mask"""
+        return self._with(steps=self.steps + (('filter', predicate),))
+
+    def select(self, columns: Sequence[str]) -> "Dataset":
+        """Keep only these columns; before any other step, only they are read from the file"""
+        if not self.steps:
+            return self._with(columns=list(columns))
+        return self._with(steps=self.steps + (('select', list(columns)),))
+
+    def map(self, fn: Callable) -> "Dataset":
+        """Transform each chunk with fn(chunk) -> DataFrame (e.g. derive columns)"""
+        return self._with(steps=self.steps + (('map', fn),))
+
+    # Reading
+
+    def _splits(self, count: int) -> List:
+        if self.format == 'parquet':
+            import pyarrow.parquet as pq
+            groups = list(range(pq.ParquetFile(self.path).num_row_groups))
+            return [groups[i::count] for i in range(count) if groups[i::count]]
+        quoting = self.read_options.get('quoting', csv.QUOTE_MINIMAL)
+        quotechar = None if quoting == csv.QUOTE_NONE else self.read_options.get('quotechar', '"')
+        return _csv_splits(self.path, count, quotechar)
+
+    def _read(self, split=None) -> Iterator:
+        """Raw chunks of the whole file, or of one split (CSV byte range / Parquet row groups)"""
+        if self.format == 'parquet':
+            import pyarrow.parquet as pq
+            parquet_file = pq.ParquetFile(self.path)
+            batches = parquet_file.iter_batches(batch_size=self.chunksize, columns=self.columns,
+                                                row_groups=split)
+            for batch in batches:
+                yield batch.to_pandas()
+            return
+
+        import pandas as pd
+        from kernel_runtime.memory import stored_string_dtypes
+        options = {'sep': '\t' if self.format == 'tsv' else ',', 'usecols': self.columns,
+                   'dtype': stored_string_dtypes(self.path)}
+        options.update(self.read_options)
+        if split is None:
+            source = contextlib.nullcontext(self.path)
+        else:
+            # Splits have no header line; take the names from the file's header
+            options['names'] = list(pd.read_csv(self.path, sep=options['sep'], nrows=0).columns)
+            options['header'] = None
+            source = io.BufferedReader(_RangeFile(self.path, *split))
+        # read_csv doesn't close file objects it was given; the with block closes the range file
+        with source as handle, pd.read_csv(handle, chunksize=self.chunksize, **options) as reader:
+            for chunk in reader:
+                yield chunk
+
+    def _apply(self, chunk):
+        for kind, arg in self.steps:
+            if kind == 'filter':
+                if isinstance(arg, str):
+                    chunk = chunk.query(arg)
+                else:
+                    from pandas.api.types import is_bool_dtype
+                    mask = arg(chunk)
+                    chunk = chunk[mask] if is_bool_dtype(getattr(mask, 'dtype', None)) else mask
+            elif kind == 'select':
+                chunk = chunk[arg]
+            else:
+                chunk = arg(chunk)
+        return chunk
+
+    def chunks(self) -> Iterator:
+        """Iterate over processed chunks (pandas DataFrames)"""
+        for chunk in self._read():
+            yield self._apply(chunk)
+
+    # Running a pipeline: each mode maps chunks to a partial result and combines partials
+
+    def _process(self, chunks: Iterator, mode: str, args):
+        import pandas as pd
+        if mode == 'count':
+            return sum(len(self._apply(chunk)) for chunk in chunks)
+        if mode == 'collect':
+            limit = args
+            frames, rows = [], 0
+            for chunk in chunks:
+                chunk = self._apply(chunk)
+                frames.append(chunk)
+                rows += len(chunk)
+                if limit is not None and rows >= limit:
+                    break
+            return pd.concat(frames) if frames else None
+        by, outputs = args
+        partial = None
+        for chunk in chunks:
+            # Fold each chunk in right away so only one partial per group is held
+            partial = _combine([partial, _partial(self._apply(chunk), by, outputs)])
+        return partial
+
+    def _run(self, mode: str, args=None, workers: Optional[int] = None):
+        if not workers or workers <= 1:
+            return [self._process(self._read(), mode, args)]
+        # Splits run in the session's worker pool, which is sized by the kernel's CPU limit
+        workers = min(workers, parallel.max_workers())
+        tasks = [(self, split, mode, args) for split in self._splits(workers * 4)]
+        return parallel.parallel_map(_run_split, tasks, chunksize=1)
+
+    def count(self, workers: Optional[int] = None) -> int:
+        """Number of rows after the pipeline"""
+        return sum(self._run('count', workers=workers))
+
+    def head(self, n: int = 5):
+        """First n rows after the pipeline (reads only as many chunks as needed)"""
+        frame = self._process(self._read(), 'collect', n)
+        return frame.head(n) if frame is not None else None
+
+    def collect(self, workers: Optional[int] = None):
+        """The whole result as one DataFrame; filter/select first so it fits in memory"""
+        import pandas as pd
+        frames = [frame for frame in self._run('collect', workers=workers) if frame is not None]
+        return pd.concat(frames) if frames else None
+
+    def agg(self, spec: Optional[Dict] = None, workers: Optional[int] = None, **named):
+        """
+        Aggregate the whole dataset: agg({'bytes': 'sum', 'latency': ['mean', 'max']}) or
+        agg(total=('bytes', 'sum')). Supports sum, count, size, min, max, mean, var and std.
+        """
+        outputs = _normalize_agg(spec, named)
+        partial = _combine(self._run('agg', (None, outputs), workers))
+        return _finalize(partial, None, outputs)
+
+    def groupby(self, by: Union[str, Sequence[str]]) -> "GroupedDataset":
+        return GroupedDataset(self, [by] if isinstance(by, str) else list(by))
+
+    # Writing
+
+    def to_parquet(self, path: str) -> int:
+        """Stream the pipeline's output to a Parquet file; returns the number of rows written"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer, rows = None, 0
+        try:
+            for chunk in self.chunks():
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table.cast(writer.schema))
+                rows += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows
+
+    def to_csv(self, path: str, **kwargs) -> int:
+        """Stream the pipeline's output to a CSV file; returns the number of rows written"""
+        rows = 0
+        for i, chunk in enumerate(self.chunks()):
+            chunk.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False, **kwargs)
+            rows += len(chunk)
+        return rows
+
+class GroupedDataset:
+    def __init__(self, dataset: Dataset, by: List[str]):
+        self.dataset = dataset
+        self.by = by
+
+    def agg(self, spec: Optional[Dict] = None, workers: Optional[int] = None, **named):
+        """Streaming groupby aggregation; same aggregations as Dataset.agg"""
+        outputs = _normalize_agg(spec, named)
+        partial = _combine(self.dataset._run('agg', (self.by, outputs), workers))
+        return _finalize(partial, self.by, outputs)
+
+    def size(self, workers: Optional[int] = None):
+        return self.agg(size=(self.by[0], 'size'), workers=workers)['size']
+
+def dataset(name: str, chunksize: int = CHUNK_ROWS, columns: Optional[Sequence[str]] = None,
+            **read_options) -> Dataset:
+    """
+    Open a CSV/TSV/Parquet file from the file storage (by stored or original name, or a path)
+    for chunked processing, e.g.
+        dataset('logs.csv').filter('status >= 500').groupby('host').agg(hits=('status', 'size'))
+    """
+    path, fmt = _resolve(name)
+    return Dataset(path, fmt, chunksize=chunksize, columns=columns, **read_options)
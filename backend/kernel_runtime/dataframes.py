@@ -0,0 +1,149 @@
+"""
+Compact DataFrame display for the kernel
+A displayed DataFrame is sent as a small JSON handle (schema, row count, first page) instead
+of its full HTML table. The live object stays in the kernel so it can be paged, sorted and
+filtered on request. Displayed frames are held by weak references only: deleting a
+DataFrame frees it even while its output is on screen (its handle then expires).
+"""
+import base64
+import json
+import os
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from uuid import uuid4
+
+from kernel_runtime.lazy import register_post_import_hook
+from kernel_runtime.mime_types import DATAFRAME_MIME_TYPE as MIME_TYPE
+
+PAGE_SIZE = int(os.getenv('COCODE_DATAFRAME_PAGE_SIZE', '50'))
+MAX_HANDLES = int(os.getenv('COCODE_DATAFRAME_MAX_HANDLES', '20'))
+# Sorted/filtered copies kept for paging, in total bytes; larger views are recomputed per page
+VIEW_CACHE_BYTES = int(os.getenv('COCODE_DATAFRAME_VIEW_CACHE_BYTES', str(64 * 1024 * 1024)))
+
+# handle -> weak reference to the DataFrame, least recently displayed first
+_frames: "OrderedDict[str, weakref.ref]" = OrderedDict()
+# (handle, sort_by, ascending, query) -> (sorted/filtered copy, bytes), so paging doesn't re-sort
+_views: "OrderedDict[tuple, tuple]" = OrderedDict()
+_MAX_VIEWS = 4
+# Handles whose DataFrame was garbage collected; their views are dropped on the next access
+_collected: List[str] = []
+
+def _nbytes(df) -> int:
+    return int(df.memory_usage(index=True, deep=False).sum())
+
+def _forget(handle: str):
+    _frames.pop(handle, None)
+    for key in [key for key in _views if key[0] == handle]:
+        del _views[key]
+
+def _purge():
+    # Weakref callbacks only record the handle: they can run in the middle of any allocation,
+    # including while _frames or _views are being iterated
+    while _collected:
+        _forget(_collected.pop())
+
+def _remember(df) -> str:
+    _purge()
+    for handle, ref in _frames.items():
+        if ref() is df:
+            _frames.move_to_end(handle)
+            return handle
+    handle = f"df-{uuid4().hex[:12]}"
+    _frames[handle] = weakref.ref(df, lambda _, handle=handle: _collected.append(handle))
+    while len(_frames) > MAX_HANDLES:
+        _forget(next(iter(_frames)))
+    return handle
+
+def _label(value) -> str:
+    if isinstance(value, tuple):
+        return ' / '.join(str(part) for part in value)
+    return str(value)
+
+def _schema(df) -> List[Dict[str, str]]:
+    return [{'name': _label(name), 'dtype': str(dtype)} for name, dtype in df.dtypes.items()]
+
+def _page_rows(page) -> Dict[str, List]:
+    split = json.loads(page.to_json(orient='split', date_format='iso', default_handler=str))
+    return {'index': split['index'], 'rows': split['data']}
+
+def _page_arrow(page) -> str:
+    import pyarrow as pa
+    table = pa.Table.from_pandas(page, preserve_index=True)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return base64.b64encode(sink.getvalue().to_pybytes()).decode('ascii')
+
+def describe(df, handle: str, offset: int = 0, limit: int = PAGE_SIZE, fmt: str = 'json') -> Dict:
+    """Handle payload: schema, row count and one page of data"""
+    page = df.iloc[offset:offset + limit]
+    payload = {
+        'handle': handle,
+        'rowCount': len(df),
+        'columns': _schema(df),
+        'indexName': _label(df.index.name) if df.index.name is not None else None,
+        'offset': offset,
+        'limit': limit,
+        'format': fmt,
+    }
+    if fmt == 'arrow':
+        payload['arrow'] = _page_arrow(page)
+    else:
+        payload.update(_page_rows(page))
+    return payload
+
+def _format_dataframe(df, include=None, exclude=None):
+    """IPython mimebundle formatter for pandas.DataFrame"""
+    handle = _remember(df)
+    rows, cols = df.shape
+    return {
+        MIME_TYPE: describe(df, handle),
+        'text/plain': f"DataFrame with {rows} rows and {cols} columns",
+    }
+
+def register_formatter(shell):
+    """Send DataFrames as compact handles instead of HTML, once pandas is imported"""
+    formatter = shell.display_formatter
+
+    def install(pandas):
+        formatter.mimebundle_formatter.for_type(pandas.DataFrame, _format_dataframe)
+        # Skip the expensive HTML table; the handle carries everything the frontend renders
+        formatter.formatters['text/html'].for_type(pandas.DataFrame, lambda df: None)
+
+    register_post_import_hook('pandas', install)
+
+def _view(handle: str, sort_by: Optional[str], ascending: bool, query: Optional[str]):
+    _purge()
+    df = _frames[handle]() if handle in _frames else None
+    if df is None:
+        raise KeyError(f"Unknown or expired DataFrame handle '{handle}'")
+    if not query and not sort_by:
+        return df
+    key = (handle, sort_by, ascending, query)
+    if key in _views:
+        _views.move_to_end(key)
+        return _views[key][0]
+
+    if query:
+        df = df.query(query)
+    if sort_by:
+        column = next((name for name in df.columns if _label(name) == sort_by), None)
+        if column is None:
+            raise KeyError(f"Unknown column '{sort_by}'")
+        df = df.sort_values(column, ascending=ascending, kind='stable')
+
+    size = _nbytes(df)
+    if size <= VIEW_CACHE_BYTES:
+        _views[key] = (df, size)
+        while len(_views) > _MAX_VIEWS or sum(cached for _, cached in _views.values()) > VIEW_CACHE_BYTES:
+            _views.popitem(last=False)
+    return df
+
+def page(handle: str, offset: int = 0, limit: int = PAGE_SIZE, sort_by: Optional[str] = None,
+         ascending: bool = True, query: Optional[str] = None, fmt: str = 'json') -> str:
+    """JSON for one page of a displayed DataFrame, optionally sorted and filtered"""
+    df = _view(handle, sort_by, ascending, query)
+    payload = describe(df, handle, offset=max(offset, 0), limit=max(limit, 1), fmt=fmt)
+    payload.update({'sortBy': sort_by, 'ascending': ascending, 'query': query})
+    return json.dumps(payload)
@@ -0,0 +1,102 @@
+"""
+Cached dataset loading
+load_dataset(name) reads a stored file into a DataFrame once and hands back the same frame on
+later calls for as long as the file is unchanged. The cache is keyed by the content hash that
+FileStorage records for every upload, so re-uploading a file through the IDE makes the next
+load_dataset call read the new version, while re-running a cell costs no re-parse.
+"""
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+STORAGE_DIR: Optional[str] = None  # Set by the kernel bootstrap
+
+# (filename, read options) -> (version token, DataFrame)
+_cache: Dict[Tuple[str, str], Tuple[str, object]] = {}
+
+def configure(storage_dir: str):
+    global STORAGE_DIR
+    STORAGE_DIR = storage_dir
+
+def _resolve(name: str) -> Tuple[str, Dict]:
+    """Path and metadata entry of a stored file, by stored or original name"""
+    directory = STORAGE_DIR or os.getcwd()
+    path = name if os.path.isabs(name) else os.path.join(directory, name)
+    entry: Dict = {}
+    try:
+        with open(os.path.join(directory, 'metadata.json')) as f:
+            metadata = json.load(f)
+        entry = metadata.get(os.path.basename(path)) or next(
+            (meta for meta in metadata.values() if meta.get('original_name') == name), None) or {}
+        if entry:
+            path = os.path.join(directory, entry['filename'])
+    except (OSError, ValueError):
+        pass
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"No such file in file storage: {name}")
+    return path, entry
+
+def _version(path: str, entry: Dict) -> str:
+    # Files written outside FileStorage have no recorded hash; size and mtime stand in
+    if entry.get('hash'):
+        return entry['hash']
+    stat = os.stat(path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+def _read(path: str, kwargs: Dict):
+    import pandas as pd
+    from kernel_runtime.memory import stored_string_dtypes
+    ext = os.path.splitext(path)[1].lstrip('.').lower()
+    if ext in ('csv', 'tsv', 'txt'):
+        if ext == 'tsv':
+            kwargs.setdefault('sep', '\t')
+        if 'dtype' not in kwargs:
+            kwargs['dtype'] = stored_string_dtypes(path)
+        return pd.read_csv(path, **kwargs)
+    if ext in ('parquet', 'pq'):
+        return pd.read_parquet(path, **kwargs)
+    if ext in ('json', 'jsonl', 'ndjson'):
+        if ext != 'json':
+            kwargs.setdefault('lines', True)
+        return pd.read_json(path, **kwargs)
+    if ext in ('xlsx', 'xls'):
+        return pd.read_excel(path, **kwargs)
+    if ext == 'feather':
+        return pd.read_feather(path, **kwargs)
+    raise ValueError(f"Unsupported format '{ext}': expected CSV, TSV, Parquet, JSON, Excel or Feather")
+
+def load_dataset(name: str, reload: bool = False, **kwargs):
+    """
+    Load a stored file as a DataFrame, e.g. df = load_dataset('sales.csv', usecols=['day', 'total']).
+    The result is cached per file and read options and re-read only when the file changes
+    (or reload=True). The cached frame itself is returned, so copy it before modifying it in
+    place if later calls should see the original data.
+    """
+    path, entry = _resolve(name)
+    filename = os.path.basename(path)
+    key = (filename, repr(sorted(kwargs.items())))
+    version = _version(path, entry)
+    cached = _cache.get(key)
+    if cached is not None and cached[0] == version and not reload:
+        return cached[1]
+    df = _read(path, dict(kwargs))
+    # Only the current version of a file is kept
+    for old in [k for k in _cache if k[0] == filename and _cache[k][0] != version]:
+        del _cache[old]
+    if cached is not None and cached[0] != version:
+        print(f"{filename} changed since it was last loaded"
+              + (f" (now version {entry['version']})" if entry.get('version') else "") + "; reloaded")
+    _cache[key] = (version, df)
+    return df
+
+def clear_dataset_cache(name: Optional[str] = None):
+    """Drop the cached DataFrames of one file, or of all files"""
+    if name is None:
+        _cache.clear()
+        return
+    try:
+        filename = os.path.basename(_resolve(name)[0])
+    except FileNotFoundError:
+        filename = os.path.basename(name)  # Deleted since it was loaded
+    for key in [k for k in _cache if k[0] == filename]:
+        del _cache[key]
@@ -0,0 +1,141 @@
+"""
+Lazy module proxies and post-import hooks for the kernel bootstrap
+"""
+import importlib
+import importlib.abc
+import importlib.util
+import sys
+import threading
+import time
+import types
+from typing import Callable, Dict, List, Optional
+
+# Seconds spent running the bootstrap code, set by the init code
+BOOTSTRAP_TIME: Optional[float] = None
+
+# alias -> seconds spent on the first (real) import
+IMPORT_TIMES: Dict[str, float] = {}
+
+_post_import_hooks: Dict[str, List[Callable]] = {}
+_hooks_lock = threading.RLock()
+
+class LazyModule(types.ModuleType):
+    """
+    Module placeholder that imports the real module on first attribute access.
+    Once loaded, the placeholder replaces itself in the user namespace with the real module.
+    """
+
+    def __init__(self, module_name: str, alias: str):
+        super().__init__(module_name)
+        self.__dict__['_lazy_alias'] = alias
+        self.__dict__['_lazy_module'] = None
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            start = time.perf_counter()
+            module = importlib.import_module(self.__name__)
+            IMPORT_TIMES[self._lazy_alias] = time.perf_counter() - start
+            self.__dict__['_lazy_module'] = module
+            _rebind(self, module)
+        return module
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        if self.__dict__['_lazy_module'] is None:
+            return f"<lazy module '{self.__name__}' (not yet imported)>"
+        return repr(self.__dict__['_lazy_module'])
+
+def _rebind(proxy: LazyModule, module: types.ModuleType):
+    """Swap the proxy for the real module in the user namespace so later access is direct"""
+    from IPython import get_ipython
+    shell = get_ipython()
+    if shell is None:
+        return
+    namespace = shell.user_ns
+    if namespace.get(proxy._lazy_alias) is proxy:
+        namespace[proxy._lazy_alias] = module
+
+def lazy_import(module_name: str, alias: str):
+    """Return the module if it is already imported, otherwise a LazyModule for it"""
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    return LazyModule(module_name, alias)
+
+class _HookedLoader(importlib.abc.Loader):
+    """Loader wrapper that runs post-import hooks after the real loader executes the module"""
+
+    def __init__(self, loader, fullname: str):
+        self._loader = loader
+        self._fullname = fullname
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._loader.exec_module(module)
+        _run_hooks(self._fullname, module)
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+class _PostImportFinder(importlib.abc.MetaPathFinder):
+    """Meta path finder that wraps the loader of modules that have post-import hooks"""
+
+    def __init__(self):
+        self._resolving = set()
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname not in _post_import_hooks or fullname in self._resolving:
+            return None
+        self._resolving.add(fullname)
+        try:
+            spec = importlib.util.find_spec(fullname)
+        finally:
+            self._resolving.discard(fullname)
+        if spec is not None and spec.loader is not None:
+            spec.loader = _HookedLoader(spec.loader, fullname)
+        return spec
+
+_finder = _PostImportFinder()
+
+def _run_hooks(fullname: str, module: types.ModuleType):
+    with _hooks_lock:
+        hooks = _post_import_hooks.pop(fullname, [])
+    for hook in hooks:
+        try:
+            hook(module)
+        except Exception:
+            import traceback
+            traceback.print_exc()
+
+def register_post_import_hook(fullname: str, hook: Callable[[types.ModuleType], None]):
+    """Call hook(module) once the named module is imported (immediately if it already is)"""
+    module = sys.modules.get(fullname)
+    if module is not None:
+        hook(module)
+        return
+    with _hooks_lock:
+        _post_import_hooks.setdefault(fullname, []).append(hook)
+        if _finder not in sys.meta_path:
+            sys.meta_path.insert(0, _finder)
+
+def startup_report() -> Dict:
+    """Bootstrap time and which lazily imported modules have been loaded so far"""
+    return {
+        "bootstrapTime": BOOTSTRAP_TIME,
+        "importTimes": dict(IMPORT_TIMES),
+        "loadedModules": sorted(
+            name for name in ('pandas', 'numpy', 'matplotlib', 'seaborn', 'plotly')
+            if name in sys.modules
+        ),
+    }
@@ -0,0 +1,148 @@
+"""
+DataFrame memory optimizer
+Recommends and applies smaller dtypes: integer/float downcasting, category for repetitive
+strings and Arrow-backed strings for the rest. Also used by FileStorage to analyze uploads.
+"""
+import os
+from typing import Dict, List, Optional
+
+# Object columns with fewer distinct values than this share of rows become categories
+CATEGORY_RATIO = float(os.getenv('COCODE_CATEGORY_RATIO', '0.5'))
+
+def _arrow_strings() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def _recommend(series, category_ratio: float, arrow_strings: bool) -> Optional[str]:
+    """Smaller dtype for a column, or None if it is already compact"""
+    import numpy as np
+    import pandas as pd
+    from pandas.api import types
+
+    if types.is_bool_dtype(series) or isinstance(series.dtype, pd.CategoricalDtype):
+        return None
+    if types.is_integer_dtype(series) and not types.is_extension_array_dtype(series):
+        if series.empty:
+            return None
+        low, high = series.min(), series.max()
+        for dtype in ('uint8', 'uint16', 'uint32') if low >= 0 else ('int8', 'int16', 'int32'):
+            info = np.iinfo(dtype)
+            if info.min <= low and high <= info.max:
+                return dtype if np.dtype(dtype).itemsize < series.dtype.itemsize else None
+        return None
+    if types.is_float_dtype(series) and series.dtype.itemsize > 4:
+        # Only when every value survives the round trip, so no precision is lost
+        values = series.to_numpy()
+        if np.array_equal(values.astype('float32').astype(values.dtype), values, equal_nan=True):
+            return 'float32'
+        return None
+    if types.is_object_dtype(series) or types.is_string_dtype(series):
+        non_null = series.dropna()
+        if non_null.empty or types.infer_dtype(non_null, skipna=True) != 'string':
+            return None  # Mixed objects are left alone
+        if non_null.nunique() < category_ratio * len(series):
+            return 'category'
+        already_arrow = isinstance(series.dtype, pd.StringDtype) and series.dtype.storage == 'pyarrow'
+        if arrow_strings and not already_arrow:
+            return 'string[pyarrow]'
+    return None
+
+def recommend_dtypes(df, category_ratio: float = CATEGORY_RATIO, arrow_strings: Optional[bool] = None) -> Dict[str, str]:
+    """Map of column name to recommended dtype, for the columns that would shrink"""
+    if arrow_strings is None:
+        arrow_strings = _arrow_strings()
+    recommended = {}
+    for name in df.columns:
+        dtype = _recommend(df[name], category_ratio, arrow_strings)
+        if dtype is not None:
+            recommended[name] = dtype
+    return recommended
+
+def analyze(df, category_ratio: float = CATEGORY_RATIO, arrow_strings: Optional[bool] = None) -> Dict:
+    """Per-column recommendation with deep memory usage before and after, in bytes"""
+    recommended = recommend_dtypes(df, category_ratio, arrow_strings)
+    columns: List[Dict] = []
+    bytes_before = int(df.index.memory_usage(deep=True))
+    bytes_after = bytes_before
+    for name in df.columns:
+        series = df[name]
+        before = int(series.memory_usage(deep=True, index=False))
+        after = before
+        if name in recommended:
+            after = int(series.astype(recommended[name]).memory_usage(deep=True, index=False))
+        bytes_before += before
+        bytes_after += after
+        columns.append({
+            'column': str(name),
+            'dtype': str(series.dtype),
+            'recommended': recommended.get(name),
+            'bytes': before,
+            'optimizedBytes': after,
+        })
+    return {
+        'bytesBefore': bytes_before,
+        'bytesAfter': bytes_after,
+        'dtypes': {str(name): dtype for name, dtype in recommended.items()},
+        'columns': columns,
+    }
+
+def _format_bytes(size: float) -> str:
+    for unit in ('B', 'KB', 'MB'):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+def memory_report(df, category_ratio: float = CATEGORY_RATIO):
+    """DataFrame listing each column's dtype, recommended dtype and memory before/after"""
+    import pandas as pd
+    report = analyze(df, category_ratio)
+    return pd.DataFrame(report['columns']).set_index('column')
+
+def optimize_memory(df, category_ratio: float = CATEGORY_RATIO, arrow_strings: Optional[bool] = None,
+                    verbose: bool = True):
+    """
+    Return a copy of df with smaller dtypes (integers/floats downcast losslessly, repetitive
+    strings as category, other strings Arrow-backed) and print the memory saved.
+    """
+    recommended = recommend_dtypes(df, category_ratio, arrow_strings)
+    before = int(df.memory_usage(deep=True).sum())
+    optimized = df.astype(recommended) if recommended else df.copy()
+    if verbose:
+        after = int(optimized.memory_usage(deep=True).sum())
+        saved = 100 * (before - after) / before if before else 0
+        print(f"Memory: {_format_bytes(before)} -> {_format_bytes(after)} "
+              f"({saved:.0f}% smaller, {len(recommended)} of {df.shape[1]} columns converted)")
+    return optimized
+
+def stored_string_dtypes(path) -> Optional[Dict[str, str]]:
+    """
+    String dtypes recommended by the upload analysis of a file in the file storage (its
+    metadata.json entry). Numeric downcasts from a sample may not fit the whole file, so
+    only category/string[pyarrow] recommendations are returned.
+    """
+    import json
+    metadata_file = os.path.join(os.path.dirname(os.path.abspath(path)), 'metadata.json')
+    try:
+        with open(metadata_file) as f:
+            analysis = json.load(f).get(os.path.basename(path), {}).get('memory') or {}
+    except (OSError, ValueError):
+        return None
+    return {
+        name: dtype for name, dtype in analysis.get('dtypes', {}).items()
+        if dtype in ('category', 'string[pyarrow]')
+    } or None
+
+def read_csv_optimized(path, category_ratio: float = CATEGORY_RATIO, verbose: bool = True, **kwargs):
+    """
+    pd.read_csv followed by optimize_memory. String dtypes recommended by an upload analysis
+    (FileStorage metadata) are applied while parsing, which also lowers peak memory.
+    """
+    import pandas as pd
+    if 'dtype' not in kwargs:
+        kwargs['dtype'] = stored_string_dtypes(path)
+    df = pd.read_csv(path, **kwargs)
+    return optimize_memory(df, category_ratio, verbose=verbose)
@@ -0,0 +1,10 @@
+"""
+Display types of Cocode's structured outputs
+Emitted by the kernel helpers and recognized by the API. Plain constants with no imports, so
+the API process can use them without loading kernel_manager or the kernel stack.
+"""
+# Compact DataFrame handles emitted by kernel_runtime.dataframes
+DATAFRAME_MIME_TYPE = 'application/vnd.cocode.dataframe+json'
+
+# Per-cell profile emitted by kernel_runtime.profiling
+PROFILE_MIME_TYPE = 'application/vnd.cocode.profile+json'
@@ -0,0 +1,244 @@
+"""
+Session worker pool for the kernel
+parallel_map and parallel_apply run functions in a process pool that is created on first use
+and shared by every cell of the session. Workers come from a forkserver (spawn where there is
+none), never from a fork of the kernel itself, which would copy its ZMQ sockets, IO threads
+and matplotlib state. Functions, arguments and results are shipped with cloudpickle, so
+lambdas and functions and classes defined in cells work; large NumPy arrays and DataFrames
+are handed to workers through shared memory instead of being pickled through a pipe. What a
+worker prints is shown in the cell's output.
+"""
+import atexit
+import contextlib
+import io
+import math
+import multiprocessing
+import os
+import pickle
+import sys
+import threading
+import traceback
+from typing import Any, Callable, Iterable, List, Optional
+
+# Arguments at least this large go through shared memory
+SHM_MIN_BYTES = int(os.getenv('COCODE_SHM_MIN_BYTES', str(1024 * 1024)))
+
+_max_workers: Optional[int] = None
+_pool = None
+_lock = threading.Lock()
+_attached: List = []  # Shared memory segments opened by this worker for the current task
+
+def configure(cpu_limit: Optional[float] = None):
+    """Size the pool from the kernel's CPU limit (cores), the CPU affinity or COCODE_MAX_WORKERS"""
+    global _max_workers
+    try:
+        available = len(os.sched_getaffinity(0))
+    except AttributeError:
+        available = os.cpu_count() or 1
+    if cpu_limit:
+        available = min(available, max(1, math.floor(cpu_limit)))
+    override = os.getenv('COCODE_MAX_WORKERS')
+    _max_workers = int(override) if override else available
+
+def max_workers() -> int:
+    if _max_workers is None:
+        configure()
+    return _max_workers
+
+def get_pool():
+    """The session's process pool, created on first use"""
+    global _pool
+    with _lock:
+        # A worker that died (e.g. killed for memory) breaks the pool; start a fresh one
+        if _pool is None or getattr(_pool, '_broken', False):
+            from concurrent.futures import ProcessPoolExecutor
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context('forkserver')
+                # Imported once in the server, before it forks workers (only takes effect when
+                # the server starts, i.e. for the session's first pool)
+                context.set_forkserver_preload(
+                    [__name__] + [name for name in ('numpy', 'pandas', 'pyarrow') if name in sys.modules]
+                )
+            else:
+                context = multiprocessing.get_context('spawn')
+            # Workers are handed the kernel's resource tracker, which owns the shared memory
+            _pool = ProcessPoolExecutor(max_workers=max_workers(), mp_context=context)
+        return _pool
+
+def shutdown():
+    """Stop the worker processes (the next parallel call starts a new pool)"""
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+atexit.register(shutdown)
+
+def pool_info() -> dict:
+    return {'maxWorkers': max_workers(), 'started': _pool is not None}
+
+def dumps(obj) -> bytes:
+    # By value for anything defined in a cell: workers don't run the kernel's __main__
+    import cloudpickle
+    return cloudpickle.dumps(obj)
+
+class RemoteTraceback(Exception):
+    """The traceback of an exception raised in a worker (chained to the re-raised exception)"""
+
+    def __init__(self, tb: str):
+        self.tb = tb
+
+    def __str__(self):
+        return self.tb
+
+# Shared memory transfer
+
+class _SharedArray:
+    def __init__(self, name: str, shape, dtype: str):
+        self.name, self.shape, self.dtype = name, shape, dtype
+
+    def load(self):
+        import numpy as np
+        shm = _attach(self.name)
+        return np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf)
+
+class _SharedFrame:
+    def __init__(self, name: str, size: int):
+        self.name, self.size = name, size
+
+    def load(self):
+        import pyarrow as pa
+        shm = _attach(self.name)
+        reader = pa.ipc.open_stream(pa.py_buffer(shm.buf)[:self.size])
+        return reader.read_pandas()
+
+def _attach(name: str):
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(name=name)
+    _attached.append(shm)
+    return shm
+
+def _release_attached():
+    while _attached:
+        try:
+            _attached.pop().close()
+        except BufferError:
+            pass  # A view escaped into a global; the mapping goes away with the worker
+
+def _share(value, segments: List):
+    """Replace a large array or DataFrame by a shared memory handle (segments collects them)"""
+    from multiprocessing import shared_memory
+    import sys
+    np = sys.modules.get('numpy')
+    pd = sys.modules.get('pandas')
+    if np is not None and isinstance(value, np.ndarray) and value.dtype != object and value.nbytes >= SHM_MIN_BYTES:
+        shm = shared_memory.SharedMemory(create=True, size=value.nbytes)
+        segments.append(shm)
+        np.ndarray(value.shape, dtype=value.dtype, buffer=shm.buf)[...] = value
+        return _SharedArray(shm.name, value.shape, value.dtype.str)
+    if pd is not None and isinstance(value, pd.DataFrame) and value.memory_usage(deep=False).sum() >= SHM_MIN_BYTES:
+        try:
+            import pyarrow as pa
+            table = pa.Table.from_pandas(value, preserve_index=True)
+        except Exception:
+            return value  # Not representable in Arrow (mixed objects, ...): pickle it
+        sink = pa.MockOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        size = sink.size()
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        segments.append(shm)
+        with pa.ipc.new_stream(pa.FixedSizeBufferWriter(pa.py_buffer(shm.buf)), table.schema) as writer:
+            writer.write_table(table)
+        return _SharedFrame(shm.name, size)
+    return value
+
+def _unshare(value):
+    return value.load() if isinstance(value, (_SharedArray, _SharedFrame)) else value
+
+def _call(payload: bytes, args: bytes) -> bytes:
+    """
+    Worker entry point: run the pickled function on (possibly shared) arguments. Returns
+    (results, error, formatted traceback, stdout, stderr), pickled.
+    """
+    _release_attached()
+    stdout, stderr = io.StringIO(), io.StringIO()
+    results, error, tb = None, None, None
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            fn = pickle.loads(payload)
+            results = [fn(*[_unshare(arg) for arg in call_args]) for call_args in pickle.loads(args)]
+        except Exception as e:
+            error, tb = e, traceback.format_exc()
+    try:
+        return dumps((results, error, tb, stdout.getvalue(), stderr.getvalue()))
+    except Exception as e:
+        # An unpicklable result or exception
+        return dumps((None, RuntimeError(f"Could not send the worker's result back: {e}"),
+                      traceback.format_exc(), stdout.getvalue(), stderr.getvalue()))
+
+def _receive(data: bytes) -> List[Any]:
+    """Unpack a worker's reply, showing its output in the cell and re-raising its exception"""
+    results, error, tb, stdout, stderr = pickle.loads(data)
+    if stdout:
+        sys.stdout.write(stdout)
+    if stderr:
+        sys.stderr.write(stderr)
+    if error is not None:
+        raise error from RemoteTraceback(tb)
+    return results
+
+def _free(segments: List):
+    for shm in segments:
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+        try:
+            shm.close()
+        except BufferError:
+            pass
+
+def _submit_all(fn: Callable, calls: List[tuple], chunksize: int) -> List[Any]:
+    pool = get_pool()
+    payload = dumps(fn)
+    segments: List = []
+    try:
+        batches = []
+        for start in range(0, len(calls), chunksize):
+            batch = [tuple(_share(arg, segments) for arg in call) for call in calls[start:start + chunksize]]
+            batches.append(pool.submit(_call, payload, dumps(batch)))
+        results = []
+        for future in batches:
+            results.extend(_receive(future.result()))
+        return results
+    finally:
+        _free(segments)
+
+def parallel_map(fn: Callable, items: Iterable, chunksize: Optional[int] = None) -> List[Any]:
+    """
+    [fn(item) for item in items], computed by the session's worker pool. Results keep the
+    order of items; an exception in fn is re-raised here.
+    """
+    calls = [(item,) for item in items]
+    if not calls:
+        return []
+    if chunksize is None:
+        # A few batches per worker balances load without a round trip per item
+        chunksize = max(1, len(calls) // (max_workers() * 4))
+    return _submit_all(fn, calls, chunksize)
+
+def parallel_apply(df, fn: Callable, partitions: Optional[int] = None):
+    """
+    Split df into row partitions (one per worker by default), run fn(partition) on each in
+    the worker pool and concatenate the results (DataFrames, Series or scalars in a list).
+    """
+    import pandas as pd
+    partitions = max(1, min(partitions or max_workers(), len(df)))
+    bounds = [len(df) * i // partitions for i in range(partitions + 1)]
+    parts = [df.iloc[start:end] for start, end in zip(bounds, bounds[1:])]
+    results = _submit_all(fn, [(part,) for part in parts], 1)
+    if results and all(isinstance(result, (pd.DataFrame, pd.Series)) for result in results):
+        return pd.concat(results)
+    return results
@@ -0,0 +1,39 @@
+"""
+Plot capture for the kernel: plt.show() sends the current figure as a PNG display_data message
+"""
+import base64
+import io
+
+def _show_override(*args, **kwargs):
+    """Override plt.show() to save plot as base64 image"""
+    import matplotlib.pyplot as plt
+    from IPython.display import display
+    try:
+        fig = plt.gcf()
+        if fig.get_axes():  # Only save if there are axes
+            buf = io.BytesIO()
+            fig.savefig(buf, format='png', bbox_inches='tight', dpi=100)
+            buf.seek(0)
+            img_base64 = base64.b64encode(buf.getvalue()).decode('utf-8')
+            # Use IPython's display with dict format - this sends a display_data message
+            display({'image/png': img_base64}, raw=True)
+            plt.close(fig)
+    except Exception:
+        import traceback
+        traceback.print_exc()
+
+def use_agg_backend(matplotlib_module):
+    """Post-import hook for matplotlib: switch to the non-interactive backend"""
+    matplotlib_module.use('Agg')
+
+def patch_pyplot(pyplot_module):
+    """Post-import hook for matplotlib.pyplot: capture figures on plt.show()"""
+    pyplot_module._original_show = pyplot_module.show
+    pyplot_module.show = _show_override
+
+def patch_seaborn(seaborn_module):
+    """Post-import hook for seaborn: route sns.show() (if present) through plt.show()"""
+    if hasattr(seaborn_module, 'show'):
+        import matplotlib.pyplot as plt
+        seaborn_module._original_show = seaborn_module.show
+        seaborn_module.show = lambda: plt.show()
@@ -0,0 +1,129 @@
+"""
+Per-cell profiling for the kernel
+arm() profiles the next cell that runs: cProfile and tracemalloc are started in IPython's
+pre_run_cell event and stopped in post_run_cell, and the hotspots and memory figures are
+displayed as a structured output.
+"""
+import cProfile
+import os
+import pstats
+import tracemalloc
+from typing import Dict, List, Optional
+
+from kernel_runtime.mime_types import PROFILE_MIME_TYPE as MIME_TYPE
+
+TOP_N = int(os.getenv('COCODE_PROFILE_TOP_N', '20'))
+
+# Frames from the kernel machinery around the cell, left out of the hotspot list
+_INTERNAL_PATHS = (
+    os.sep + 'IPython' + os.sep,
+    os.sep + 'ipykernel' + os.sep,
+    os.sep + 'kernel_runtime' + os.sep,
+    os.sep + 'traitlets' + os.sep,
+    os.sep + 'zmq' + os.sep,
+    os.sep + 'tornado' + os.sep,
+    os.sep + 'asyncio' + os.sep,
+)
+
+class _CellProfile:
+    def __init__(self, shell, top_n: int):
+        self.shell = shell
+        self.top_n = top_n
+        self.profiler: Optional[cProfile.Profile] = None
+        self.started_tracemalloc = False
+        self.memory_before = 0
+
+    def start(self, info=None):
+        self.shell.events.unregister('pre_run_cell', self.start)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracemalloc = True
+        tracemalloc.reset_peak()
+        self.memory_before = tracemalloc.get_traced_memory()[0]
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def stop(self, result=None):
+        if self.profiler is None:
+            # post_run_cell of the cell that armed the profiler
+            return
+        self.profiler.disable()
+        self.shell.events.unregister('post_run_cell', self.stop)
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+
+        payload = {
+            'hotspots': _hotspots(self.profiler, self.top_n),
+            'allocations': _allocations(snapshot, self.top_n),
+            'memoryBefore': self.memory_before,
+            'memoryAfter': current,
+            'memoryDelta': current - self.memory_before,
+            'peakMemory': peak,
+            'topN': self.top_n,
+        }
+        from IPython.display import display
+        display({
+            MIME_TYPE: payload,
+            'text/plain': _summary(payload),
+        }, raw=True)
+
+def _is_internal(filename: str) -> bool:
+    return any(path in filename for path in _INTERNAL_PATHS)
+
+def _location(filename: str) -> str:
+    if filename == '~':
+        return '<built-in>'
+    # Cell code is compiled from ipykernel's temporary files
+    if os.sep + 'ipykernel_' in filename or filename.startswith('<ipython-input'):
+        return '<cell>'
+    return filename
+
+def _hotspots(profiler: cProfile.Profile, top_n: int) -> List[Dict]:
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, function), (_, calls, total, cumulative, _) in stats.stats.items():
+        if _is_internal(filename) or function in ('<built-in method builtins.exec>', "<method 'disable' of '_lsprof.Profiler' objects>"):
+            continue
+        rows.append({
+            'function': function,
+            'file': _location(filename),
+            'line': line,
+            'calls': calls,
+            'totalTime': total,
+            'cumulativeTime': cumulative,
+        })
+    rows.sort(key=lambda row: row['totalTime'], reverse=True)
+    return rows[:top_n]
+
+def _allocations(snapshot, top_n: int) -> List[Dict]:
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '*' + os.sep + 'kernel_runtime' + os.sep + '*'),
+    ])
+    rows = []
+    for stat in snapshot.statistics('lineno')[:top_n]:
+        frame = stat.traceback[0]
+        rows.append({
+            'file': _location(frame.filename),
+            'line': frame.lineno,
+            'size': stat.size,
+            'count': stat.count,
+        })
+    return rows
+
+def _summary(payload: Dict) -> str:
+    lines = [f"Peak memory {payload['peakMemory'] / 1e6:.1f} MB, "
+             f"delta {payload['memoryDelta'] / 1e6:+.1f} MB"]
+    for row in payload['hotspots'][:5]:
+        lines.append(f"{row['totalTime']:.4f}s  {row['calls']:>8}  {row['function']} ({row['file']}:{row['line']})")
+    return '\n'.join(lines)
+
+def arm(top_n: int = TOP_N):
+    """Profile the next cell run in this kernel"""
+    from IPython import get_ipython
+    shell = get_ipython()
+    profile = _CellProfile(shell, top_n)
+    shell.events.register('pre_run_cell', profile.start)
+    shell.events.register('post_run_cell', profile.stop)
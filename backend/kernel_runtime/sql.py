@@ -0,0 +1,136 @@
+"""
+SQL over stored files
+Every CSV/TSV/Parquet file in the file storage is exposed as a DuckDB view named after the file
+(sales-2024.csv -> sales_2024), so queries only read the columns and row groups they need
+instead of loading the file into pandas. Used by sql() in kernels and by /api/files/query.
+"""
+import json
+import os
+import re
+from typing import Dict, List, Optional
+
+FORMATS = {'csv': 'csv', 'tsv': 'csv', 'txt': 'csv', 'parquet': 'parquet', 'pq': 'parquet'}
+
+def table_name(filename: str, taken: set) -> str:
+    """SQL identifier for a stored file: its lower-cased stem, made unique"""
+    stem, ext = os.path.splitext(filename)
+    name = re.sub(r'[^0-9a-z_]', '_', stem.lower()) or 'file'
+    if name[0].isdigit():
+        name = f"t_{name}"
+    if name in taken:
+        name = f"{name}_{ext.lstrip('.').lower()}"
+    while name in taken:
+        name += '_'
+    taken.add(name)
+    return name
+
+def stored_tables(storage_dir: str) -> List[Dict]:
+    """Tabular files listed in the storage metadata, with their view name and content hash"""
+    try:
+        with open(os.path.join(storage_dir, 'metadata.json')) as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        return []
+    tables, taken = [], set()
+    for filename in sorted(metadata):
+        meta = metadata[filename]
+        fmt = FORMATS.get(os.path.splitext(filename)[1].lstrip('.').lower())
+        path = os.path.join(storage_dir, filename)
+        if fmt is None or not os.path.isfile(path):
+            continue
+        # Files uploaded before hashes were recorded are identified by size and mtime
+        file_hash = meta.get('hash') or f"{os.path.getsize(path)}-{os.stat(path).st_mtime_ns}"
+        tables.append({
+            'name': table_name(filename, taken),
+            'filename': filename,
+            'path': path,
+            'format': fmt,
+            'hash': file_hash,
+        })
+    return tables
+
+def check_read_only(query: str):
+    """Reject anything but queries (COPY, ATTACH, CREATE, SET, ...)"""
+    import duckdb
+    statements = duckdb.extract_statements(query)
+    if not statements:
+        raise ValueError("Empty query")
+    for statement in statements:
+        if statement.type not in (duckdb.StatementType.SELECT, duckdb.StatementType.EXPLAIN):
+            raise ValueError(f"Only SELECT queries are allowed, got {statement.type.name}")
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+class Catalog:
+    """
+    View definitions per file hash. A CSV's dialect and column types are sniffed once per
+    content hash and baked into its view, so queries don't re-sniff the file.
+    """
+
+    def __init__(self):
+        self._sources: Dict[tuple, str] = {}
+
+    def source(self, con, table: Dict) -> str:
+        key = (table['path'], table['hash'])
+        if key not in self._sources:
+            path = _quote(table['path'])
+            if table['format'] == 'parquet':
+                source = f"FROM read_parquet({path})"
+            else:
+                source = con.execute(f"SELECT Prompt FROM sniff_csv({path})").fetchone()[0].rstrip().rstrip(';')
+            # Older versions of the same file are no longer needed
+            for old in [k for k in self._sources if k[0] == table['path']]:
+                del self._sources[old]
+            self._sources[key] = source
+        return self._sources[key]
+
+    def install(self, con, tables: List[Dict], existing: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """
+        Create or replace the views for tables on a connection. `existing` maps view names to
+        the hashes already installed; returns the new mapping.
+        """
+        existing = dict(existing or {})
+        for table in tables:
+            if existing.get(table['name']) == table['hash']:
+                continue
+            con.execute(f'CREATE OR REPLACE VIEW "{table["name"]}" AS SELECT * {self.source(con, table)}')
+            existing[table['name']] = table['hash']
+        current = {table['name'] for table in tables}
+        for name in [name for name in existing if name not in current]:
+            con.execute(f'DROP VIEW IF EXISTS "{name}"')
+            del existing[name]
+        return existing
+
+_catalog = Catalog()
+_connection = None
+_installed: Dict[str, str] = {}
+STORAGE_DIR: Optional[str] = None  # Set by the kernel bootstrap
+
+def configure(storage_dir: str):
+    global STORAGE_DIR
+    STORAGE_DIR = storage_dir
+
+def connection():
+    """The kernel's DuckDB connection, with a view for every stored file"""
+    global _connection, _installed
+    import duckdb
+    if _connection is None:
+        _connection = duckdb.connect()
+    _installed = _catalog.install(_connection, stored_tables(STORAGE_DIR or os.getcwd()), _installed)
+    return _connection
+
+def tables():
+    """Views available to sql(): name, file and format"""
+    import pandas as pd
+    rows = [{k: t[k] for k in ('name', 'filename', 'format')} for t in stored_tables(STORAGE_DIR or os.getcwd())]
+    return pd.DataFrame(rows, columns=['name', 'filename', 'format'])
+
+def sql(query: str, arrow: bool = False):
+    """
+    Run SQL over the stored files and return a pandas DataFrame (or an Arrow table), e.g.
+        sql("SELECT host, count(*) FROM logs WHERE status >= 500 GROUP BY host")
+    Only the columns and row groups the query needs are read.
+    """
+    result = connection().execute(query)
+    return result.fetch_arrow_table() if arrow else result.df()
@@ -1,24 +1,94 @@
 """
 FastAPI Backend for Jupyter-style Python Data Science IDE
 """
-from fastapi import FastAPI, HTTPException, UploadFile, File
+import time
+_import_start = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, UploadFile, File, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, Response
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
-import subprocess
-import sys
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from typing import TYPE_CHECKING, Optional, List, Dict, Any
+import asyncio
 import json
-import base64
 import io
+import logging
 import os
 from datetime import datetime
 
-# Import kernel manager and file storage
-from kernel_manager import KernelManager
-from file_storage import file_storage
+# Import only what request handling needs; the storage and kernel subsystems are created in
+# the lifespan hook, and jupyter_client is imported when the first kernel starts
+from file_storage import FileStorage, get_file_storage
+import metrics
+import tracing
+import response_encoding
+from response_encoding import CompressionMiddleware
+from query_engine import QueryEngine, QueryError, MEDIA_TYPES
+from output_store import OutputStore, code_hash
+from idempotency import IdempotencyCache, IdempotencyConflict
+from kernel_runtime.mime_types import PROFILE_MIME_TYPE
+
+if TYPE_CHECKING:
+    from kernel_manager import KernelManager
+
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+# Set up by the lifespan hook
+file_storage: Optional[FileStorage] = None
+kernel_manager: Optional["KernelManager"] = None
+query_engine: Optional[QueryEngine] = None  # SQL over the stored files
+output_store: Optional[OutputStore] = None  # Execution results, kept across reloads and kernel restarts
+
+# Finished and running executions by (sessionId, requestId), so client retries don't re-run cells
+execution_requests = IdempotencyCache(size=lambda result: result.approximate_size())
+
+# Seconds between keepalive comments on the file change stream (keeps proxies from closing it)
+FILE_EVENTS_KEEPALIVE = float(os.getenv("FILE_EVENTS_KEEPALIVE", "15"))
+
+# Milliseconds spent importing this module and in each startup step, for /api/startup
+STARTUP_PROFILE: Dict[str, float] = {}
+
+def _ms(since: float) -> float:
+    return round((time.perf_counter() - since) * 1000, 1)
 
-app = FastAPI(title="Cocode Python Kernel API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the storage and kernel subsystems on startup; stop all kernels on shutdown"""
+    global file_storage, kernel_manager, query_engine, output_store
+    started = time.perf_counter()
+    step = time.perf_counter()
+    file_storage = get_file_storage()
+    STARTUP_PROFILE["storage"] = _ms(step)
+    
+    step = time.perf_counter()
+    from kernel_manager import KernelManager
+    kernel_manager = KernelManager(storage=file_storage)
+    metrics.register_collector(kernel_manager, file_storage)
+    STARTUP_PROFILE["kernelManager"] = _ms(step)
+    
+    step = time.perf_counter()
+    query_engine = QueryEngine(file_storage)
+    output_store = OutputStore(file_storage)
+    STARTUP_PROFILE["queryAndOutputs"] = _ms(step)
+    STARTUP_PROFILE["startup"] = _ms(started)
+    logger.info(
+        "API ready: imports %.1f ms, startup %.1f ms (storage %.1f, kernel manager %.1f)",
+        STARTUP_PROFILE["imports"], STARTUP_PROFILE["startup"],
+        STARTUP_PROFILE["storage"], STARTUP_PROFILE["kernelManager"],
+    )
+    yield
+    # Stop all kernels (and the fork server, if used) when the API exits
+    kernel_manager.shutdown_all()
+    output_store.close()
+
+app = FastAPI(title="Cocode Python Kernel API", lifespan=lifespan)
 
 # CORS middleware - read from environment variable
 frontend_origins = os.getenv(
@@ -34,13 +104,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize kernel manager
-kernel_manager = KernelManager()
+# gzip/brotli for complete responses above RESPONSE_COMPRESSION_MIN_BYTES
+app.add_middleware(CompressionMiddleware)
 
 class ExecutionRequest(BaseModel):
     code: str
     cellId: str
     sessionId: Optional[str] = None
+    trace: bool = False  # Return a per-phase timing breakdown with the response
+    profile: bool = False  # Profile the cell (cProfile + tracemalloc) and return a 'profile' output
+    lean: bool = False  # Omit stdout, stderr and plots; their content is already in output
+    requestId: Optional[str] = None  # Idempotency key: retries with the same id run the cell once
+
+class ForkRequest(BaseModel):
+    targetSessionId: Optional[str] = None
+
+class DataFramePageRequest(BaseModel):
+    offset: int = 0
+    limit: int = 50
+    sortBy: Optional[str] = None
+    ascending: bool = True
+    query: Optional[str] = None  # pandas DataFrame.query expression
+    format: str = 'json'  # 'json' or 'arrow' (base64 Arrow IPC stream)
+
+class QueryRequest(BaseModel):
+    sql: str
+    format: str = 'json'  # 'json', 'ndjson', 'csv' or 'arrow' (Arrow IPC stream)
+    maxRows: Optional[int] = None  # Capped at QUERY_MAX_ROWS
 
 class VariableSnapshot(BaseModel):
     name: str
@@ -49,9 +139,10 @@ class VariableSnapshot(BaseModel):
     shape: Optional[str] = None
     summary: Optional[str] = None
     preview: Optional[str] = None
+    memory: Optional[int] = None  # Bytes (deep for DataFrames)
 
 class CellOutput(BaseModel):
-    type: str  # 'text', 'html', 'image', 'dataframe', 'error'
+    type: str  # 'text', 'html', 'image', 'dataframe', 'profile', 'error'
     data: str
     mimeType: Optional[str] = None
     metadata: Optional[Dict[str, Any]] = None
@@ -65,74 +156,177 @@ class ExecutionResponse(BaseModel):
     executionTime: Optional[float] = None
     variables: Optional[List[VariableSnapshot]] = None
     plots: Optional[List[str]] = None  # Base64 encoded images
+    timings: Optional[Dict[str, float]] = None  # Seconds per phase, when requested with trace
+    traceId: Optional[str] = None
+    kernelStatus: Optional[str] = None  # Why the kernel died during the request ('oom_killed', 'unresponsive', ...)
+
+# Legacy fields duplicated by `output`, left out of lean responses
+LEAN_EXCLUDE = {"stdout", "stderr", "plots"}
+
+# Fields of an ExecutionResponse that are not worth keeping in the output log
+LOG_EXCLUDE = LEAN_EXCLUDE | {"timings", "traceId"}
+
+def _record_execution(session_id: str, cell_id: str, code: str, result: Dict[str, Any]):
+    """Append a result to the output log (runs after the response has been sent)"""
+    try:
+        output_store.append(session_id, cell_id, code, result)
+    except Exception:
+        logger.warning("Could not record the output of cell %s", cell_id, exc_info=True)
+
+def _truncation_metadata(buffer) -> Optional[Dict[str, Any]]:
+    """Describe a truncated stream, with a link to the full output if it was spilled to disk"""
+    if not buffer.overflowed:
+        return None
+    metadata = {"truncated": True, "totalChars": buffer.total_chars}
+    if buffer.output_id:
+        metadata["fullOutputUrl"] = f"/api/outputs/{buffer.output_id}"
+    return metadata
+
+async def _run_execution(session_id: str, request: ExecutionRequest, trace: tracing.Trace):
+    """Run a cell in the session's kernel (once per requestId) and record its metrics"""
+    # Starts the session's kernel if needed; waits for the cell in a worker thread
+    result = await kernel_manager.execute_code(
+        session_id, request.code, trace, profile=request.profile
+    )
+    for phase, seconds in result.timings.items():
+        metrics.EXECUTE_LATENCY.labels(phase=phase).observe(seconds)
+    metrics.EXECUTIONS.labels(status='success' if result.success else 'error').inc()
+    return result
 
 @app.post("/api/execute", response_model=ExecutionResponse)
-async def execute_code(request: ExecutionRequest):
-    """Execute Python code in a persistent kernel"""
+async def execute_code(request: ExecutionRequest, http_request: Request):
+    """
+    Execute Python code in a persistent kernel
+    The response is JSON, or msgpack when the Accept header asks for application/msgpack.
+    """
+    request_start = time.time()
+    metrics.EXECUTE_INFLIGHT.inc()
+    session_id = request.sessionId or "default"
+    trace = tracing.Trace("execute_request", session=session_id, cell=request.cellId)
     try:
-        session_id = request.sessionId or "default"
-        
-        # Get or create kernel for session
-        kernel_manager.get_kernel(session_id)
-        
-        # Execute code
-        result = await kernel_manager.execute_code(session_id, request.code)
+        if request.requestId:
+            fingerprint = code_hash(f"{request.cellId}\n{request.profile}\n{request.code}")
+            result, replayed = await execution_requests.run(
+                (session_id, request.requestId), fingerprint,
+                lambda: _run_execution(session_id, request, trace)
+            )
+        else:
+            result, replayed = await _run_execution(session_id, request, trace), False
         
         # Process outputs
-        outputs = []
-        print(f"DEBUG: Execution result - stdout: {repr(result.stdout)}, stderr: {repr(result.stderr)}")
-        print(f"DEBUG: stdout length: {len(result.stdout) if result.stdout else 0}")
-        print(f"DEBUG: plots: {len(result.plots)}, dataframes: {len(result.dataframes)}")
+        serialize_start = time.time()
+        with trace.span("response"):
+            outputs = []
+            logger.debug(
+                "Execution result - stdout length: %d, stderr length: %d, plots: %d, dataframes: %d",
+                len(result.stdout), len(result.stderr), len(result.plots), len(result.dataframes)
+            )
         
-        if result.stdout:
-            outputs.append(CellOutput(
-                type='text',
-                data=result.stdout,
-                mimeType='text/plain'
-            ))
+            if result.stdout:
+                outputs.append(CellOutput(
+                    type='text',
+                    data=result.stdout,
+                    mimeType='text/plain',
+                    metadata=_truncation_metadata(result.stdout_buffer)
+                ))
         
-        if result.stderr:
-            outputs.append(CellOutput(
-                type='error',
-                data=result.stderr,
-                mimeType='text/plain'
-            ))
+            if result.stderr:
+                outputs.append(CellOutput(
+                    type='error',
+                    data=result.stderr,
+                    mimeType='text/plain',
+                    metadata=_truncation_metadata(result.stderr_buffer)
+                ))
         
-        # Add plots if any
-        for plot in result.plots:
-            outputs.append(CellOutput(
-                type='image',
-                data=plot,
-                mimeType='image/png'
-            ))
+            # Add plots if any
+            for plot in result.plots:
+                outputs.append(CellOutput(
+                    type='image',
+                    data=plot,
+                    mimeType='image/png'
+                ))
         
-        # Add dataframes if any
-        for df_html in result.dataframes:
-            outputs.append(CellOutput(
-                type='dataframe',
-                data=df_html,
-                mimeType='text/html'
-            ))
+            # Add dataframes if any (compact JSON handles, or HTML for other rich objects)
+            for df in result.dataframes:
+                outputs.append(CellOutput(
+                    type='dataframe',
+                    data=df['data'],
+                    mimeType=df['mimeType']
+                ))
+            
+            # Add the cell profile if one was requested
+            if result.profile is not None:
+                outputs.append(CellOutput(
+                    type='profile',
+                    data=json.dumps(result.profile),
+                    mimeType=PROFILE_MIME_TYPE
+                ))
         
-        return ExecutionResponse(
-            success=result.success,
-            stdout=result.stdout,
-            stderr=result.stderr,
-            output=outputs,
-            error=result.error,
-            executionTime=result.execution_time,
-            variables=result.variables,
-            plots=result.plots
+            response = ExecutionResponse(
+                success=result.success,
+                stdout=result.stdout,
+                stderr=result.stderr,
+                output=outputs,
+                error=result.error,
+                executionTime=result.execution_time,
+                variables=result.variables,
+                plots=result.plots,
+                kernelStatus=result.kernel_status
+            )
+        if request.trace:
+            # Measured up to here; the serialize span only appears in exported traces
+            response.timings = trace.timings()
+            response.traceId = trace.trace_id
+        
+        # Serialize here (instead of letting FastAPI do it) so the cost shows up in metrics
+        exclude = LEAN_EXCLUDE if request.lean else None
+        media_type = response_encoding.negotiate_media_type(http_request.headers.get("accept"))
+        with trace.span("serialize", encoding=media_type):
+            if media_type == response_encoding.JSON_MEDIA_TYPE:
+                body = response.model_dump_json(exclude=exclude)
+            else:
+                body = response_encoding.encode(response.model_dump(mode="json", exclude=exclude), media_type)
+        metrics.EXECUTE_LATENCY.labels(phase='serialization').observe(time.time() - serialize_start)
+        if replayed:
+            # Already recorded in the output log by the original attempt
+            return Response(
+                content=body,
+                media_type=media_type,
+                headers={"Vary": "Accept", "X-Idempotent-Replay": "true"}
+            )
+        logged = response.model_dump(mode="json", exclude=LOG_EXCLUDE)
+        return Response(
+            content=body,
+            media_type=media_type,
+            headers={"Vary": "Accept"},
+            background=BackgroundTask(_record_execution, session_id, request.cellId, request.code, logged)
         )
     
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
+        metrics.EXECUTIONS.labels(status='failed').inc()
+        trace.root.error = str(e)
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        metrics.EXECUTE_INFLIGHT.dec()
+        metrics.EXECUTE_LATENCY.labels(phase='total').observe(time.time() - request_start)
+        trace.finish()
+        tracing.export(trace)
+
+@app.get("/api/outputs/{outputId}")
+async def get_full_output(outputId: str):
+    """View the full text of a cell output that was too large to return inline"""
+    path = file_storage.get_output_path(outputId)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Output not found")
+    return FileResponse(path, media_type="text/plain; charset=utf-8")
 
 @app.get("/api/variables/{sessionId}")
 async def get_variables(sessionId: str):
     """Get current variables in the kernel"""
     try:
-        kernel = kernel_manager.get_kernel(sessionId)
+        kernel = await run_in_threadpool(kernel_manager.get_kernel, sessionId)
         variables = await kernel.get_variables()
         return {"variables": variables}
     except Exception as e:
@@ -142,35 +336,132 @@ async def get_variables(sessionId: str):
 async def restart_kernel(sessionId: str):
     """Restart the kernel for a session"""
     try:
-        kernel_manager.restart_kernel(sessionId)
+        await run_in_threadpool(kernel_manager.restart_kernel, sessionId)
         return {"message": "Kernel restarted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/sessions/{sessionId}/dataframes/{handle}")
+async def get_dataframe_page(sessionId: str, handle: str, request: DataFramePageRequest):
+    """Page, sort and filter a displayed DataFrame against the live object in the kernel"""
+    if request.format not in ('json', 'arrow'):
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'arrow'")
+    try:
+        return await run_in_threadpool(
+            kernel_manager.dataframe_page,
+            sessionId, handle,
+            offset=request.offset,
+            limit=min(request.limit, 1000),
+            sort_by=request.sortBy,
+            ascending=request.ascending,
+            query=request.query,
+            fmt=request.format
+        )
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Session not found")
+    except RuntimeError as e:
+        # Raised in the kernel: unknown handle/column, invalid query, ...
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/sessions/{sessionId}/startup")
+async def get_startup_report(sessionId: str):
+    """Report kernel start, bootstrap and lazy-import timings for a session"""
+    try:
+        return await run_in_threadpool(kernel_manager.startup_report, sessionId)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Session not found")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/sessions/{sessionId}/resources")
+async def get_resource_usage(sessionId: str):
+    """Report a session kernel's resource limits, status and latest CPU/memory sample"""
+    try:
+        return kernel_manager.resource_report(sessionId)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Session not found")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/sessions/{sessionId}/fork")
+async def fork_kernel(sessionId: str, request: Optional[ForkRequest] = None):
+    """Create a new session that starts from a copy of this session's kernel state"""
+    try:
+        target_id = request.targetSessionId if request else None
+        return await run_in_threadpool(kernel_manager.fork_kernel, sessionId, target_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Session not found")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.delete("/api/sessions/{sessionId}")
 async def shutdown_kernel(sessionId: str):
-    """Shutdown kernel for a session"""
+    """Shutdown kernel for a session and delete its recorded outputs"""
     try:
-        kernel_manager.shutdown_kernel(sessionId)
+        await run_in_threadpool(kernel_manager.shutdown_kernel, sessionId)
+        await run_in_threadpool(output_store.clear, sessionId)
         return {"message": "Kernel shut down successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/sessions/{sessionId}/outputs")
+async def get_session_outputs(sessionId: str, cellIds: Optional[str] = None):
+    """Latest recorded result per cell of a session (cellIds: comma-separated filter), without re-running anything"""
+    try:
+        cell_ids = [cell_id for cell_id in cellIds.split(",") if cell_id] if cellIds is not None else None
+        outputs = await run_in_threadpool(output_store.latest, sessionId, cell_ids)
+        return {"sessionId": sessionId, "outputs": outputs}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/api/sessions/{sessionId}/outputs")
+async def clear_session_outputs(sessionId: str):
+    """Delete the recorded outputs of a session"""
+    try:
+        if not await run_in_threadpool(output_store.clear, sessionId):
+            raise HTTPException(status_code=404, detail="No outputs recorded for this session")
+        return {"success": True}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
+@app.get("/api/startup")
+async def get_api_startup():
+    """Report how long the API took to import and start, in milliseconds"""
+    return STARTUP_PROFILE
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics: execute latency by phase, IOPub messages, kernels and storage"""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 # File Storage Endpoints
 
 @app.post("/api/files/upload")
-async def upload_file(file: UploadFile = File(...)):
-    """Upload a file to the file storage"""
+async def upload_file(file: UploadFile = File(...), analyze: bool = False):
+    """Upload a file to the file storage, optionally analyzing its memory footprint as a DataFrame"""
     try:
         content = await file.read()
         file_type = file.filename.split('.')[-1] if '.' in file.filename else "unknown"
         
         metadata = file_storage.upload_file(file.filename, content, file_type)
+        # An identical re-upload keeps its earlier analysis
+        if analyze and "memory" not in metadata:
+            try:
+                await run_in_threadpool(file_storage.analyze_file, metadata["filename"])
+            except Exception:
+                # The upload itself succeeded; the file just has no recommendation
+                logger.warning("Memory analysis of %s failed", metadata["filename"], exc_info=True)
         return {
             "success": True,
             "file": metadata,
@@ -188,6 +479,63 @@ async def list_files():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/files/query")
+async def query_files(request: QueryRequest):
+    """Run a read-only SQL query over the stored CSV/Parquet files, streaming the result"""
+    try:
+        body, cached = await run_in_threadpool(query_engine.query, request.sql, request.format, request.maxRows)
+        return StreamingResponse(
+            body,
+            media_type=MEDIA_TYPES[request.format],
+            headers={"X-Query-Cache": "hit" if cached else "miss"}
+        )
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/files/tables")
+async def list_tables():
+    """List the SQL views available to /api/files/query (one per CSV/Parquet file)"""
+    try:
+        tables = await run_in_threadpool(query_engine.tables)
+        return {"tables": tables}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/files/events")
+async def file_events():
+    """
+    Stream file storage changes as server-sent events: one JSON event per created, updated
+    or deleted file, with its version and content hash
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    
+    def listener(event: Dict):
+        # Storage changes happen on request and threadpool threads
+        loop.call_soon_threadsafe(queue.put_nowait, event)
+    
+    async def stream():
+        file_storage.add_listener(listener)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), FILE_EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"id: {event['seq']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            file_storage.remove_listener(listener)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/files/{filename}")
 async def download_file(filename: str):
     """Download a file from storage"""
@@ -282,6 +630,8 @@ async def get_storage_path():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+STARTUP_PROFILE["imports"] = _ms(_import_start)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,123 @@
+"""
+Prometheus metrics for the Python kernel API
+Request-path metrics are updated as work happens; kernel and storage gauges are
+collected from KernelManager and FileStorage when /metrics is scraped.
+"""
+import os
+from typing import Iterable
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+REGISTRY = CollectorRegistry()
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# Phases: execute (run until reply), drain (late output), variables (inspection pass),
+# serialization, total
+EXECUTE_LATENCY = Histogram(
+    'cocode_execute_duration_seconds',
+    'Latency of /api/execute by phase',
+    ['phase'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+    registry=REGISTRY,
+)
+EXECUTIONS = Counter(
+    'cocode_executions_total',
+    'Cell executions by outcome',
+    ['status'],
+    registry=REGISTRY,
+)
+KERNEL_FAILURES = Counter(
+    'cocode_kernel_failures_total',
+    'Kernels found dead or unresponsive, by cause',
+    ['status'],
+    registry=REGISTRY,
+)
+EXECUTE_INFLIGHT = Gauge(
+    'cocode_execute_inflight',
+    'Execute requests currently being processed or waiting for their kernel',
+    registry=REGISTRY,
+)
+IOPUB_MESSAGES = Counter(
+    'cocode_iopub_messages_total',
+    'IOPub messages received from kernels for cell executions',
+    ['msg_type'],
+    registry=REGISTRY,
+)
+# Attempt: running (the retry waited for the original) or finished (served the stored result)
+EXECUTE_REPLAYS = Counter(
+    'cocode_execute_replays_total',
+    'Retried execute requests answered without running the cell again',
+    ['attempt'],
+    registry=REGISTRY,
+)
+OUTPUT_CHARS = Counter(
+    'cocode_output_chars_total',
+    'Characters of stdout/stderr captured from kernels',
+    ['stream'],
+    registry=REGISTRY,
+)
+
+def _directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+class KernelCollector:
+    """Collects live kernel, per-kernel resource and file storage metrics at scrape time"""
+
+    def __init__(self, kernel_manager, file_storage):
+        self.kernel_manager = kernel_manager
+        self.file_storage = file_storage
+
+    def collect(self) -> Iterable:
+        kernels = GaugeMetricFamily('cocode_kernels', 'Live kernels', labels=['provider'])
+        kernels.add_metric([self.kernel_manager.provider.name], len(self.kernel_manager.kernels))
+        yield kernels
+
+        rss = GaugeMetricFamily(
+            'cocode_kernel_rss_bytes', 'Resident memory of each kernel (including children)',
+            labels=['session'],
+        )
+        cpu = CounterMetricFamily(
+            'cocode_kernel_cpu_seconds', 'CPU time used by each kernel (including children)',
+            labels=['session'],
+        )
+        for session_id in list(self.kernel_manager.kernels):
+            usage = self.kernel_manager.kernel_usage(session_id)
+            if usage is None:
+                continue
+            rss.add_metric([session_id], usage['rss'])
+            cpu.add_metric([session_id], usage['cpu_seconds'])
+        yield rss
+        yield cpu
+
+        storage = GaugeMetricFamily(
+            'cocode_file_storage_bytes', 'Bytes on disk in file storage', labels=['kind'],
+        )
+        storage_dir = self.file_storage.get_storage_directory()
+        outputs = _directory_size(self.file_storage.get_output_directory())
+        checkpoints = _directory_size(self.file_storage.get_checkpoint_directory())
+        storage.add_metric(['outputs'], outputs)
+        storage.add_metric(['checkpoints'], checkpoints)
+        storage.add_metric(['files'], _directory_size(storage_dir) - outputs - checkpoints)
+        yield storage
+
+_collector = None
+
+def register_collector(kernel_manager, file_storage):
+    """Collect kernel and storage metrics from these objects (replacing an earlier app's)"""
+    global _collector
+    if _collector is not None:
+        REGISTRY.unregister(_collector)
+    _collector = KernelCollector(kernel_manager, file_storage)
+    REGISTRY.register(_collector)
+
+def render() -> bytes:
+    """Metrics in the Prometheus text exposition format"""
+    return generate_latest(REGISTRY)
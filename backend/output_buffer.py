@@ -0,0 +1,117 @@
+"""
+Bounded output capture for kernel execution
+Keeps the head and tail of a stream in memory and spills the full text to disk on overflow
+"""
+import os
+from collections import deque
+from typing import Deque, List, Optional
+from uuid import uuid4
+
+# Characters of output kept in memory from the start and the end of a stream
+OUTPUT_HEAD_CHARS = int(os.getenv("OUTPUT_HEAD_CHARS", "100000"))
+OUTPUT_TAIL_CHARS = int(os.getenv("OUTPUT_TAIL_CHARS", "20000"))
+
+class OutputBuffer:
+    """
+    Text buffer with a memory bound. Chunks are collected in a list and joined once.
+    When the total exceeds head + tail characters, only the head and a rolling tail stay
+    in memory and every chunk is written to a spill file that can be served in full.
+    """
+
+    def __init__(self, spill_dir: Optional[str] = None,
+                 head_chars: int = OUTPUT_HEAD_CHARS, tail_chars: int = OUTPUT_TAIL_CHARS):
+        self.spill_dir = spill_dir
+        self.head_chars = head_chars
+        self.tail_chars = tail_chars
+        self.total_chars = 0
+        self.output_id: Optional[str] = None  # Set once the buffer spills to disk
+        self._chunks: List[str] = []
+        self._head = ""
+        self._tail: Deque[str] = deque()
+        self._tail_chars = 0
+        self._spill_file = None
+        self._value: Optional[str] = None
+
+    @property
+    def overflowed(self) -> bool:
+        return self.total_chars > self.head_chars + self.tail_chars
+
+    @property
+    def spill_path(self) -> Optional[str]:
+        if self.output_id is None or self.spill_dir is None:
+            return None
+        return os.path.join(self.spill_dir, f"{self.output_id}.txt")
+
+    def write(self, text: str):
+        if not text:
+            return
+        self._value = None
+        was_overflowed = self.overflowed
+        self.total_chars += len(text)
+
+        if not was_overflowed:
+            self._chunks.append(text)
+            if self.overflowed:
+                self._start_overflow()
+            return
+
+        self._append_tail(text)
+        if self._spill_file is not None:
+            self._spill_file.write(text)
+
+    def _start_overflow(self):
+        """Switch from keeping everything to keeping head + tail (+ spill file)"""
+        content = "".join(self._chunks)
+        self._chunks = []
+        self._head = content[:self.head_chars]
+        self._append_tail(content[self.head_chars:])
+
+        if self.spill_dir is not None:
+            try:
+                self.output_id = uuid4().hex
+                self._spill_file = open(self.spill_path, "w", encoding="utf-8")
+                self._spill_file.write(content)
+            except OSError:
+                self.output_id = None
+                self._spill_file = None
+
+    def _append_tail(self, text: str):
+        self._tail.append(text)
+        self._tail_chars += len(text)
+        # Drop whole chunks that are no longer needed to fill the tail window
+        while self._tail and self._tail_chars - len(self._tail[0]) >= self.tail_chars:
+            self._tail_chars -= len(self._tail.popleft())
+
+    def clear(self):
+        """Discard captured output (the spill file, if any, is closed and removed)"""
+        self.close()
+        if self.spill_path and os.path.exists(self.spill_path):
+            os.remove(self.spill_path)
+        self.__init__(self.spill_dir, self.head_chars, self.tail_chars)
+
+    def close(self):
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    def getvalue(self) -> str:
+        if self._value is not None:
+            return self._value
+        if not self.overflowed:
+            self._value = "".join(self._chunks)
+            return self._value
+
+        tail = "".join(self._tail)[-self.tail_chars:] if self.tail_chars else ""
+        omitted = self.total_chars - len(self._head) - len(tail)
+        notice = f"\n\n... [{omitted} characters omitted"
+        if self.output_id:
+            notice += " - view full output"
+        notice += "] ...\n\n"
+        self._value = self._head + notice + tail
+        return self._value
+
+    def __len__(self) -> int:
+        return self.total_chars
+
+    def __bool__(self) -> bool:
+        return self.total_chars > 0
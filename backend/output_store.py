@@ -0,0 +1,230 @@
+"""
+Persistent execution output log
+Every execution result is appended to a per-session SQLite log keyed by cell id and code hash,
+so a notebook's latest outputs can be served again after a browser reload or kernel restart
+without re-running anything. Large output payloads (plots, big HTML) are kept as
+content-addressed blob files next to the log.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+# Output data at least this large is stored as a blob file instead of inline in the log
+BLOB_MIN_BYTES = int(os.getenv("OUTPUT_LOG_BLOB_MIN_BYTES", str(64 * 1024)))
+# Results kept per cell; older ones are pruned when the cell runs again (0 keeps everything)
+KEEP_PER_CELL = int(os.getenv("OUTPUT_LOG_KEEP_PER_CELL", "3"))
+# Logs of sessions that recorded nothing for this many days are deleted (0 keeps them forever)
+MAX_AGE_DAYS = float(os.getenv("OUTPUT_LOG_MAX_AGE_DAYS", "7"))
+# Seconds between scans for expired logs
+EXPIRE_INTERVAL = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS executions (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    cell_id TEXT NOT NULL,
+    code_hash TEXT NOT NULL,
+    executed_at REAL NOT NULL,
+    result TEXT NOT NULL,
+    blobs TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS executions_cell ON executions (cell_id, seq);
+"""
+
+def code_hash(code: str) -> str:
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+class _SessionLog:
+    """The log of one session: log.db and blobs/ in its own directory"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.blob_dir = os.path.join(directory, "blobs")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(directory, "log.db"), check_same_thread=False)
+        # WAL: appends don't block readers, and NORMAL sync skips an fsync per commit
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def _write_blob(self, data: str) -> str:
+        digest = hashlib.sha256(data.encode("utf-8")).hexdigest()
+        path = os.path.join(self.blob_dir, digest)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return digest
+
+    def _read_blob(self, digest: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self.blob_dir, digest), encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def append(self, cell_id: str, code: str, result: Dict) -> int:
+        result = dict(result)
+        blobs = []
+        outputs = []
+        for output in result.get("output") or []:
+            data = output.get("data")
+            if isinstance(data, str) and len(data) >= BLOB_MIN_BYTES:
+                digest = self._write_blob(data)
+                blobs.append(digest)
+                output = {**output, "data": None, "blob": digest}
+            outputs.append(output)
+        if "output" in result:
+            result["output"] = outputs
+        with self.lock, self.db:
+            seq = self.db.execute(
+                "INSERT INTO executions (cell_id, code_hash, executed_at, result, blobs) VALUES (?, ?, ?, ?, ?)",
+                (cell_id, code_hash(code), time.time(), json.dumps(result), " ".join(blobs)),
+            ).lastrowid
+            if KEEP_PER_CELL > 0:
+                self._prune(cell_id)
+        return seq
+
+    def _prune(self, cell_id: str):
+        """Drop all but the newest KEEP_PER_CELL results of a cell, and blobs nobody uses"""
+        removed = self.db.execute(
+            "SELECT seq, blobs FROM executions WHERE cell_id = ? ORDER BY seq DESC LIMIT -1 OFFSET ?",
+            (cell_id, KEEP_PER_CELL),
+        ).fetchall()
+        if not removed:
+            return
+        self.db.execute(
+            f"DELETE FROM executions WHERE seq IN ({', '.join('?' * len(removed))})",
+            [seq for seq, _ in removed],
+        )
+        candidates = {digest for _, blobs in removed for digest in blobs.split()}
+        for digest in candidates:
+            in_use = self.db.execute(
+                "SELECT 1 FROM executions WHERE instr(blobs, ?) > 0 LIMIT 1", (digest,)
+            ).fetchone()
+            if not in_use:
+                try:
+                    os.remove(os.path.join(self.blob_dir, digest))
+                except FileNotFoundError:
+                    pass
+
+    def latest(self, cell_ids: Optional[Iterable[str]] = None) -> Dict[str, Dict]:
+        query = (
+            "SELECT seq, cell_id, code_hash, executed_at, result FROM executions "
+            "WHERE seq IN (SELECT MAX(seq) FROM executions GROUP BY cell_id)"
+        )
+        params: List[str] = []
+        if cell_ids is not None:
+            params = list(cell_ids)
+            if not params:
+                return {}
+            query += f" AND cell_id IN ({', '.join('?' * len(params))})"
+        with self.lock:
+            rows = self.db.execute(query, params).fetchall()
+        records = {}
+        for seq, cell_id, digest, executed_at, result in rows:
+            record = json.loads(result)
+            for output in record.get("output") or []:
+                if output.get("blob"):
+                    output["data"] = self._read_blob(output.pop("blob"))
+            record.update(
+                cellId=cell_id,
+                codeHash=digest,
+                executedAt=datetime.fromtimestamp(executed_at).isoformat(),
+                seq=seq,
+            )
+            records[cell_id] = record
+        return records
+
+class OutputStore:
+    def __init__(self, storage):
+        self.storage = storage
+        self._logs: Dict[str, _SessionLog] = {}
+        self._lock = threading.Lock()
+        self._expired_at = 0.0
+
+    def _directory(self, session_id: str) -> str:
+        # Session ids come from clients; anything but a plain name is hashed
+        name = session_id if re.fullmatch(r"[A-Za-z0-9_-]{1,64}", session_id) else code_hash(session_id)[:32]
+        return os.path.join(self.storage.get_output_log_directory(), name)
+
+    def _log(self, session_id: str, create: bool = True) -> Optional[_SessionLog]:
+        with self._lock:
+            log = self._logs.get(session_id)
+            if log is None:
+                directory = self._directory(session_id)
+                if not create and not os.path.isdir(directory):
+                    return None
+                log = self._logs[session_id] = _SessionLog(directory)
+                if create and time.monotonic() - self._expired_at > EXPIRE_INTERVAL:
+                    self._expired_at = time.monotonic()
+                    threading.Thread(target=self.expire, daemon=True).start()
+            return log
+
+    def append(self, session_id: str, cell_id: str, code: str, result: Dict) -> int:
+        """Record an execution result (an ExecutionResponse as a dict); returns its sequence number"""
+        return self._log(session_id).append(cell_id, code, result)
+
+    def latest(self, session_id: str, cell_ids: Optional[Iterable[str]] = None) -> Dict[str, Dict]:
+        """The most recent result per cell, optionally only for cell_ids"""
+        log = self._log(session_id, create=False)
+        return log.latest(cell_ids) if log is not None else {}
+
+    def clear(self, session_id: str) -> bool:
+        """Delete a session's log and blobs; False if it had none"""
+        with self._lock:
+            log = self._logs.pop(session_id, None)
+        if log is not None:
+            log.close()
+        directory = self._directory(session_id)
+        if not os.path.isdir(directory):
+            return False
+        shutil.rmtree(directory, ignore_errors=True)
+        return True
+
+    def expire(self, max_age_days: float = MAX_AGE_DAYS) -> int:
+        """Delete the logs of sessions with no recorded execution in max_age_days; returns how many"""
+        if max_age_days <= 0:
+            return 0
+        root = self.storage.get_output_log_directory()
+        cutoff = time.time() - max_age_days * 86400
+        removed = 0
+        for name in os.listdir(root):
+            directory = os.path.join(root, name)
+            if not os.path.isdir(directory):
+                continue
+            try:
+                # WAL mode: appends touch log.db-wal, checkpoints touch log.db
+                last_write = max(
+                    os.path.getmtime(os.path.join(directory, file))
+                    for file in ("log.db", "log.db-wal") if os.path.exists(os.path.join(directory, file))
+                )
+            except ValueError:
+                last_write = os.path.getmtime(directory)
+            if last_write >= cutoff:
+                continue
+            with self._lock:
+                # A session may have reopened its log since the scan started
+                if any(log.directory == directory for log in self._logs.values()):
+                    continue
+                shutil.rmtree(directory, ignore_errors=True)
+            removed += 1
+        return removed
+    
+    def close(self):
+        with self._lock:
+            logs, self._logs = list(self._logs.values()), {}
+        for log in logs:
+            log.close()
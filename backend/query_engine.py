@@ -0,0 +1,220 @@
+"""
+SQL query engine for stored files
+Runs read-only DuckDB queries over the CSV/Parquet files in FileStorage for
+/api/files/query. Results are streamed in Arrow batches; small results are cached per
+query and content hash of the files it reads.
+"""
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from kernel_runtime.sql import Catalog, check_read_only, stored_tables
+
+logger = logging.getLogger(__name__)
+
+MAX_ROWS = int(os.getenv("QUERY_MAX_ROWS", "100000"))
+BATCH_ROWS = int(os.getenv("QUERY_BATCH_ROWS", "10000"))
+CACHE_ENTRIES = int(os.getenv("QUERY_CACHE_ENTRIES", "64"))
+CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+MEMORY_LIMIT = os.getenv("QUERY_MEMORY_LIMIT", "1GB")
+THREADS = int(os.getenv("QUERY_THREADS", "0"))  # 0: DuckDB's default (all cores)
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+class QueryError(ValueError):
+    """The query was rejected or failed to bind/plan"""
+
+def _json_default(value):
+    if isinstance(value, Decimal):  # SUM over integers is a DECIMAL in DuckDB
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+def _rows(batch) -> List[list]:
+    return [list(row) for row in zip(*(column.to_pylist() for column in batch.columns))]
+
+class QueryEngine:
+    def __init__(self, storage):
+        self.storage = storage
+        self.catalog = Catalog()
+        self._lock = threading.Lock()
+        self._db = None
+        self._generation: Optional[Tuple] = None
+        self._tables: List[Dict] = []
+        self._cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+
+    def _database(self):
+        """
+        A sandboxed in-memory database with one view per stored file. It is rebuilt when the
+        set of files or their contents change, since file access is locked down to exactly
+        those paths.
+        """
+        import duckdb
+        tables = stored_tables(self.storage.get_storage_directory())
+        generation = tuple((table["name"], table["hash"]) for table in tables)
+        with self._lock:
+            if self._db is None or generation != self._generation:
+                config = {"memory_limit": MEMORY_LIMIT}
+                if THREADS:
+                    config["threads"] = THREADS
+                db = duckdb.connect(config=config)
+                self.catalog.install(db, tables)
+                db.execute(f"SET allowed_paths=[{', '.join(repr(t['path']) for t in tables)}]")
+                db.execute("SET enable_external_access=false")
+                db.execute("SET lock_configuration=true")
+                self._db, self._generation, self._tables = db, generation, tables
+            return self._db, self._tables
+
+    def tables(self) -> List[Dict]:
+        _, tables = self._database()
+        return [{k: table[k] for k in ("name", "filename", "format", "hash")} for table in tables]
+
+    def _cache_key(self, sql: str, fmt: str, max_rows: int, tables: List[Dict]) -> tuple:
+        # Only the files the query mentions take part, so other uploads don't evict it
+        used = tuple(sorted(
+            (table["name"], table["hash"]) for table in tables
+            if re.search(rf'\b{re.escape(table["name"])}\b', sql, re.IGNORECASE)
+        ))
+        return (sql.strip(), fmt, max_rows, used)
+
+    def query(self, sql: str, fmt: str = "json", max_rows: Optional[int] = None) -> Tuple[Iterator[bytes], bool]:
+        """
+        Start a query and return (body chunks, cached). Errors in the query itself are raised
+        here as QueryError; errors while reading are reported at the end of the stream.
+        """
+        if fmt not in MEDIA_TYPES:
+            raise QueryError(f"format must be one of {', '.join(MEDIA_TYPES)}")
+        max_rows = min(max_rows or MAX_ROWS, MAX_ROWS)
+        try:
+            check_read_only(sql)
+        except Exception as e:  # ValueError, or a duckdb parser error
+            raise QueryError(str(e))
+
+        db, tables = self._database()
+        key = self._cache_key(sql, fmt, max_rows, tables)
+        with self._lock:
+            body = self._cache.get(key)
+            if body is not None:
+                self._cache.move_to_end(key)
+        if body is not None:
+            return iter([body]), True
+
+        cursor = db.cursor()
+        try:
+            result = cursor.execute(sql)
+            reader_factory = getattr(result, "to_arrow_reader", None) or result.fetch_record_batch
+            reader = reader_factory(BATCH_ROWS)
+        except Exception as e:
+            cursor.close()
+            raise QueryError(str(e))
+        return self._stream(cursor, reader, fmt, max_rows, key), False
+
+    def _stream(self, cursor, reader, fmt: str, max_rows: int, key: tuple) -> Iterator[bytes]:
+        encode = getattr(self, f"_encode_{fmt}")
+        state = {"failed": False}
+        kept: Optional[List[bytes]] = []
+        kept_bytes = 0
+        try:
+            for chunk in encode(reader, max_rows, state):
+                if kept is not None:
+                    kept.append(chunk)
+                    kept_bytes += len(chunk)
+                    if kept_bytes > CACHE_MAX_BYTES:
+                        kept = None
+                yield chunk
+        except Exception as e:
+            # Headers are already sent; the client sees a truncated body
+            state["failed"] = True
+            logger.warning("Query failed while streaming: %s", e)
+        finally:
+            cursor.close()
+        if kept is not None and not state["failed"]:
+            with self._lock:
+                self._cache[key] = b"".join(kept)
+                while len(self._cache) > CACHE_ENTRIES:
+                    self._cache.popitem(last=False)
+
+    def _batches(self, reader, max_rows: int):
+        """Record batches up to max_rows rows in total, as (batch, truncated)"""
+        rows = 0
+        for batch in reader:
+            if rows + batch.num_rows >= max_rows:
+                yield batch.slice(0, max_rows - rows), rows + batch.num_rows > max_rows
+                return
+            rows += batch.num_rows
+            yield batch, False
+
+    def _encode_json(self, reader, max_rows: int, state: Dict) -> Iterator[bytes]:
+        columns = [{"name": field.name, "type": str(field.type)} for field in reader.schema]
+        yield ('{"columns": ' + json.dumps(columns) + ', "rows": [').encode()
+        rows, truncated, first = 0, False, True
+        tail = {}
+        try:
+            for batch, truncated in self._batches(reader, max_rows):
+                if batch.num_rows:
+                    text = json.dumps(_rows(batch), default=_json_default)[1:-1]
+                    yield (text if first else "," + text).encode()
+                    first = False
+                rows += batch.num_rows
+        except Exception as e:
+            # Reported in the body, since the response status has already been sent
+            state["failed"] = True
+            tail["error"] = str(e)
+            logger.warning("Query failed while streaming: %s", e)
+        tail = {"rowCount": rows, "truncated": truncated, **tail}
+        yield ("], " + json.dumps(tail)[1:]).encode()
+
+    def _encode_ndjson(self, reader, max_rows: int, state: Dict) -> Iterator[bytes]:
+        names = reader.schema.names
+        for batch, _ in self._batches(reader, max_rows):
+            text = "\n".join(json.dumps(dict(zip(names, row)), default=_json_default) for row in _rows(batch))
+            if text:
+                yield (text + "\n").encode()
+
+    def _encode_csv(self, reader, max_rows: int, state: Dict) -> Iterator[bytes]:
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+        header = True
+        for batch, _ in self._batches(reader, max_rows):
+            sink = pa.BufferOutputStream()
+            pa_csv.write_csv(pa.Table.from_batches([batch], schema=reader.schema), sink,
+                             write_options=pa_csv.WriteOptions(include_header=header))
+            header = False
+            yield sink.getvalue().to_pybytes()
+
+    def _encode_arrow(self, reader, max_rows: int, state: Dict) -> Iterator[bytes]:
+        import pyarrow as pa
+        sink = _Collector()
+        with pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), reader.schema) as writer:
+            for batch, _ in self._batches(reader, max_rows):
+                writer.write_batch(batch)
+                yield sink.drain()
+        yield sink.drain()
+
+class _Collector:
+    """Write-only file object that hands back what was written since the last drain"""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
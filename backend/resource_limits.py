@@ -0,0 +1,190 @@
+"""
+Per-kernel resource limits
+Memory and CPU limits for kernel processes, enforced through a cgroup v2 per kernel when a
+delegated cgroup is configured (KERNEL_CGROUP_ROOT) and through rlimits otherwise.
+"""
+import logging
+import os
+import sys
+import time
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+def _env_number(name: str) -> Optional[float]:
+    value = os.getenv(name, "").strip()
+    if not value:
+        return None
+    number = float(value)
+    return number if number > 0 else None
+
+def apply_rlimits(memory_bytes: Optional[int] = None, cpu_seconds: Optional[int] = None):
+    """Set rlimits on the current process (called in the kernel process before it starts)"""
+    import resource
+    if memory_bytes:
+        # RLIMIT_DATA covers heap and anonymous mmaps on Linux without counting the large
+        # virtual reservations (thread stacks, arenas) that make RLIMIT_AS unusable there
+        limit = resource.RLIMIT_DATA if sys.platform.startswith("linux") else resource.RLIMIT_AS
+        resource.setrlimit(limit, (memory_bytes, memory_bytes))
+    if cpu_seconds:
+        # The kernel gets SIGXCPU at the soft limit and SIGKILL at the hard limit
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 5))
+
+class CgroupV2:
+    """
+    Creates one child cgroup per kernel under a delegated cgroup v2 directory. Cgroups are
+    named after the session and the kernel's pid, so a restarted kernel starts with fresh
+    counters (memory.events is cumulative) while the old one may still be shutting down.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        if not os.path.exists(os.path.join(root, "cgroup.controllers")):
+            raise RuntimeError(f"{root} is not a cgroup v2 directory")
+        try:
+            self._write("cgroup.subtree_control", "+memory +cpu")
+        except OSError:
+            pass  # Already enabled, or enabled by whoever delegated the cgroup
+        enabled = self._read("cgroup.subtree_control").split()
+        if "memory" not in enabled:
+            raise RuntimeError(f"memory controller is not enabled for children of {root}")
+
+    def _write(self, name: str, value: str, directory: Optional[str] = None):
+        with open(os.path.join(directory or self.root, name), "w") as f:
+            f.write(value)
+
+    def _read(self, name: str, directory: Optional[str] = None) -> str:
+        with open(os.path.join(directory or self.root, name)) as f:
+            return f.read()
+
+    def path(self, session_id: str, pid: int) -> str:
+        safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in session_id)
+        return os.path.join(self.root, f"cocode-{safe}-{pid}")
+
+    def create(self, session_id: str, pid: int, memory_bytes: Optional[int], cpus: Optional[float]):
+        directory = self.path(session_id, pid)
+        os.makedirs(directory, exist_ok=True)
+        if memory_bytes:
+            self._write("memory.max", str(memory_bytes), directory)
+            try:
+                self._write("memory.swap.max", "0", directory)
+            except OSError:
+                pass  # No swap accounting
+        if cpus:
+            period = 100000
+            self._write("cpu.max", f"{int(cpus * period)} {period}", directory)
+        self._write("cgroup.procs", str(pid), directory)
+
+    def oom_kills(self, session_id: str, pid: int) -> int:
+        try:
+            for line in self._read("memory.events", self.path(session_id, pid)).splitlines():
+                key, _, value = line.partition(" ")
+                if key == "oom_kill":
+                    return int(value)
+        except OSError:
+            pass
+        return 0
+
+    def remove(self, session_id: str, pid: int, timeout: float = 2):
+        """Remove a kernel's cgroup; it must be empty, so wait briefly for exiting processes"""
+        deadline = time.time() + timeout
+        while True:
+            try:
+                os.rmdir(self.path(session_id, pid))
+                return
+            except FileNotFoundError:
+                return
+            except OSError as e:
+                if time.time() >= deadline:
+                    logger.debug("Could not remove cgroup of kernel %s (session %s): %s", pid, session_id, e)
+                    return
+                time.sleep(0.05)
+
+class ResourceLimits:
+    """
+    Limits applied to every kernel.
+    memory_mb: resident memory (cgroup memory.max) or data segment size (RLIMIT_DATA)
+    cpus: CPU bandwidth in cores (cgroup cpu.max only)
+    cpu_seconds: total CPU time before the kernel is killed (RLIMIT_CPU)
+    execution_timeout: wall-clock seconds a cell may run before it is interrupted (None: no limit)
+    """
+
+    def __init__(self, memory_mb: Optional[float] = None, cpus: Optional[float] = None,
+                 cpu_seconds: Optional[float] = None, execution_timeout: Optional[float] = None,
+                 cgroup_root: Optional[str] = None):
+        self.memory_bytes = int(memory_mb * 1024 * 1024) if memory_mb else None
+        self.cpus = cpus
+        self.cpu_seconds = int(cpu_seconds) if cpu_seconds else None
+        self.execution_timeout = execution_timeout
+        self.cgroup: Optional[CgroupV2] = None
+        self._kernel_pids: Dict[str, int] = {}  # session_id -> pid of the kernel in its cgroup
+        if cgroup_root:
+            try:
+                self.cgroup = CgroupV2(cgroup_root)
+            except (OSError, RuntimeError) as e:
+                logger.warning("cgroup limits unavailable (%s); falling back to rlimits", e)
+
+    @classmethod
+    def from_env(cls) -> "ResourceLimits":
+        return cls(
+            memory_mb=_env_number("KERNEL_MEMORY_LIMIT_MB"),
+            cpus=_env_number("KERNEL_CPU_LIMIT"),
+            cpu_seconds=_env_number("KERNEL_CPU_TIME_LIMIT"),
+            execution_timeout=_env_number("KERNEL_EXECUTION_TIMEOUT"),
+            cgroup_root=os.getenv("KERNEL_CGROUP_ROOT") or None,
+        )
+
+    @property
+    def enforcement(self) -> str:
+        if self.cgroup is not None:
+            return "cgroup"
+        if self.memory_bytes or self.cpu_seconds:
+            return "rlimit"
+        return "none"
+
+    @property
+    def rlimits(self) -> Dict[str, Optional[int]]:
+        """rlimits to set in the kernel process; memory goes to the cgroup when there is one"""
+        return {
+            "memory_bytes": None if self.cgroup is not None else self.memory_bytes,
+            "cpu_seconds": self.cpu_seconds,
+        }
+
+    def preexec_fn(self) -> Optional[Callable[[], None]]:
+        """Popen preexec_fn applying the rlimits, or None if there are none"""
+        rlimits = self.rlimits
+        if not any(rlimits.values()):
+            return None
+        return lambda: apply_rlimits(**rlimits)
+
+    def attach(self, session_id: str, pid: Optional[int]):
+        """Move a freshly started kernel into its own cgroup"""
+        if self.cgroup is None or pid is None:
+            return
+        try:
+            self.cgroup.create(session_id, pid, self.memory_bytes, self.cpus)
+            self._kernel_pids[session_id] = pid
+        except OSError as e:
+            logger.warning("Could not apply cgroup limits to session %s: %s", session_id, e)
+
+    def release(self, session_id: str, pid: Optional[int]):
+        """Remove the cgroup of a kernel that has been shut down"""
+        if self.cgroup is None or pid is None:
+            return
+        if self._kernel_pids.get(session_id) == pid:
+            del self._kernel_pids[session_id]
+        self.cgroup.remove(session_id, pid)
+
+    def oom_killed(self, session_id: str) -> bool:
+        """Whether the session's current kernel was killed for exceeding its memory limit"""
+        pid = self._kernel_pids.get(session_id)
+        return self.cgroup is not None and pid is not None and self.cgroup.oom_kills(session_id, pid) > 0
+
+    def to_dict(self) -> Dict:
+        return {
+            "enforcement": self.enforcement,
+            "memoryBytes": self.memory_bytes,
+            "cpus": self.cpus if self.cgroup is not None else None,
+            "cpuSeconds": self.cpu_seconds,
+            "executionTimeout": self.execution_timeout,
+        }
@@ -0,0 +1,140 @@
+"""
+Response encoding for the Python kernel API
+Content negotiation between JSON and msgpack for execute responses, and a compression
+middleware that gzip/brotli-encodes complete responses above a size threshold.
+"""
+import gzip
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_ALIASES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack", "application/vnd.msgpack")
+
+COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+
+# Content types worth compressing; images, archives and file downloads are left alone
+_COMPRESSIBLE = ("application/json", "application/msgpack", "text/plain", "text/html", "text/csv")
+
+try:
+    import msgpack
+except ImportError:  # Optional: without it every client gets JSON
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only gzip is offered
+    brotli = None
+
+def _parse_header(value: str) -> List[Tuple[str, float]]:
+    """Split an Accept/Accept-Encoding header into (token, q) pairs"""
+    items = []
+    for part in value.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, number = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(number)
+                except ValueError:
+                    q = 0.0
+        items.append((token, q))
+    return items
+
+def negotiate_media_type(accept: Optional[str]) -> str:
+    """msgpack if the client asks for it (and msgpack is installed), JSON otherwise"""
+    if not accept or msgpack is None:
+        return JSON_MEDIA_TYPE
+    best, best_q = JSON_MEDIA_TYPE, 0.0
+    for token, q in _parse_header(accept):
+        if token in MSGPACK_ALIASES and q > best_q:
+            best, best_q = MSGPACK_MEDIA_TYPE, q
+        elif token == JSON_MEDIA_TYPE and q > best_q:
+            best, best_q = JSON_MEDIA_TYPE, q
+    return best
+
+def encode(payload: Dict[str, Any], media_type: str) -> bytes:
+    """Encode a JSON-compatible payload (pydantic model_dump(mode='json')) as msgpack"""
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return msgpack.packb(payload, use_bin_type=True)
+    raise ValueError(f"Unsupported media type: {media_type}")
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick 'br' or 'gzip' from Accept-Encoding, preferring brotli on ties"""
+    if not accept_encoding:
+        return None
+    offered = {"gzip": 0.0}
+    if brotli is not None:
+        offered["br"] = 0.0
+    for token, q in _parse_header(accept_encoding):
+        if token in offered:
+            offered[token] = q
+        elif token == "*":
+            for name in offered:
+                offered[name] = max(offered[name], q)
+    name, q = max(offered.items(), key=lambda item: (item[1], item[0] == "br"))
+    return name if q > 0 else None
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing single-message responses of at least `minimum_size` bytes.
+    Streamed responses (downloads, event streams) pass through untouched so they are never
+    buffered.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_headers = dict(scope["headers"])
+        encoding = negotiate_encoding(request_headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if start_message is None:
+                await send(message)
+                return
+            start, start_message = start_message, None
+            body = message.get("body", b"")
+            headers = [(k, v) for k, v in start["headers"]]
+            header_names = {k.lower() for k, _ in headers}
+            content_type = dict(headers).get(b"content-type", b"").decode("latin-1")
+            if (message.get("more_body", False)
+                    or len(body) < self.minimum_size
+                    or b"content-encoding" in header_names
+                    or not content_type.startswith(_COMPRESSIBLE)):
+                await send(start)
+                await send(message)
+                return
+            body = compress(body, encoding)
+            headers = [(k, v) for k, v in headers if k.lower() != b"content-length"]
+            headers.append((b"content-length", str(len(body)).encode()))
+            headers.append((b"content-encoding", encoding.encode()))
+            headers.append((b"vary", b"Accept-Encoding"))
+            await send({**start, "headers": headers})
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -6,6 +6,7 @@ const morgan = require('morgan');
 const path = require('path');
 const fs = require('fs');
 const http = require('http');
+const https = require('https');
 require('dotenv').config();
 
 const aiRoutes = require('./routes/ai');
@@ -21,6 +22,18 @@ const SERVICE_URL =
   '';
 // Python backend runs on port 8000 internally
 const PYTHON_SERVICE_URL = (process.env.PYTHON_SERVICE_URL || 'http://localhost:8000').replace(/\/$/, '');
+const pythonTarget = new URL(PYTHON_SERVICE_URL);
+const pythonTransport = pythonTarget.protocol === 'https:' ? https : http;
+// Pooled keep-alive connections to the Python service. Idle sockets are closed after
+// PYTHON_PROXY_IDLE_TIMEOUT_MS, which must stay below uvicorn's keep-alive timeout (5s by default)
+// so we never reuse a socket the server is about to close.
+const pythonAgent = new pythonTransport.Agent({
+  keepAlive: true,
+  maxSockets: parseInt(process.env.PYTHON_PROXY_MAX_SOCKETS) || 64,
+  maxFreeSockets: parseInt(process.env.PYTHON_PROXY_MAX_FREE_SOCKETS) || 16,
+  timeout: parseInt(process.env.PYTHON_PROXY_IDLE_TIMEOUT_MS) || 4000,
+  scheduling: 'lifo'
+});
 
 const rawOrigins =
   process.env.CORS_ALLOW_ORIGINS ||
@@ -205,9 +218,15 @@ const limiter = rateLimit({
 });
 app.use('/api/', limiter);
 
-// Body parsing middleware
-app.use(express.json({ limit: '10mb' }));
-app.use(express.urlencoded({ extended: true }));
+// Routes handled by the Python FastAPI backend (execute, files, variables, sessions, outputs)
+const pythonRoutes = ['/api/execute', '/api/variables', '/api/sessions', '/api/files', '/api/outputs'];
+const isPythonRoute = (url) => pythonRoutes.some(route => url.startsWith(route));
+
+// Body parsing middleware - skipped for Python routes so their raw body streams through the proxy
+const jsonParser = express.json({ limit: '10mb' });
+const urlencodedParser = express.urlencoded({ extended: true });
+app.use((req, res, next) => (isPythonRoute(req.path) ? next() : jsonParser(req, res, next)));
+app.use((req, res, next) => (isPythonRoute(req.path) ? next() : urlencodedParser(req, res, next)));
 
 // Logging
 app.use(morgan('combined'));
@@ -312,75 +331,163 @@ app.get('/health', (req, res) => {
   });
 });
 
-// Proxy Python backend routes (execute, files, variables, sessions)
-// These routes are handled by the Python FastAPI backend
-const pythonRoutes = ['/api/execute', '/api/variables', '/api/sessions', '/api/files'];
+// Proxy Python backend routes
 pythonRoutes.forEach(route => {
   app.all(`${route}*`, (req, res) => {
     proxyToPython(req, res);
   });
 });
 
-// Helper function to proxy requests to Python backend
+const isOriginAllowed = (origin) =>
+  allowedOrigins.includes(origin) || (originRegex && originRegex.test(origin));
+
+// Hop-by-hop headers apply to a single connection and are not forwarded
+const HOP_BY_HOP_HEADERS = [
+  'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+  'te', 'trailer', 'transfer-encoding', 'upgrade'
+];
+
+function forwardedHeaders(req, { keepUpgrade = false } = {}) {
+  const headers = { ...req.headers };
+  HOP_BY_HOP_HEADERS.forEach(name => {
+    if (!(keepUpgrade && (name === 'connection' || name === 'upgrade'))) {
+      delete headers[name];
+    }
+  });
+  headers.host = pythonTarget.host;
+  const clientIp = req.socket.remoteAddress;
+  headers['x-forwarded-for'] = req.headers['x-forwarded-for']
+    ? `${req.headers['x-forwarded-for']}, ${clientIp}`
+    : clientIp;
+  headers['x-forwarded-proto'] = req.headers['x-forwarded-proto'] || (req.socket.encrypted ? 'https' : 'http');
+  headers['x-forwarded-host'] = req.headers['x-forwarded-host'] || req.headers.host;
+  return headers;
+}
+
+function pythonRequestOptions(req, headers) {
+  return {
+    protocol: pythonTarget.protocol,
+    hostname: pythonTarget.hostname,
+    port: pythonTarget.port || (pythonTarget.protocol === 'https:' ? 443 : 8000),
+    path: req.originalUrl || req.url,
+    method: req.method,
+    headers,
+    agent: pythonAgent,
+  };
+}
+
+// Helper function to proxy requests to Python backend.
+// The request body is piped through untouched (body parsers skip Python routes) and the
+// response is piped back as it arrives, so uploads, downloads and SSE streams are never buffered.
 function proxyToPython(req, res) {
   const origin = req.headers.origin;
-  const targetUrl = new URL(PYTHON_SERVICE_URL);
   const fullPath = req.originalUrl || req.url;
   
   console.log(`[Proxy] Proxying ${req.method} ${fullPath} to Python backend`);
-  
-  const options = {
-    hostname: targetUrl.hostname,
-    port: targetUrl.port || 8000,
-    path: fullPath,
-    method: req.method,
-    headers: {
-      'Content-Type': req.headers['content-type'] || 'application/json',
-    },
-  };
 
-  const proxyReq = http.request(options, (proxyRes) => {
-    // Preserve CORS headers from our middleware
+  const proxyReq = pythonTransport.request(pythonRequestOptions(req, forwardedHeaders(req)), (proxyRes) => {
     const headers = { ...proxyRes.headers };
+    HOP_BY_HOP_HEADERS.forEach(name => delete headers[name]);
     
     // Add CORS headers if origin is allowed
-    if (origin) {
-      const isAllowed = allowedOrigins.includes(origin) || 
-                        (originRegex && originRegex.test(origin));
-      if (isAllowed) {
-        headers['Access-Control-Allow-Origin'] = origin;
-        headers['Access-Control-Allow-Credentials'] = 'true';
-      }
+    if (origin && isOriginAllowed(origin)) {
+      headers['Access-Control-Allow-Origin'] = origin;
+      headers['Access-Control-Allow-Credentials'] = 'true';
+    }
+
+    const isEventStream = (proxyRes.headers['content-type'] || '').startsWith('text/event-stream');
+    if (isEventStream) {
+      // Long-lived stream: no idle timeouts, no buffering by intermediaries, headers out immediately
+      req.socket.setTimeout(0);
+      req.socket.setNoDelay(true);
+      proxyReq.setTimeout(0);
+      headers['cache-control'] = headers['cache-control'] || 'no-cache';
+      headers['x-accel-buffering'] = 'no';
     }
     
     res.writeHead(proxyRes.statusCode, headers);
+    if (isEventStream) {
+      res.flushHeaders();
+    }
     proxyRes.pipe(res);
   });
 
+  // Stop the upstream request if the client goes away before the response is complete
+  res.on('close', () => {
+    if (!res.writableFinished) {
+      proxyReq.destroy();
+    }
+  });
+
   proxyReq.on('error', (err) => {
     console.error('[Proxy] Error proxying to Python backend:', err.message);
     if (!res.headersSent) {
       // Add CORS headers to error response
-      if (origin) {
-        const isAllowed = allowedOrigins.includes(origin) || 
-                          (originRegex && originRegex.test(origin));
-        if (isAllowed) {
-          res.setHeader('Access-Control-Allow-Origin', origin);
-          res.setHeader('Access-Control-Allow-Credentials', 'true');
-        }
+      if (origin && isOriginAllowed(origin)) {
+        res.setHeader('Access-Control-Allow-Origin', origin);
+        res.setHeader('Access-Control-Allow-Credentials', 'true');
       }
       res.status(502).json({ error: 'Python backend unavailable', message: err.message });
+    } else {
+      res.destroy(err);
     }
   });
 
-  // Send request body if present
-  if (req.body && Object.keys(req.body).length > 0) {
-    const bodyData = typeof req.body === 'string' ? req.body : JSON.stringify(req.body);
-    proxyReq.write(bodyData);
-    proxyReq.end();
-  } else {
-    req.pipe(proxyReq);
+  req.pipe(proxyReq);
+}
+
+// WebSocket upgrades for Python routes are tunnelled to the Python backend as raw sockets
+function proxyUpgradeToPython(req, socket, head) {
+  const origin = req.headers.origin;
+  if (origin && !isOriginAllowed(origin)) {
+    console.warn(`[Proxy] ❌ Rejected WebSocket upgrade from origin: ${origin}`);
+    socket.end('HTTP/1.1 403 Forbidden\r\nConnection: close\r\n\r\n');
+    return;
   }
+
+  console.log(`[Proxy] Proxying WebSocket ${req.url} to Python backend`);
+  const options = pythonRequestOptions(req, forwardedHeaders(req, { keepUpgrade: true }));
+  // Upgraded sockets leave the pool, so don't tie up a keep-alive slot while connecting
+  options.agent = false;
+  const proxyReq = pythonTransport.request(options);
+
+  proxyReq.on('upgrade', (proxyRes, proxySocket, proxyHead) => {
+    const lines = [`HTTP/1.1 ${proxyRes.statusCode} ${proxyRes.statusMessage}`];
+    for (let i = 0; i < proxyRes.rawHeaders.length; i += 2) {
+      lines.push(`${proxyRes.rawHeaders[i]}: ${proxyRes.rawHeaders[i + 1]}`);
+    }
+    socket.write(lines.join('\r\n') + '\r\n\r\n');
+    if (proxyHead && proxyHead.length) {
+      socket.write(proxyHead);
+    }
+    if (head && head.length) {
+      proxySocket.write(head);
+    }
+
+    socket.setTimeout(0);
+    socket.setNoDelay(true);
+    proxySocket.setNoDelay(true);
+    proxySocket.on('error', () => socket.destroy());
+    socket.on('error', () => proxySocket.destroy());
+    proxySocket.pipe(socket).pipe(proxySocket);
+  });
+
+  // The Python backend answered without upgrading (e.g. 404 or 403): relay it and close
+  proxyReq.on('response', (proxyRes) => {
+    const headers = Object.entries(proxyRes.headers)
+      .filter(([name]) => !HOP_BY_HOP_HEADERS.includes(name))
+      .map(([name, value]) => `${name}: ${value}`);
+    socket.write([`HTTP/1.1 ${proxyRes.statusCode} ${proxyRes.statusMessage}`, ...headers, 'Connection: close'].join('\r\n') + '\r\n\r\n');
+    proxyRes.pipe(socket);
+  });
+
+  proxyReq.on('error', (err) => {
+    console.error('[Proxy] WebSocket proxy error:', err.message);
+    socket.end('HTTP/1.1 502 Bad Gateway\r\nConnection: close\r\n\r\n');
+  });
+
+  socket.on('error', () => proxyReq.destroy());
+  proxyReq.end();
 }
 
 // Frontend static assets
@@ -478,4 +585,15 @@ const server = app.listen(PORT, '0.0.0.0', () => {
   console.log(`\n✅ Node.js backend ready! Railway should route to port ${actualPort}`);
 });
 
+server.on('upgrade', (req, socket, head) => {
+  const { pathname } = new URL(req.url, 'http://localhost');
+  if (isPythonRoute(pathname)) {
+    proxyUpgradeToPython(req, socket, head);
+  } else {
+    socket.end('HTTP/1.1 404 Not Found\r\nConnection: close\r\n\r\n');
+  }
+});
+
+server.on('close', () => pythonAgent.destroy());
+
 module.exports = app;
@@ -0,0 +1,8 @@
+"""
+Test configuration
+The backend modules are imported the way main.py imports them, from the backend directory.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,95 @@
+"""
+Idempotent execute requests
+A retry sent while the original request is still running attaches to it instead of running
+the cell a second time.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import metrics
+from idempotency import IdempotencyCache, IdempotencyConflict
+
+def _replays(attempt: str) -> float:
+    return metrics.REGISTRY.get_sample_value('cocode_execute_replays_total', {'attempt': attempt}) or 0
+
+def test_concurrent_duplicate_runs_factory_once():
+    cache = IdempotencyCache()
+    calls = []
+
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(0.2)
+        return "result"
+
+    async def main():
+        return await asyncio.gather(
+            cache.run(("s", "r1"), "code", factory),
+            cache.run(("s", "r1"), "code", factory),
+        )
+
+    first, second = asyncio.run(main())
+    assert calls == [1]
+    assert first == ("result", False)
+    assert second == ("result", True)
+
+def test_reused_request_id_for_other_code_conflicts():
+    cache = IdempotencyCache()
+
+    async def factory():
+        return "result"
+
+    async def main():
+        await cache.run(("s", "r1"), "code", factory)
+        await cache.run(("s", "r1"), "other code", factory)
+
+    with pytest.raises(IdempotencyConflict):
+        asyncio.run(main())
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    from fastapi.testclient import TestClient
+    import main
+
+    # FileStorage lives in the working directory
+    monkeypatch = pytest.MonkeyPatch()
+    monkeypatch.chdir(tmp_path_factory.mktemp("storage"))
+    try:
+        with TestClient(main.app) as test_client:
+            yield test_client
+    finally:
+        monkeypatch.undo()
+
+def test_retry_during_execution_runs_cell_once(client):
+    session_id = f"idempotency-{time.time_ns()}"
+    request = {
+        "code": "import time\nruns = globals().get('runs', 0) + 1\ntime.sleep(2)",
+        "cellId": "cell-1",
+        "sessionId": session_id,
+        "requestId": "request-1",
+    }
+
+    replays_before = _replays('running')
+
+    def execute():
+        return client.post("/api/execute", json=request)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        original = pool.submit(execute)
+        time.sleep(0.5)  # The original is starting the kernel or running the cell
+        retry = pool.submit(execute)
+        responses = [original.result(), retry.result()]
+
+    assert [response.status_code for response in responses] == [200, 200]
+    assert [response.headers.get("X-Idempotent-Replay") for response in responses] == [None, "true"]
+    assert responses[0].json() == responses[1].json()
+    # The retry waited for the running attempt rather than being served after it finished
+    assert _replays('running') == replays_before + 1
+
+    count = client.post("/api/execute", json={
+        "code": "print(runs)", "cellId": "cell-2", "sessionId": session_id
+    }).json()
+    assert count["stdout"].strip() == "1"
+    client.delete(f"/api/sessions/{session_id}")
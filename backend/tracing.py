@@ -0,0 +1,139 @@
+"""
+Lightweight execution tracing for the Python kernel API
+Spans are recorded per request and can be exported as OTLP/JSON lines (the format read by
+the OpenTelemetry Collector's otlpjsonfile receiver) to the file named by TRACE_EXPORT_FILE.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "cocode-kernel-api")
+
+class Span:
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes: Dict[str, Any] = attributes or {}
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e9
+
+    def to_otlp(self) -> Dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+def _otlp_attribute(key: str, value: Any) -> Dict:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+class Trace:
+    """Spans of one request. Nested span() calls become children of the enclosing span."""
+
+    def __init__(self, name: str, **attributes):
+        self.trace_id = uuid4().hex
+        self.spans: List[Span] = []
+        self._stack: List[Span] = []
+        self.root = self._start(name, attributes)
+
+    def _start(self, name: str, attributes: Dict[str, Any]) -> Span:
+        parent_id = self._stack[-1].span_id if self._stack else None
+        span = Span(name, self.trace_id, parent_id, attributes)
+        self.spans.append(span)
+        self._stack.append(span)
+        return span
+
+    def _end(self, span: Span):
+        span.end_ns = time.time_ns()
+        if self._stack and self._stack[-1] is span:
+            self._stack.pop()
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        span = self._start(name, attributes)
+        try:
+            yield span
+        except Exception as e:
+            span.error = str(e)
+            raise
+        finally:
+            self._end(span)
+
+    def finish(self):
+        self._end(self.root)
+
+    def timings(self) -> Dict[str, float]:
+        """Seconds per direct child phase of the root span (repeated phases are summed)"""
+        timings: Dict[str, float] = {}
+        for span in self.spans:
+            if span.parent_id == self.root.span_id:
+                timings[span.name] = timings.get(span.name, 0.0) + span.duration
+        timings["total"] = self.root.duration
+        return timings
+
+    def to_otlp(self) -> Dict:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{
+                    "scope": {"name": "cocode.kernel"},
+                    "spans": [span.to_otlp() for span in self.spans],
+                }],
+            }]
+        }
+
+class FileSpanExporter:
+    """Appends each finished trace to a file as one OTLP/JSON line"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace):
+        line = json.dumps(trace.to_otlp(), separators=(",", ":"))
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+def span(trace: Optional[Trace], name: str, **attributes):
+    """trace.span(...) when tracing, otherwise a no-op context"""
+    if trace is None:
+        return nullcontext()
+    return trace.span(name, **attributes)
+
+_export_path = os.getenv("TRACE_EXPORT_FILE")
+exporter: Optional[FileSpanExporter] = FileSpanExporter(_export_path) if _export_path else None
+
+def export(trace: Trace):
+    """Export a finished trace if an exporter is configured"""
+    if exporter is not None:
+        exporter.export(trace)
@@ -0,0 +1,127 @@
+import React from 'react';
+import { ChevronLeft, ChevronRight, ArrowUp, ArrowDown, Filter } from 'lucide-react';
+import { DataFramePage } from '../types/notebook';
+import { apiService } from '../services/api';
+
+interface DataFrameOutputProps {
+  initialPage: DataFramePage;
+  sessionId: string;
+}
+
+const DataFrameOutput: React.FC<DataFrameOutputProps> = ({ initialPage, sessionId }) => {
+  const [page, setPage] = React.useState<DataFramePage>(initialPage);
+  const [filter, setFilter] = React.useState('');
+  const [loading, setLoading] = React.useState(false);
+  const [error, setError] = React.useState<string | null>(null);
+
+  const loadPage = async (params: { offset?: number; sortBy?: string | null; ascending?: boolean; query?: string | null }) => {
+    setLoading(true);
+    setError(null);
+    try {
+      const next = await apiService.getDataFramePage(sessionId, page.handle, {
+        offset: params.offset ?? 0,
+        limit: page.limit,
+        sortBy: params.sortBy !== undefined ? params.sortBy : page.sortBy ?? null,
+        ascending: params.ascending ?? page.ascending ?? true,
+        query: params.query !== undefined ? params.query : page.query ?? null,
+      });
+      setPage(next);
+    } catch (err) {
+      // Handles expire when the kernel restarts or newer frames are displayed
+      setError(err instanceof Error ? err.message : 'Failed to load page');
+    } finally {
+      setLoading(false);
+    }
+  };
+
+  const toggleSort = (column: string) => {
+    const ascending = page.sortBy === column ? !(page.ascending ?? true) : true;
+    loadPage({ offset: 0, sortBy: column, ascending });
+  };
+
+  const rows = page.rows || [];
+  const index = page.index || [];
+  const firstRow = page.rowCount === 0 ? 0 : page.offset + 1;
+  const lastRow = Math.min(page.offset + rows.length, page.rowCount);
+
+  return (
+    <div className="p-3 bg-white border border-gray-200 rounded">
+      <div className="flex items-center justify-between mb-2 text-xs text-gray-500">
+        <span>
+          Rows {firstRow}–{lastRow} of {page.rowCount} · {page.columns.length} columns
+        </span>
+        <form
+          className="flex items-center space-x-1"
+          onSubmit={(e) => {
+            e.preventDefault();
+            loadPage({ offset: 0, query: filter.trim() || null });
+          }}
+        >
+          <Filter className="w-3 h-3" />
+          <input
+            value={filter}
+            onChange={(e) => setFilter(e.target.value)}
+            placeholder="filter, e.g. price > 10"
+            className="px-2 py-0.5 border border-gray-300 rounded text-xs font-mono"
+          />
+        </form>
+      </div>
+      <div className="overflow-x-auto">
+        <table className="text-sm font-mono border-collapse">
+          <thead>
+            <tr>
+              <th className="px-2 py-1 text-right text-gray-400">{page.indexName ?? ''}</th>
+              {page.columns.map((column) => (
+                <th
+                  key={column.name}
+                  onClick={() => toggleSort(column.name)}
+                  title={column.dtype}
+                  className="px-2 py-1 text-right cursor-pointer hover:bg-gray-100 whitespace-nowrap"
+                >
+                  <span className="inline-flex items-center space-x-1">
+                    <span>{column.name}</span>
+                    {page.sortBy === column.name &&
+                      (page.ascending ? <ArrowUp className="w-3 h-3" /> : <ArrowDown className="w-3 h-3" />)}
+                  </span>
+                </th>
+              ))}
+            </tr>
+          </thead>
+          <tbody className={loading ? 'opacity-50' : ''}>
+            {rows.map((row, i) => (
+              <tr key={i} className="border-t border-gray-100">
+                <th className="px-2 py-0.5 text-right text-gray-500">{String(index[i])}</th>
+                {row.map((value, j) => (
+                  <td key={j} className="px-2 py-0.5 text-right whitespace-nowrap">
+                    {value === null ? 'NaN' : String(value)}
+                  </td>
+                ))}
+              </tr>
+            ))}
+          </tbody>
+        </table>
+      </div>
+      {error && <div className="mt-2 text-xs text-red-600">{error}</div>}
+      {page.rowCount > page.limit && (
+        <div className="flex items-center justify-end mt-2 space-x-2">
+          <button
+            disabled={loading || page.offset === 0}
+            onClick={() => loadPage({ offset: Math.max(page.offset - page.limit, 0) })}
+            className="p-1 rounded hover:bg-gray-100 disabled:opacity-40"
+          >
+            <ChevronLeft className="w-4 h-4" />
+          </button>
+          <button
+            disabled={loading || lastRow >= page.rowCount}
+            onClick={() => loadPage({ offset: page.offset + page.limit })}
+            className="p-1 rounded hover:bg-gray-100 disabled:opacity-40"
+          >
+            <ChevronRight className="w-4 h-4" />
+          </button>
+        </div>
+      )}
+    </div>
+  );
+};
+
+export default DataFrameOutput;
@@ -10,6 +10,7 @@ import {
   File
 } from 'lucide-react';
 import { apiService } from '../services/api';
+import { FileStorageEvent } from '../types/notebook';
 import { toast } from 'react-hot-toast';
 
 interface FileInfo {
@@ -19,9 +20,20 @@ interface FileInfo {
   size: number;
   uploaded_at: string;
   path: string;
+  hash?: string;
+  version?: number;
   exists?: boolean;
+  memory?: {
+    bytesBefore: number;
+    bytesAfter: number;
+    sampledRows: number;
+    dtypes: Record<string, string>;
+  };
 }
 
+// Tabular uploads get a DataFrame memory analysis (recommended dtypes) from the backend
+const ANALYZED_EXTENSIONS = ['csv', 'tsv', 'parquet'];
+
 const FileManager: React.FC = () => {
   const [files, setFiles] = useState<FileInfo[]>([]);
   const [isLoading, setIsLoading] = useState(false);
@@ -31,18 +43,32 @@ const FileManager: React.FC = () => {
   useEffect(() => {
     loadFiles();
     
-    // Listen for file storage updates from other components
-    const handleFileStorageUpdate = () => {
-      loadFiles();
-    };
-    
-    window.addEventListener('fileStorageUpdated', handleFileStorageUpdate);
+    // The backend pushes every storage change (uploads from any tab or component, deletes,
+    // analyses); after a reconnect the list is reloaded once to catch up on missed events
+    let connectedBefore = false;
+    const unsubscribe = apiService.subscribeFileEvents(applyFileEvent, () => {
+      if (connectedBefore) {
+        loadFiles();
+      }
+      connectedBefore = true;
+    });
     
-    return () => {
-      window.removeEventListener('fileStorageUpdated', handleFileStorageUpdate);
-    };
+    return unsubscribe;
   }, []);
 
+  const applyFileEvent = (event: FileStorageEvent) => {
+    setFiles(current => {
+      if (event.type === 'deleted' || !event.file) {
+        return current.filter(file => file.filename !== event.filename);
+      }
+      const updated = { ...event.file, exists: true } as FileInfo;
+      // Updates stay in place, new files go to the end
+      return current.some(file => file.filename === event.filename)
+        ? current.map(file => (file.filename === event.filename ? updated : file))
+        : [...current, updated];
+    });
+  };
+
   const loadFiles = async () => {
     try {
       setIsLoading(true);
@@ -102,9 +128,9 @@ const FileManager: React.FC = () => {
   const handleFileUpload = async (file: File) => {
     try {
       setIsLoading(true);
-      await apiService.uploadFile(file);
+      const extension = file.name.split('.').pop()?.toLowerCase() || '';
+      await apiService.uploadFile(file, { analyze: ANALYZED_EXTENSIONS.includes(extension) });
       toast.success(`File "${file.name}" uploaded successfully!`);
-      await loadFiles();
     } catch (error: any) {
       const errorMessage = error?.message || String(error) || 'Unknown error';
       const errorLower = errorMessage.toLowerCase();
@@ -184,7 +210,6 @@ const FileManager: React.FC = () => {
     try {
       await apiService.deleteFile(file.filename);
       toast.success(`File "${file.original_name}" deleted`);
-      await loadFiles();
     } catch (error: any) {
       const errorMessage = error?.message || String(error) || 'Unknown error';
       const errorLower = errorMessage.toLowerCase();
@@ -256,6 +281,14 @@ const FileManager: React.FC = () => {
                       <p className="text-xs text-gray-500">
                         {formatFileSize(file.size)} • {file.file_type.toUpperCase()}
                       </p>
+                      {file.memory && file.memory.bytesAfter < file.memory.bytesBefore && (
+                        <p
+                          className="text-xs text-green-700"
+                          title={`Estimated from ${file.memory.sampledRows} rows. Load with read_csv_optimized('${file.filename}') to apply: ${Object.entries(file.memory.dtypes).map(([c, d]) => `${c} → ${d}`).join(', ')}`}
+                        >
+                          Memory {formatFileSize(file.memory.bytesBefore)} → {formatFileSize(file.memory.bytesAfter)} with optimized dtypes
+                        </p>
+                      )}
                     </div>
                   </div>
                   <div className="flex items-center space-x-1 opacity-0 group-hover:opacity-100 transition-opacity">
@@ -16,7 +16,8 @@ import {
   Image as ImageIcon,
   BarChart3,
   ArrowDown,
-  ArrowUp
+  ArrowUp,
+  Gauge
 } from 'lucide-react';
 import Editor from '@monaco-editor/react';
 import { NotebookCell, CellOutput, ExecutionStatus, ExecutionRequest, VariableSnapshot } from '../types/notebook';
@@ -26,6 +27,8 @@ import { useStore } from '../store/useStore';
 import { toast } from 'react-hot-toast';
 import ErrorTutor from './ErrorTutor';
 import ExplainPlotModal from './ExplainPlotModal';
+import DataFrameOutput from './DataFrameOutput';
+import ProfileOutput from './ProfileOutput';
 import NotebookChat from './NotebookChat';
 import { detectConceptsFromCode } from '../utils/conceptTracker';
 
@@ -33,18 +36,46 @@ interface NotebookProps {
   notebookId?: string;
 }
 
+const DEFAULT_CELLS: NotebookCell[] = [
+  {
+    id: '1',
+    type: 'code',
+    content: 'import pandas as pd\nimport numpy as np\n\n# Your code here',
+    status: 'idle'
+  }
+];
+
+const loadSavedCells = (storageKey: string): NotebookCell[] => {
+  try {
+    const saved = JSON.parse(localStorage.getItem(`${storageKey}.cells`) || 'null');
+    if (Array.isArray(saved) && saved.length > 0) {
+      return saved.map(cell => ({ ...cell, status: 'idle' }));
+    }
+  } catch {
+    // Corrupt entry: start from the default notebook
+  }
+  return DEFAULT_CELLS;
+};
+
+// Same hash as the backend's output log (SHA-256 of the cell source, hex)
+const sha256 = async (text: string): Promise<string> => {
+  const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(text));
+  return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+};
+
 const Notebook: React.FC<NotebookProps> = ({ notebookId }) => {
   const { setNotebookVariables } = useStore();
-  const [cells, setCells] = useState<NotebookCell[]>([
-    {
-      id: '1',
-      type: 'code',
-      content: 'import pandas as pd\nimport numpy as np\n\n# Your code here',
-      status: 'idle'
-    }
-  ]);
+  const storageKey = `cocode.notebook.${notebookId || 'default'}`;
+  const [cells, setCells] = useState<NotebookCell[]>(() => loadSavedCells(storageKey));
   const [executingCellId, setExecutingCellId] = useState<string | null>(null);
-  const [sessionId] = useState(() => crypto.randomUUID());
+  // Kept across reloads, so the backend's output log for this notebook can be read back
+  const [sessionId] = useState(() => {
+    const saved = localStorage.getItem(`${storageKey}.sessionId`);
+    if (saved) return saved;
+    const created = crypto.randomUUID();
+    localStorage.setItem(`${storageKey}.sessionId`, created);
+    return created;
+  });
   const [showErrorTutor, setShowErrorTutor] = useState<{error: string; code: string; traceback?: string} | null>(null);
   const [showExplainPlot, setShowExplainPlot] = useState<{plotData: string; code: string} | null>(null);
   const [expandedOutputs, setExpandedOutputs] = useState<Set<string>>(new Set());
@@ -78,6 +109,42 @@ const Notebook: React.FC<NotebookProps> = ({ notebookId }) => {
     });
   };
 
+  useEffect(() => {
+    // Cell sources only; outputs come back from the backend's output log
+    const saved = cells.map(({ id, type, content }) => ({ id, type, content }));
+    localStorage.setItem(`${storageKey}.cells`, JSON.stringify(saved));
+  }, [cells, storageKey]);
+
+  useEffect(() => {
+    // Show each cell's last recorded result, as long as its code is unchanged since it ran
+    const restoreOutputs = async () => {
+      const codeCells = cells.filter(c => c.type === 'code');
+      if (codeCells.length === 0) return;
+      try {
+        const { outputs } = await apiService.getSessionOutputs(sessionId, codeCells.map(c => c.id));
+        const hashes = Object.fromEntries(
+          await Promise.all(codeCells.map(async c => [c.id, await sha256(c.content)]))
+        );
+        setCells(prev => prev.map(c => {
+          const recorded = outputs[c.id];
+          if (!recorded || c.output || recorded.codeHash !== hashes[c.id]) return c;
+          return {
+            ...c,
+            status: recorded.success ? 'success' : 'error',
+            output: recorded.output || [],
+            error: recorded.error,
+            executionTime: recorded.executionTime
+          };
+        }));
+        setExpandedOutputs(prev => new Set([...prev, ...Object.keys(outputs)]));
+      } catch (error) {
+        // Backend not running, or nothing recorded yet: the notebook just starts without outputs
+        console.warn('Could not restore recorded outputs:', error);
+      }
+    };
+    restoreOutputs();
+  }, []);
+
   useEffect(() => {
     // Only auto-scroll if new cells were added (not on every render)
     if (cells.length > previousCellsLength.current) {
@@ -371,7 +438,7 @@ const Notebook: React.FC<NotebookProps> = ({ notebookId }) => {
     ));
   };
 
-  const executeCell = async (cellId: string) => {
+  const executeCell = async (cellId: string, options: { profile?: boolean } = {}) => {
     const cell = cells.find(c => c.id === cellId);
     if (!cell || cell.type !== 'code') return;
 
@@ -382,13 +449,16 @@ const Notebook: React.FC<NotebookProps> = ({ notebookId }) => {
 
     try {
       // Call FastAPI backend for execution
-      const response = await apiService.executeCode(cell.content, cellId, sessionId);
+      // Lean responses skip stdout/stderr/plots; the same content arrives in output
+      const response = await apiService.executeCode(cell.content, cellId, sessionId, { ...options, lean: true });
+      const stderr = (response.output || [])
+        .filter((o: CellOutput) => o.type === 'error')
+        .map((o: CellOutput) => o.data)
+        .join('');
       
       // Debug: Log the response to see what we're getting
       console.log('Execution response:', {
         success: response.success,
-        stdout: response.stdout,
-        stderr: response.stderr,
         output: response.output,
         outputLength: response.output?.length || 0
       });
@@ -421,11 +491,11 @@ const Notebook: React.FC<NotebookProps> = ({ notebookId }) => {
       } else {
         toast.error('Execution failed');
         // Show error tutor for errors
-        if (response.error || response.stderr) {
+        if (response.error || stderr) {
           setShowErrorTutor({
-            error: response.error || response.stderr || 'Unknown error',
+            error: response.error || stderr || 'Unknown error',
             code: cell.content,
-            traceback: response.stderr
+            traceback: stderr
           });
         }
       }
@@ -537,6 +607,9 @@ const Notebook: React.FC<NotebookProps> = ({ notebookId }) => {
           </div>
         );
       case 'dataframe':
+        if (output.mimeType === 'application/vnd.cocode.dataframe+json') {
+          return <DataFrameOutput initialPage={JSON.parse(output.data)} sessionId={sessionId} />;
+        }
         return (
           <div className="p-3 bg-white border border-gray-200 rounded overflow-x-auto">
             <div 
@@ -545,6 +618,8 @@ const Notebook: React.FC<NotebookProps> = ({ notebookId }) => {
             />
           </div>
         );
+      case 'profile':
+        return <ProfileOutput report={JSON.parse(output.data)} />;
       case 'error':
         return (
           <div className="p-3 bg-red-50 border border-red-200 rounded">
@@ -641,6 +716,14 @@ const Notebook: React.FC<NotebookProps> = ({ notebookId }) => {
                         <Play className="w-4 h-4" />
                       )}
                     </button>
+                    <button
+                      onClick={() => executeCell(cell.id, { profile: true })}
+                      disabled={executingCellId === cell.id}
+                      className="p-1.5 text-gray-600 hover:bg-gray-200 rounded transition-colors disabled:opacity-50"
+                      title="Run cell with profiler"
+                    >
+                      <Gauge className="w-4 h-4" />
+                    </button>
                   </>
                 )}
                 <button
@@ -1113,9 +1113,6 @@ else:
         
         toast.success(`CSV file "${csvFilename}" exported to file storage!`, { id: 'export-csv' });
         
-        // Trigger file list refresh by dispatching a custom event
-        window.dispatchEvent(new CustomEvent('fileStorageUpdated'));
-        
       } catch (parseError) {
         console.error('Error parsing file content:', parseError);
         toast.error('Failed to parse CSV file content.', { id: 'export-csv' });
@@ -0,0 +1,79 @@
+import React from 'react';
+import { Gauge } from 'lucide-react';
+import { ProfileReport } from '../types/notebook';
+
+interface ProfileOutputProps {
+  report: ProfileReport;
+}
+
+const formatBytes = (bytes: number) => {
+  const sign = bytes < 0 ? '-' : '';
+  const value = Math.abs(bytes);
+  if (value >= 1024 * 1024) return `${sign}${(value / (1024 * 1024)).toFixed(1)} MB`;
+  if (value >= 1024) return `${sign}${(value / 1024).toFixed(1)} KB`;
+  return `${sign}${value} B`;
+};
+
+const formatSeconds = (seconds: number) =>
+  seconds >= 1 ? `${seconds.toFixed(2)} s` : `${(seconds * 1000).toFixed(1)} ms`;
+
+const ProfileOutput: React.FC<ProfileOutputProps> = ({ report }) => {
+  return (
+    <div className="p-3 bg-white border border-gray-200 rounded">
+      <div className="flex items-center space-x-4 mb-2 text-xs text-gray-600">
+        <span className="inline-flex items-center space-x-1 font-medium text-gray-700">
+          <Gauge className="w-3 h-3" />
+          <span>Profile</span>
+        </span>
+        <span>Peak memory {formatBytes(report.peakMemory)}</span>
+        <span>Memory change {report.memoryDelta >= 0 ? '+' : ''}{formatBytes(report.memoryDelta)}</span>
+      </div>
+      <div className="overflow-x-auto">
+        <table className="text-sm font-mono border-collapse w-full">
+          <thead>
+            <tr className="text-gray-500">
+              <th className="px-2 py-1 text-left">Function</th>
+              <th className="px-2 py-1 text-left">Location</th>
+              <th className="px-2 py-1 text-right">Calls</th>
+              <th className="px-2 py-1 text-right">Own time</th>
+              <th className="px-2 py-1 text-right">Total time</th>
+            </tr>
+          </thead>
+          <tbody>
+            {report.hotspots.map((row, i) => (
+              <tr key={i} className={`border-t border-gray-100 ${row.file === '<cell>' ? 'bg-yellow-50' : ''}`}>
+                <td className="px-2 py-0.5 whitespace-nowrap">{row.function}</td>
+                <td className="px-2 py-0.5 text-gray-500 whitespace-nowrap" title={row.file}>
+                  {row.file.split('/').pop()}:{row.line}
+                </td>
+                <td className="px-2 py-0.5 text-right">{row.calls}</td>
+                <td className="px-2 py-0.5 text-right">{formatSeconds(row.totalTime)}</td>
+                <td className="px-2 py-0.5 text-right">{formatSeconds(row.cumulativeTime)}</td>
+              </tr>
+            ))}
+          </tbody>
+        </table>
+      </div>
+      {report.allocations.length > 0 && (
+        <div className="mt-3">
+          <div className="mb-1 text-xs text-gray-500">Largest allocations still held</div>
+          <table className="text-sm font-mono border-collapse">
+            <tbody>
+              {report.allocations.slice(0, 5).map((row, i) => (
+                <tr key={i} className="border-t border-gray-100">
+                  <td className="px-2 py-0.5 text-gray-500" title={row.file}>
+                    {row.file.split('/').pop()}:{row.line}
+                  </td>
+                  <td className="px-2 py-0.5 text-right">{formatBytes(row.size)}</td>
+                  <td className="px-2 py-0.5 text-right text-gray-500">{row.count} blocks</td>
+                </tr>
+              ))}
+            </tbody>
+          </table>
+        </div>
+      )}
+    </div>
+  );
+};
+
+export default ProfileOutput;
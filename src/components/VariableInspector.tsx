@@ -43,6 +43,13 @@ const VariableInspector: React.FC<VariableInspectorProps> = ({ variables, onRefr
     !dataframes.includes(v) && !arrays.includes(v)
   );
 
+  const formatMemory = (bytes: number) => {
+    if (bytes >= 1024 * 1024 * 1024) return `${(bytes / (1024 * 1024 * 1024)).toFixed(1)} GB`;
+    if (bytes >= 1024 * 1024) return `${(bytes / (1024 * 1024)).toFixed(1)} MB`;
+    if (bytes >= 1024) return `${(bytes / 1024).toFixed(1)} KB`;
+    return `${bytes} B`;
+  };
+
   const getTypeIcon = (type: string) => {
     if (type.includes('DataFrame')) return <Table className="w-4 h-4 text-blue-600" />;
     if (type.includes('array')) return <BarChart3 className="w-4 h-4 text-green-600" />;
@@ -90,6 +97,11 @@ print(f"💡 You can download it from the File Storage panel")`;
               {variable.name}
             </span>
             <span className="text-xs text-gray-500 ml-2">{variable.type}</span>
+            {variable.memory != null && (
+              <span className="text-xs text-gray-400 ml-auto pl-2 flex-shrink-0" title="Memory usage">
+                {formatMemory(variable.memory)}
+              </span>
+            )}
           </button>
           {isDataFrame && (
             <button
@@ -112,6 +124,12 @@ print(f"💡 You can download it from the File Storage panel")`;
                 <span className="font-semibold">Shape:</span> {variable.shape}
               </div>
             )}
+            {isDataFrame && variable.memory != null && (
+              <div className="text-xs text-gray-600">
+                <span className="font-semibold">Memory:</span> {formatMemory(variable.memory)}
+                <span className="text-gray-400"> · run <code>memory_report({variable.name})</code> or <code>optimize_memory({variable.name})</code> to shrink it</span>
+              </div>
+            )}
             {variable.summary && (
               <div className="text-xs text-gray-600 bg-gray-50 p-2 rounded">
                 <span className="font-semibold">Summary:</span>
@@ -1,3 +1,5 @@
+import { DataFramePage, FileStorageEvent, SessionOutputs } from '../types/notebook';
+
 // Both backends are on the same Railway URL
 // Extract base URL from VITE_API_URL or use VITE_API_BASE_URL, fallback to localhost
 const getBaseUrl = () => {
@@ -201,23 +203,45 @@ class ApiService {
   }
 
   // Notebook Execution
-  async executeCode(code: string, cellId: string, sessionId?: string) {
-    return this.request('/execute', {
+  async executeCode(code: string, cellId: string, sessionId?: string, options: { profile?: boolean; lean?: boolean } = {}) {
+    // The request id makes a resend safe: the backend runs the cell at most once per id
+    const body = JSON.stringify({ code, cellId, sessionId, requestId: crypto.randomUUID(), ...options });
+    try {
+      return await this.request('/execute', { method: 'POST', body });
+    } catch (error) {
+      // fetch rejects with a TypeError on network failures (no HTTP response); retry once
+      if (!(error instanceof TypeError)) throw error;
+      return this.request('/execute', { method: 'POST', body });
+    }
+  }
+
+  async getDataFramePage(
+    sessionId: string,
+    handle: string,
+    params: { offset?: number; limit?: number; sortBy?: string | null; ascending?: boolean; query?: string | null; format?: 'json' | 'arrow' }
+  ) {
+    return this.request<DataFramePage>(`/sessions/${sessionId}/dataframes/${encodeURIComponent(handle)}`, {
       method: 'POST',
-      body: JSON.stringify({ code, cellId, sessionId }),
+      body: JSON.stringify(params),
     });
   }
 
+  async getSessionOutputs(sessionId: string, cellIds?: string[]) {
+    const query = cellIds ? `?cellIds=${encodeURIComponent(cellIds.join(','))}` : '';
+    return this.request<SessionOutputs>(`/sessions/${sessionId}/outputs${query}`);
+  }
+
   async getVariables(sessionId: string) {
     return this.request(`/variables/${sessionId}`);
   }
 
   // File Storage
-  async uploadFile(file: File) {
+  async uploadFile(file: File, options: { analyze?: boolean } = {}) {
     const formData = new FormData();
     formData.append('file', file);
     
-    const response = await fetch(`${API_BASE_URL}/files/upload`, {
+    const query = options.analyze ? '?analyze=true' : '';
+    const response = await fetch(`${API_BASE_URL}/files/upload${query}`, {
       method: 'POST',
       body: formData,
     });
@@ -232,6 +256,19 @@ class ApiService {
     return this.request<{ files: any[] }>('/files');
   }
 
+  /**
+   * Receive file storage changes as they happen. onOpen runs on every (re)connect, when
+   * events may have been missed. Returns a function that closes the stream.
+   */
+  subscribeFileEvents(onEvent: (event: FileStorageEvent) => void, onOpen?: () => void) {
+    const source = new EventSource(`${API_BASE_URL}/files/events`);
+    source.onmessage = (message) => onEvent(JSON.parse(message.data));
+    if (onOpen) {
+      source.onopen = onOpen;
+    }
+    return () => source.close();
+  }
+
   async downloadFile(filename: string): Promise<Blob> {
     const response = await fetch(`${API_BASE_URL}/files/${encodeURIComponent(filename)}`);
     if (!response.ok) {
@@ -7,12 +7,47 @@ export type CellType = 'code' | 'markdown';
 export type ExecutionStatus = 'idle' | 'running' | 'success' | 'error';
 
 export interface CellOutput {
-  type: 'text' | 'html' | 'image' | 'dataframe' | 'error';
+  type: 'text' | 'html' | 'image' | 'dataframe' | 'profile' | 'error';
   data: string; // Base64 for images, HTML string for HTML, text for text
   mimeType?: string;
   metadata?: Record<string, any>;
 }
 
+// Compact DataFrame output (mimeType application/vnd.cocode.dataframe+json)
+export interface DataFramePage {
+  handle: string;
+  rowCount: number;
+  columns: { name: string; dtype: string }[];
+  indexName?: string | null;
+  offset: number;
+  limit: number;
+  format: 'json' | 'arrow';
+  index?: any[];
+  rows?: any[][];
+  arrow?: string; // Base64 Arrow IPC stream when format is 'arrow'
+  sortBy?: string | null;
+  ascending?: boolean;
+  query?: string | null;
+}
+
+// Per-cell profile (mimeType application/vnd.cocode.profile+json)
+export interface ProfileReport {
+  hotspots: {
+    function: string;
+    file: string; // '<cell>' for code in the cell itself
+    line: number;
+    calls: number;
+    totalTime: number; // Seconds spent in the function itself
+    cumulativeTime: number; // Seconds including callees
+  }[];
+  allocations: { file: string; line: number; size: number; count: number }[];
+  memoryBefore: number; // Bytes traced by tracemalloc
+  memoryAfter: number;
+  memoryDelta: number;
+  peakMemory: number;
+  topN: number;
+}
+
 export interface VariableSnapshot {
   name: string;
   type: string;
@@ -20,6 +55,7 @@ export interface VariableSnapshot {
   shape?: string; // For arrays/dataframes: e.g., "(100, 5)"
   summary?: string; // For dataframes: summary stats
   preview?: string; // First few rows for dataframes
+  memory?: number; // Bytes (deep for dataframes, shallow for containers)
 }
 
 export interface NotebookCell {
@@ -49,6 +85,10 @@ export interface ExecutionRequest {
   code: string;
   cellId: string;
   sessionId?: string;
+  trace?: boolean; // Ask for a per-phase timing breakdown
+  profile?: boolean; // Profile the cell and return a 'profile' output
+  lean?: boolean; // Omit stdout, stderr and plots (already in output)
+  requestId?: string; // Idempotency key: retries with the same id run the cell once
 }
 
 export interface ExecutionResponse {
@@ -60,6 +100,33 @@ export interface ExecutionResponse {
   executionTime?: number;
   variables?: VariableSnapshot[];
   plots?: string[]; // Base64 encoded images
+  timings?: Record<string, number>; // Seconds per phase, when requested with trace
+  traceId?: string;
+  kernelStatus?: string; // Set when the kernel died during the request ('oom_killed', 'unresponsive', ...)
+}
+
+export interface RecordedExecution extends ExecutionResponse {
+  cellId: string;
+  codeHash: string; // SHA-256 of the code that produced it
+  executedAt: string;
+  seq: number;
+}
+
+export interface SessionOutputs {
+  sessionId: string;
+  outputs: Record<string, RecordedExecution>;
+}
+
+// A change in the backend file storage, streamed from /api/files/events
+export interface FileStorageEvent {
+  seq: number;
+  type: 'created' | 'updated' | 'deleted';
+  filename: string;
+  version: number | null; // Bumped whenever the file's content changes
+  hash: string | null; // SHA-256 of the content
+  changed: boolean; // false when only metadata changed or identical content was re-uploaded
+  file: Record<string, any> | null; // The file's metadata, as listed by /api/files
+  at: string;
 }
 
 export interface VariableInspector {